@@ -7,13 +7,29 @@ db = SQLAlchemy()
 def create_app():
     app = Flask(__name__, instance_relative_config=False)
     app.config.from_object('config.Config')
+
+    from .pool import pool_stats
+    pool_stats.init_app(app)
     db.init_app(app)
 
+    from .cache import cache
+    cache.init_app(app)
+
     migrate = Migrate(app, db)
     migrate.init_app(app, db)
 
     with app.app_context():
         from . import routes
+        from .commands import history_cli, ingest_cli, pnl_cli, portfolio_cli, reports_cli, schema_cli
+        app.cli.add_command(reports_cli)
+        app.cli.add_command(portfolio_cli)
+        app.cli.add_command(schema_cli)
+        app.cli.add_command(history_cli)
+        app.cli.add_command(pnl_cli)
+        app.cli.add_command(ingest_cli)
+        pool_stats.init_engine(db.engine)
+        from .metrics import metrics
+        metrics.init_engine(db.engine)
         db.create_all()
 
         return app
\ No newline at end of file
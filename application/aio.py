@@ -0,0 +1,181 @@
+from databases import Database
+from flask_restplus import abort, marshal
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Query
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_accept_header
+
+from . import candles
+from .models import Currency, CurrencyRate, Item, Price
+from .pagination import NDJSON_MIMETYPE, after_clause, decode_cursor, encode_cursor
+from .serializers import dumps, serializer_for
+from .ticker import ticker
+
+NOT_FOUND = 'A database result was required but none was found.'
+
+
+# ASGI endpoint that serves GETs it can answer without a thread and hands
+# anything else (other methods, NDJSON streams, the arguments in
+# `fallback_args`) to the Flask app.
+class Endpoint(object):
+
+    def __init__(self, handler, fallback, fallback_args=()):
+        self.handler = handler
+        self.fallback = fallback
+        self.fallback_args = fallback_args
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if request.method != 'GET' or wants_ndjson(request) \
+                or any(name in request.query_params for name in self.fallback_args):
+            await self.fallback(scope, receive, send)
+            return
+        try:
+            response = await self.handler(request)
+        except HTTPException as e:
+            response = JSONResponse(getattr(e, 'data', None) or {'message': e.description}, e.code)
+        await response(scope, receive, send)
+
+
+# negotiated the way pagination.wants_stream does it on the Flask side
+def wants_ndjson(request):
+    return parse_accept_header(request.headers.get('accept'), MIMEAccept).best == NDJSON_MIMETYPE
+
+
+# Async versions of the hot read endpoints, answering with the same documents
+# as routes.py. Arguments go through the same restplus parsers, rows come from
+# the `databases` pool as the same Core statements the Serializer and Ticker
+# build, and everything else is served by the Flask app through
+# WSGIMiddleware.
+class ReadAPI(object):
+
+    def __init__(self, flask_app):
+        from . import routes
+
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.routes = routes
+        self.database = Database(self.config['ASYNC_DATABASE_URI'], **self.config['ASYNC_DATABASE_OPTIONS'])
+
+        wsgi = WSGIMiddleware(flask_app)
+        self.app = Starlette(routes=[
+            Route('/api/prices/', Endpoint(self.prices, wsgi, ('trader', 'stream', 'fields', 'view'))),
+            Route('/api/prices/latest', Endpoint(self.latest_prices, wsgi)),
+            Route('/api/prices/{item}/candles', Endpoint(self.candles, wsgi)),
+            Route('/api/currency_rates/', Endpoint(self.currency_rates, wsgi, ('stream', 'fields', 'view'))),
+            Mount('', app=wsgi),
+        ], on_startup=[self.database.connect], on_shutdown=[self.database.disconnect])
+
+    def parse(self, parser, request):
+        with self.flask_app.test_request_context(request.url.path, query_string=request.url.query):
+            return parser.parse_args()
+
+    async def lookup(self, model, code, *columns):
+        row = await self.database.fetch_one(select([model.id] + list(columns)).where(model.code == code))
+        if row is None:
+            abort(404, NOT_FOUND)
+        return row
+
+    async def paginate(self, request, model, fields, query, keys, args):
+        serializer = serializer_for(model, fields)
+        query = serializer.query(query, keys)
+        if args['after']:
+            query = query.filter(after_clause(keys, decode_cursor(args['after'], keys)))
+        limit = min(args['limit'] or self.config['API_PAGE_SIZE'], self.config['API_MAX_PAGE_SIZE'])
+        rows = await self.database.fetch_all(query.order_by(*keys).limit(limit + 1).statement)
+
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            cursor = encode_cursor([rows[-1][key.key] for key in keys])
+            headers['X-Next-Cursor'] = cursor
+            headers['Link'] = '<{}>; rel="next"'.format(request.url.include_query_params(after=cursor, limit=limit))
+        return Response(dumps([serializer.row(row) for row in rows]), headers=headers, media_type='application/json')
+
+    async def prices(self, request):
+        args = self.parse(self.routes.price_parser, request)
+        query = Query(Price)
+        keys = (Price.id,)
+        if args['item']:
+            item = await self.lookup(Item, args['item'])
+            query = query.filter(Price.item_id == item[0])
+            keys = (Price.ts, Price.id)
+        if args['currency']:
+            currency = await self.lookup(Currency, args['currency'])
+            query = query.filter(Price.currency_id == currency[0])
+        if args['from']:
+            query = query.filter(Price.ts >= args['from'])
+        if args['to']:
+            query = query.filter(Price.ts < args['to'])
+        return await self.paginate(request, Price, self.routes.price_fields, query, keys, args)
+
+    async def currency_rates(self, request):
+        args = self.parse(self.routes.page_parser, request)
+        return await self.paginate(request, CurrencyRate, self.routes.currency_rate_fields, Query(CurrencyRate),
+                                   (CurrencyRate.id,), args)
+
+    async def latest_prices(self, request):
+        args = self.parse(self.routes.latest_parser, request)
+        statement = select([Item.id, Item.code])
+        if args['items']:
+            statement = statement.where(Item.code.in_(args['items']))
+        codes = {row[0]: row[1] for row in await self.database.fetch_all(statement)}
+        missing = set(args['items'] or ()) - set(codes.values())
+        if missing:
+            abort(404, 'Unknown items: {}'.format(', '.join(sorted(missing))))
+
+        currency_id = None
+        if args['currency']:
+            currency_id = (await self.lookup(Currency, args['currency']))[0]
+
+        if ticker.watermark is None:
+            last_id = await self.database.fetch_val(ticker.last_id_statement())
+            ticker.load(await self.database.fetch_all(ticker.latest_statement()), last_id)
+        ticker.update(await self.database.fetch_all(ticker.since_statement()))
+
+        item_ids = sorted(codes) if args['items'] else None
+        data = self.routes.latest_quotes(codes, ticker.snapshot(item_ids, currency_id))
+        return Response(dumps(marshal(data, self.routes.latest_price_fields)), media_type='application/json')
+
+    async def candles(self, request):
+        args = self.parse(self.routes.candle_parser, request)
+        item = await self.lookup(Item, request.path_params['item'], Item.currency_id)
+        currency_id = item[1]
+        if args['currency']:
+            currency_id = (await self.lookup(Currency, args['currency']))[0]
+
+        where = [Price.item_id == item[0], Price.currency_id == currency_id]
+        if args['from']:
+            where.append(Price.ts >= args['from'])
+        if args['to']:
+            where.append(Price.ts < args['to'])
+        statement = select([Price.ts, Price.buy, Price.sell]).where(and_(*where)).order_by(Price.ts)
+
+        # rows are streamed off the cursor and folded a batch at a time in
+        # the thread pool, so neither the range nor the fold sits on the loop
+        folder = candles.CandleFolder(candles.INTERVALS[args['interval']], args['side'])
+        batch_size = self.config['API_STREAM_BATCH_SIZE']
+        series = []
+        batch = []
+        async for row in self.database.iterate(statement):
+            batch.append((row[0], row[1], row[2]))
+            if len(batch) >= batch_size:
+                series.extend(await run_in_threadpool(folder.fold, batch))
+                batch = []
+        series.extend(await run_in_threadpool(folder.fold, batch))
+        series.extend(folder.finish())
+
+        if args['downsample']:
+            series = await run_in_threadpool(candles.downsample, series, args['downsample'])
+        return Response(dumps(marshal(series, self.routes.candle_fields)), media_type='application/json')
+
+
+def create_asgi_app(flask_app):
+    return ReadAPI(flask_app).app
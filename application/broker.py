@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+from . import db
+from .log import logger
+from .serializers import serializer_for
+from .watermark import Watermark
+
+
+# New rows of one model, read past the last id seen (or skipped over, see
+# Watermark) and serialized the same way as the model's list endpoint.
+class Feed(object):
+
+    def __init__(self, kind, model, fields):
+        self.kind = kind
+        self.model = model
+        self.fields = fields
+        self.watermark = None
+
+    def start(self):
+        self.watermark = Watermark(db.session.query(db.func.coalesce(db.func.max(self.model.id), 0)).scalar())
+
+    def poll(self, limit):
+        model = self.model
+        serializer = serializer_for(model, self.fields)
+        rows = serializer.query(model.query, (model.id,)) \
+            .filter(self.watermark.unread(model.id)).order_by(model.id).limit(limit).all()
+        return [(row.item_id, row.id, serializer.row(row)) for row in rows if self.watermark.seen(row.id)]
+
+
+# Pending events of one client, bounded to `max_size`. A newer price of an
+# item replaces the one still waiting; past the bound the oldest events are
+# dropped and counted so the client can tell it has to resync.
+class Subscription(object):
+
+    def __init__(self, item_ids, kinds, max_size):
+        self.item_ids = item_ids
+        self.kinds = kinds
+        self.max_size = max_size
+        self.events = OrderedDict()
+        self.dropped = 0
+        self.ready = threading.Condition()
+
+    def wants(self, kind, item_id):
+        return kind in self.kinds and (self.item_ids is None or item_id in self.item_ids)
+
+    def put(self, kind, item_id, id, data):
+        key = (kind, item_id) if kind == 'price' else (kind, id)
+        with self.ready:
+            self.events.pop(key, None)
+            self.events[key] = (kind, data)
+            while len(self.events) > self.max_size:
+                self.events.popitem(last=False)
+                self.dropped += 1
+            self.ready.notify()
+
+    # waits up to `timeout` seconds; returns (events, dropped since last get)
+    def get(self, timeout):
+        with self.ready:
+            if not self.events:
+                self.ready.wait(timeout)
+            events = list(self.events.values())
+            dropped = self.dropped
+            self.events.clear()
+            self.dropped = 0
+            return events, dropped
+
+
+# In-process fan-out. While anyone is subscribed, one thread per worker polls
+# each feed and hands new rows to the matching subscriptions, so the database
+# sees one query per feed and interval whatever the number of clients, and
+# rows inserted by any worker or the bulk endpoints are delivered alike.
+class Broker(object):
+
+    def __init__(self):
+        self.feeds = []
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def feed(self, kind, model, fields):
+        self.feeds.append(Feed(kind, model, fields))
+
+    def subscribe(self, app, item_ids, kinds):
+        subscription = Subscription(item_ids, kinds, app.config['STREAM_QUEUE_SIZE'])
+        with self.lock:
+            self.subscriptions.add(subscription)
+            if self.thread is None:
+                for feed in self.feeds:
+                    feed.start()
+                self.thread = threading.Thread(target=self.run, args=(app,), name='broker', daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, kind, item_id, id, data):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(kind, item_id):
+                subscription.put(kind, item_id, id, data)
+
+    def run(self, app):
+        interval = app.config['STREAM_POLL_INTERVAL']
+        batch_size = app.config['API_STREAM_BATCH_SIZE']
+        with app.app_context():
+            while True:
+                with self.lock:
+                    if not self.subscriptions:
+                        self.thread = None
+                        return
+                backlog = False
+                try:
+                    for feed in self.feeds:
+                        rows = feed.poll(batch_size)
+                        backlog = backlog or len(rows) >= batch_size
+                        for item_id, id, data in rows:
+                            self.publish(feed.kind, item_id, id, data)
+                except Exception:
+                    logger.exception('Stream feed poll failed')
+                finally:
+                    db.session.remove()
+                if not backlog:
+                    time.sleep(interval)
+
+
+broker = Broker()
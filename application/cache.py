@@ -0,0 +1,135 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+from flask_restplus.representations import output_json
+from werkzeug.utils import import_string
+
+
+# Process-local backend, bounded to `max_entries` in LRU order. Also stands
+# in for a shared backend wherever one is not available. Counters are kept
+# apart from the entries, so they are never evicted or expired.
+class LocalCache(object):
+
+    def __init__(self, max_entries=1024, **kwargs):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self.lock:
+            self.entries[key] = (value, time.time() + timeout if timeout else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def incr(self, key, delta=1):
+        with self.lock:
+            value = self.counters[key] = self.counters.get(key, 0) + delta
+            return value
+
+
+# Shared backend for multi-process deployments; needs the optional `redis` package.
+class RedisCache(object):
+
+    def __init__(self, url=None, prefix='my-investments-api:', **kwargs):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=timeout)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key, delta=1):
+        return self.client.incrby(self.prefix + key, delta)
+
+
+BACKENDS = {
+    'local': LocalCache,
+    'redis': RedisCache,
+}
+
+
+# Caches the serialized JSON of GET responses per namespace. Each namespace
+# has a generation counter that is part of every key, so invalidate() drops
+# all of its pages at once by bumping the counter. The preferred mimetype is
+# part of the key too: a request for NDJSON is streamed, never cached, and
+# must not be answered with a cached JSON page.
+class ResponseCache(object):
+
+    def init_app(self, app):
+        backend = app.config['CACHE_BACKEND']
+        backend = BACKENDS[backend] if backend in BACKENDS else import_string(backend)
+        app.extensions['response_cache'] = backend(
+            url=app.config['CACHE_URL'],
+            max_entries=app.config['CACHE_MAX_ENTRIES']
+        )
+
+    @property
+    def backend(self):
+        return current_app.extensions['response_cache']
+
+    def invalidate(self, namespace):
+        self.backend.incr('generation:' + namespace)
+
+    def cached(self, namespace):
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                backend = self.backend
+                generation = backend.incr('generation:' + namespace, 0)
+                key = '{}:{}:{}:{}'.format(namespace, generation, request.accept_mimetypes.best or '*/*',
+                                           request.full_path)
+
+                entry = backend.get(key)
+                if entry is None:
+                    resp = func(*args, **kwargs)
+                    if isinstance(resp, Response):
+                        return resp
+                    resp = output_json(*resp) if isinstance(resp, tuple) else output_json(resp, 200)
+                    if resp.status_code != 200:
+                        return resp
+                    body = resp.get_data()
+                    headers = {k: v for k, v in resp.headers.items() if k not in ('Content-Length', 'Content-Type')}
+                    headers['ETag'] = '"{}"'.format(hashlib.sha1(body).hexdigest())
+                    headers['Vary'] = 'Accept'
+                    entry = (body, headers)
+                    backend.set(key, entry, current_app.config['CACHE_TIMEOUT'])
+
+                body, headers = entry
+                if request.if_none_match.contains(headers['ETag'].strip('"')):
+                    return Response(status=304, headers=headers)
+                return Response(body, 200, headers, mimetype='application/json')
+            return wrapper
+        return decorator
+
+
+cache = ResponseCache()
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+INTERVALS = {
+    '1m': 60,
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '1h': 60 * 60,
+    '4h': 4 * 60 * 60,
+    '1d': 24 * 60 * 60,
+}
+
+SIDES = ('buy', 'sell', 'mid')
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def side_price(buy, sell, side='mid'):
+    if side == 'buy':
+        return float(buy)
+    if side == 'sell':
+        return float(sell)
+    return (float(buy) + float(sell)) / 2
+
+
+def bucket_start(ts, seconds):
+    offset = int((ts - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=offset - offset % seconds)
+
+
+# Folds (ts, buy, sell) rows, ordered by ts, into OHLC buckets in one pass.
+# Price rows are quotes rather than fills, so volume is the tick count.
+# Rows can be fed in as many batches as it takes: fold() returns the
+# candles a batch closed and finish() the one still open.
+class CandleFolder(object):
+
+    def __init__(self, seconds, side='mid'):
+        self.seconds = seconds
+        self.side = side
+        self.candle = None
+
+    def fold(self, rows):
+        closed = []
+        candle = self.candle
+        for ts, buy, sell in rows:
+            price = side_price(buy, sell, self.side)
+            start = bucket_start(ts, self.seconds)
+            if candle is None or candle['ts'] != start:
+                if candle is not None:
+                    closed.append(candle)
+                candle = {'ts': start, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': 0}
+            candle['high'] = max(candle['high'], price)
+            candle['low'] = min(candle['low'], price)
+            candle['close'] = price
+            candle['volume'] += 1
+        self.candle = candle
+        return closed
+
+    def finish(self):
+        candle, self.candle = self.candle, None
+        return [candle] if candle is not None else []
+
+
+def candles(rows, seconds, side='mid'):
+    folder = CandleFolder(seconds, side)
+    return folder.fold(rows) + folder.finish()
+
+
+# Largest-Triangle-Three-Buckets: keeps `threshold` points of a series that
+# preserve its visual shape, always including the first and last point.
+def lttb(points, threshold, x=lambda p: p[0], y=lambda p: p[1]):
+    points = list(points)
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    every = (len(points) - 2) / (threshold - 2)
+    sampled = [points[0]]
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, len(points))
+        avg_range = points[avg_start:avg_end]
+        avg_x = sum(x(p) for p in avg_range) / len(avg_range)
+        avg_y = sum(y(p) for p in avg_range) / len(avg_range)
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = x(points[a]), y(points[a])
+        max_area = -1
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (y(points[j]) - ay) - (ax - x(points[j])) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        sampled.append(points[next_a])
+        a = next_a
+    sampled.append(points[-1])
+    return sampled
+
+
+def downsample(series, threshold):
+    return lttb(series, threshold,
+                x=lambda c: (c['ts'] - EPOCH).total_seconds(),
+                y=lambda c: c['close'])
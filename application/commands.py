@@ -0,0 +1,123 @@
+import csv
+import os
+import time
+from datetime import date, datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from . import db, explain, history, pnl, portfolio, reports, wal
+
+reports_cli = AppGroup('reports', help='Maintain the daily report table.')
+portfolio_cli = AppGroup('portfolio', help='Value trader holdings.')
+schema_cli = AppGroup('schema', help='Check the database schema.')
+history_cli = AppGroup('history', help='Partition and retire price and currency rate ticks.')
+pnl_cli = AppGroup('pnl', help='Snapshot trader positions replayed from the trade ledger.')
+ingest_cli = AppGroup('ingest', help='Replay write-ahead ingest logs.')
+
+
+@reports_cli.command('backfill')
+@click.option('--from', 'start', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+              help='First trading date to rebuild.')
+@click.option('--to', 'end', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+              help='Trading date to stop at (exclusive).')
+@click.option('--chunk-days', default=1, show_default=True,
+              help='Trading days rebuilt and committed per transaction.')
+def backfill(start, end, chunk_days):
+    for chunk_start, chunk_end in reports.backfill(start.date(), end.date(), chunk_days):
+        click.echo('rebuilt {} .. {}'.format(chunk_start, chunk_end))
+
+
+@portfolio_cli.command('revalue')
+@click.option('--output', type=click.File('w'), default='-', show_default=True,
+              help='CSV file for one row per trader.')
+def revalue(output):
+    started = time.perf_counter()
+    at = datetime.utcnow()
+    valuation = portfolio.value(portfolio.holdings(), at)
+    writer = csv.writer(output)
+    writer.writerow(['trader_id', 'currency_id', 'value', 'positions', 'unpriced', 'at'])
+    for row in zip(*(column.tolist() for column in valuation.totals())):
+        writer.writerow(list(row) + [at.isoformat()])
+    click.echo('valued {} positions in {:.3f} s'.format(len(valuation.holdings), time.perf_counter() - started),
+               err=True)
+
+
+@schema_cli.command('explain')
+@click.option('--verbose', is_flag=True, help='Print every plan, not only the failing ones.')
+def explain_plans(verbose):
+    failed = 0
+    for name, tables, lines, scans in explain.check():
+        click.echo('{} {}'.format('FAIL' if scans else 'ok  ', name))
+        if scans or verbose:
+            for line in lines:
+                click.echo('     {}'.format(line))
+        failed += bool(scans)
+    if failed:
+        raise click.ClickException('{} queries read a whole table'.format(failed))
+
+
+@history_cli.command('partition')
+@click.option('--ahead', type=int, help='Months past the current one to create, HISTORY_PARTITIONS_AHEAD by default.')
+def partition(ahead):
+    ahead = current_app.config['HISTORY_PARTITIONS_AHEAD'] if ahead is None else ahead
+    start = history.month(date.today())
+    for table in history.TABLES:
+        if not history.partitioned(table):
+            click.echo('{} is not partitioned'.format(table))
+            continue
+        for day in history.create_partitions(table, start, history.add_months(start, ahead + 1)):
+            click.echo('created {}'.format(history.partition_name(table, day)))
+    db.session.commit()
+
+
+@history_cli.command('retain')
+@click.option('--months', type=int, help='Months of raw ticks to keep, HISTORY_RETENTION_MONTHS by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Ticks read per batch while rolling up.')
+def retain(months, batch_size):
+    months = current_app.config['HISTORY_RETENTION_MONTHS'] if months is None else months
+    if months <= 0:
+        click.echo('retention is disabled')
+        return
+    before = history.add_months(date.today(), -months)
+    for table, day in history.retain(before, batch_size):
+        click.echo('rolled up and dropped {} {:%Y-%m}'.format(table, day))
+
+
+@pnl_cli.command('snapshot')
+@click.option('--at', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S']),
+              help='Time to snapshot at, today at midnight by default.')
+@click.option('--method', type=click.Choice(pnl.METHODS), multiple=True,
+              help='Lot method to snapshot, every one by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Trades read per batch.')
+def snapshot(at, method, batch_size):
+    at = at or datetime.combine(date.today(), datetime.min.time())
+    for name in method or pnl.METHODS:
+        for trader_id, count in pnl.snapshot_all(at, name, batch_size):
+            click.echo('{} trader {}: replayed {} trades'.format(name, trader_id, count))
+
+
+# drains the logs of workers that are gone, e.g. after the worker count went down
+@ingest_cli.command('replay')
+@click.option('--batch-size', type=int, help='Records written per transaction, INGEST_FLUSH_SIZE by default.')
+def replay(batch_size):
+    directory = current_app.config['INGEST_WAL_DIR']
+    batch_size = batch_size or current_app.config['INGEST_FLUSH_SIZE']
+    names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    for name in names:
+        try:
+            slot = wal.Slot(os.path.join(directory, name), current_app.config['INGEST_SEGMENT_SIZE'])
+        except BlockingIOError:
+            click.echo('{}: in use'.format(name))
+            continue
+        try:
+            count = 0
+            while True:
+                read = wal.drain(slot, batch_size)
+                if not read:
+                    break
+                count += read
+            click.echo('{}: replayed {} records'.format(name, count))
+        finally:
+            slot.release()
@@ -0,0 +1,91 @@
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from . import db, export
+from .models import CurrentInventory, Item, Offer, Price, Report, Trade
+from .ticker import ticker
+
+# SQLite reads a whole table when the plan says "SCAN <table>" with no index,
+# PostgreSQL when it says "Seq Scan on <table>"
+FULL_SCAN = {
+    'sqlite': re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+# monthly partitions scan on behalf of their table
+PARTITION = re.compile(r'_(?:\d{4}_\d{2}|default)$')
+
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+
+# (name, tables that have to be read through an index, statement) for the
+# lookups the endpoints and jobs run on every request or batch
+def probes(item_id=1, currency_id=1, trader_id=1, at=None):
+    end = at or datetime.utcnow()
+    start = end - timedelta(days=1)
+    return [
+        ('prices of an item', ('price',),
+         Price.query.filter(Price.item_id == item_id).order_by(Price.ts, Price.id).limit(100)),
+        ('candles', ('price',),
+         db.session.query(Price.ts, Price.buy, Price.sell)
+         .filter(Price.item_id == item_id, Price.currency_id == currency_id, Price.ts >= start, Price.ts < end)
+         .order_by(Price.ts)),
+        ('latest prices', ('price',), ticker.latest_statement()),
+        ('price export window', ('price',), export.prices(start=start, end=end)),
+        ('report rebuild prices', ('price',),
+         db.session.query(Price.item_id, Price.currency_id, Price.ts, Price.buy, Price.sell)
+         .filter(Price.ts >= start, Price.ts < end)),
+        ('report rebuild trades', ('offer', 'trade'),
+         db.session.query(Trade.item_id, Item.currency_id, Offer.ts, Trade.quantity, Trade.unit_price)
+         .join(Offer, Trade.offer_id == Offer.id)
+         .join(Item, Trade.item_id == Item.id)
+         .filter(Offer.ts >= start, Offer.ts < end)),
+        ('trades of an item', ('trade',), export.trades(item_id=item_id)),
+        ('report lookup', ('report',),
+         Report.query.filter(Report.trading_date == start.date(), Report.item_id == item_id,
+                             Report.currency_id == currency_id)),
+        ('order book', ('offer',),
+         Offer.query.filter(Offer.item_id == item_id, Offer.is_active.is_(True)).order_by(Offer.ts, Offer.id)),
+        ('inventory', ('current_inventory',),
+         CurrentInventory.query.filter(CurrentInventory.trader_id == trader_id,
+                                       CurrentInventory.item_id == item_id)),
+        ('holdings', ('current_inventory',),
+         CurrentInventory.query.filter(CurrentInventory.trader_id == trader_id)),
+    ]
+
+
+# The plan lines of `statement`, bound with named parameters so any
+# dialect's EXPLAIN takes it as plain text.
+def plan(statement):
+    statement = getattr(statement, 'statement', statement)
+    dialect = db.engine.dialect
+    compiled = statement.compile(dialect=type(dialect)(paramstyle='named'))
+    rows = db.session.execute(text(EXPLAIN[dialect.name] + str(compiled)), compiled.params)
+    return [row[-1] for row in rows]
+
+
+# Runs every probe and returns (name, tables, plan, full scans of `tables`).
+# PostgreSQL is told to avoid sequential scans, so on a small database the
+# check still tells whether an index can serve the query at all.
+def check(**kwargs):
+    name = db.engine.dialect.name
+    if name not in EXPLAIN:
+        raise ValueError('EXPLAIN is not supported for {}'.format(name))
+    results = []
+    try:
+        if name == 'postgresql':
+            db.session.execute('SET LOCAL enable_seqscan = off')
+        for probe, tables, statement in probes(**kwargs):
+            lines = plan(statement)
+            matches = (FULL_SCAN[name].search(line) for line in lines)
+            scans = [match.group(0) for match in matches
+                     if match and PARTITION.sub('', match.group(1)) in tables]
+            results.append((probe, tables, lines, scans))
+    finally:
+        db.session.rollback()
+    return results
@@ -0,0 +1,177 @@
+import csv
+import io
+from datetime import datetime
+
+from flask import Response, current_app, stream_with_context
+
+from . import db
+from .models import Currency, Item, Offer, Price, Trade
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# (name, type) of the flat rows each export selects, in select order
+PRICE_COLUMNS = (
+    ('id', 'int'), ('item_id', 'int'), ('item', 'str'), ('currency_id', 'int'), ('currency', 'str'),
+    ('buy', 'decimal'), ('sell', 'decimal'), ('ts', 'datetime'),
+)
+
+TRADE_COLUMNS = (
+    ('id', 'int'), ('item_id', 'int'), ('item', 'str'), ('currency', 'str'), ('buyer_id', 'int'),
+    ('seller_id', 'int'), ('quantity', 'decimal'), ('unit_price', 'decimal'), ('offer_id', 'int'),
+    ('ts', 'datetime'), ('description', 'str'),
+)
+
+
+def available(format):
+    return format == 'csv' or pyarrow is not None
+
+
+def prices(item_id=None, currency_id=None, start=None, end=None):
+    query = db.session.query(Price.id, Price.item_id, Item.code, Price.currency_id, Currency.code,
+                             Price.buy, Price.sell, Price.ts) \
+        .join(Item, Item.id == Price.item_id) \
+        .join(Currency, Currency.id == Price.currency_id)
+    if item_id is not None:
+        query = query.filter(Price.item_id == item_id)
+    if currency_id is not None:
+        query = query.filter(Price.currency_id == currency_id)
+    if start is not None:
+        query = query.filter(Price.ts >= start)
+    if end is not None:
+        query = query.filter(Price.ts < end)
+    # an item's history walks ix_price_item_id_currency_id_ts
+    return query.order_by(Price.ts, Price.id) if item_id is not None else query.order_by(Price.id)
+
+
+# trades are amounts in the item currency, timed by the offer that made them
+def trades(item_id=None, start=None, end=None):
+    query = db.session.query(Trade.id, Trade.item_id, Item.code, Currency.code, Trade.buyer_id, Trade.seller_id,
+                             Trade.quantity, Trade.unit_price, Trade.offer_id, Offer.ts, Trade.description) \
+        .join(Item, Item.id == Trade.item_id) \
+        .join(Currency, Currency.id == Item.currency_id) \
+        .join(Offer, Offer.id == Trade.offer_id)
+    if item_id is not None:
+        query = query.filter(Trade.item_id == item_id)
+    if start is not None:
+        query = query.filter(Offer.ts >= start)
+    if end is not None:
+        query = query.filter(Offer.ts < end)
+    return query.order_by(Trade.id)
+
+
+# yield_per reads through a server-side cursor where the driver has one
+def batches(query, size):
+    batch = []
+    for row in query.yield_per(size):
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Write-only file object handing back whatever a writer produced since the
+# last drain(), so each record batch goes out as soon as it is encoded.
+class Sink(object):
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def write_csv(columns, batches):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([name for name, _ in columns])
+    for batch in batches:
+        writer.writerows([v.isoformat() if isinstance(v, datetime) else v for v in row] for row in batch)
+        yield out.getvalue().encode()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue().encode()
+
+
+def arrow_schema(columns):
+    types = {
+        'int': pyarrow.int64(),
+        'str': pyarrow.string(),
+        'decimal': pyarrow.decimal128(16, 6),
+        'datetime': pyarrow.timestamp('us'),
+    }
+    return pyarrow.schema([(name, types[kind]) for name, kind in columns])
+
+
+def record_batch(schema, batch):
+    arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_arrow(columns, batches):
+    schema = arrow_schema(columns)
+    sink = Sink()
+    writer = pyarrow.ipc.new_stream(pyarrow.PythonFile(sink, mode='w'), schema)
+    for batch in batches:
+        writer.write_batch(record_batch(schema, batch))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+# every batch becomes one row group; the footer goes out last
+def write_parquet(columns, batches):
+    schema = arrow_schema(columns)
+    sink = Sink()
+    writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode='w'), schema)
+    for batch in batches:
+        writer.write_table(pyarrow.Table.from_batches([record_batch(schema, batch)]))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+WRITERS = {
+    'csv': write_csv,
+    'arrow': write_arrow,
+    'parquet': write_parquet,
+}
+
+
+def response(name, columns, query, format):
+    mimetype, extension = FORMATS[format]
+    chunks = WRITERS[format](columns, batches(query, current_app.config['EXPORT_BATCH_SIZE']))
+    headers = {'Content-Disposition': 'attachment; filename={}.{}'.format(name, extension)}
+    return Response(stream_with_context(chunk for chunk in chunks if chunk), mimetype=mimetype, headers=headers)
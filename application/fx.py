@@ -0,0 +1,98 @@
+import bisect
+import threading
+from datetime import datetime, time
+from decimal import Decimal
+
+from . import db
+from .models import Currency, CurrencyRate, CurrencyRateReport
+from .watermark import Watermark
+
+ONE = Decimal(1)
+
+
+# CurrencyRate history held as one sorted (ts, rate) array per
+# (currency_id, base_currency_id) pair, where one unit of currency is worth
+# `rate` units of base currency. refresh() only reads rows with an id past the
+# last one seen, so calling it once per request keeps every worker current
+# at the cost of a primary key range scan. Days whose ticks were rolled up
+# and dropped are covered by their closing rate, quoted at the end of the day.
+# Rates are added under the lock but quoted without it, so add() never
+# leaves a pair where a reader could see a time without its rate.
+class RateBook(object):
+
+    def __init__(self):
+        self.pairs = {}
+        self.watermark = Watermark(0)
+        self.base_currency_id = None
+        self.lock = threading.RLock()
+
+    def refresh(self):
+        with self.lock:
+            if self.base_currency_id is None:
+                self.base_currency_id = db.session.query(Currency.id) \
+                    .filter(Currency.is_base_currency.is_(True)).scalar()
+                self.load_closes()
+
+            rows = db.session.query(CurrencyRate.id, CurrencyRate.currency_id, CurrencyRate.base_currency_id,
+                                    CurrencyRate.ts, CurrencyRate.rate) \
+                .filter(self.watermark.unread(CurrencyRate.id)).order_by(CurrencyRate.id)
+            for id, currency_id, base_currency_id, ts, rate in rows:
+                if self.watermark.seen(id):
+                    self.add(currency_id, base_currency_id, ts, rate)
+        return self
+
+    def load_closes(self):
+        first = db.session.query(db.func.min(CurrencyRate.ts)).scalar()
+        rows = db.session.query(CurrencyRateReport.currency_id, CurrencyRateReport.base_currency_id,
+                                CurrencyRateReport.trading_date, CurrencyRateReport.last_rate)
+        if first is not None:
+            rows = rows.filter(CurrencyRateReport.trading_date < first.date())
+        for currency_id, base_currency_id, trading_date, rate in rows.order_by(CurrencyRateReport.trading_date):
+            self.add(currency_id, base_currency_id, datetime.combine(trading_date, time.max), rate)
+
+    # appends the rate ahead of its time; a rate quoted out of order goes
+    # into copies that replace the pair whole
+    def add(self, currency_id, base_currency_id, ts, rate):
+        with self.lock:
+            key = (currency_id, base_currency_id)
+            times, rates = self.pairs.setdefault(key, ([], []))
+            if not times or ts >= times[-1]:
+                rates.append(rate)
+                times.append(ts)
+            else:
+                i = bisect.bisect_right(times, ts)
+                self.pairs[key] = (times[:i] + [ts] + times[i:], rates[:i] + [rate] + rates[i:])
+
+    # latest quoted rate at or before `at`, or None
+    def quote(self, currency_id, base_currency_id, at):
+        pair = self.pairs.get((currency_id, base_currency_id))
+        if pair is None:
+            return None
+        i = bisect.bisect_right(pair[0], at)
+        return pair[1][i - 1] if i else None
+
+    def direct(self, from_id, to_id, at):
+        if from_id == to_id:
+            return ONE
+        rate = self.quote(from_id, to_id, at)
+        if rate is not None:
+            return rate
+        rate = self.quote(to_id, from_id, at)
+        if rate:
+            return ONE / rate
+        return None
+
+    # from -> to directly when the pair is quoted, otherwise crossed through
+    # the base currency
+    def rate(self, from_id, to_id, at):
+        rate = self.direct(from_id, to_id, at)
+        if rate is not None or self.base_currency_id is None:
+            return rate
+        from_base = self.direct(from_id, self.base_currency_id, at)
+        to_base = self.direct(to_id, self.base_currency_id, at)
+        if from_base is None or not to_base:
+            return None
+        return from_base / to_base
+
+
+rates = RateBook()
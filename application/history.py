@@ -0,0 +1,141 @@
+import re
+from datetime import date, datetime, time
+
+from sqlalchemy import text
+
+from . import db, reports
+from .models import CurrencyRate, CurrencyRateReport, Price
+
+# tick tables kept as monthly ranges of `ts`
+TABLES = {
+    'price': Price,
+    'currency_rate': CurrencyRate,
+}
+
+PARTITION = re.compile(r'^(\w+)_(\d{4})_(\d{2})$')
+
+
+def month(day):
+    return date(day.year, day.month, 1)
+
+
+# first day of the month `count` months after the one of `day`
+def add_months(day, count):
+    count += day.year * 12 + day.month - 1
+    return date(count // 12, count % 12 + 1, 1)
+
+
+def months(start, end):
+    day = month(start)
+    while day < end:
+        yield day
+        day = add_months(day, 1)
+
+
+def partition_name(table, day):
+    return '{}_{:%Y_%m}'.format(table, day)
+
+
+# True when `table` is a PostgreSQL partitioned table; everywhere else the
+# monthly ranges are emulated on ix_<table>_ts
+def partitioned(table):
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return bool(db.session.execute(text(
+        'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :table'),
+        {'table': table}).scalar())
+
+
+# first day of every monthly partition of `table`, oldest first
+def partitions(table):
+    rows = db.session.execute(text(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table'), {'table': table})
+    days = []
+    for name, in rows:
+        match = PARTITION.match(name)
+        if match and match.group(1) == table:
+            days.append(date(int(match.group(2)), int(match.group(3)), 1))
+    return sorted(days)
+
+
+def create_partitions(table, start, end):
+    created = []
+    existing = set(partitions(table))
+    for day in months(start, end):
+        if day not in existing:
+            db.session.execute(text("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ('{}') TO ('{}')".format(
+                partition_name(table, day), table, day, add_months(day, 1))))
+            created.append(day)
+    return created
+
+
+def oldest(table):
+    model = TABLES[table]
+    ts = db.session.query(db.func.min(model.ts)).scalar()
+    return ts and month(ts)
+
+
+# Removes the raw ticks of [start, end). Whole partitions are dropped, which
+# frees their space at once and leaves no dead rows to vacuum; anything else
+# is deleted by ts range through the ts index.
+def purge(table, start, end):
+    model = TABLES[table]
+    if partitioned(table):
+        dropped = [day for day in partitions(table) if start <= day and add_months(day, 1) <= end]
+        for day in dropped:
+            db.session.execute(text('DROP TABLE {}'.format(partition_name(table, day))))
+        start = max([start] + [add_months(day, 1) for day in dropped])
+    start_ts, end_ts = datetime.combine(start, time()), datetime.combine(end, time())
+    if start_ts < end_ts:
+        model.query.filter(model.ts >= start_ts, model.ts < end_ts).delete(synchronize_session=False)
+
+
+# rebuilds the CurrencyRateReport rows of [start, end) from raw history
+# inside the caller's transaction
+def rollup_rates(start, end, batch_size=1000):
+    CurrencyRateReport.query \
+        .filter(CurrencyRateReport.trading_date >= start, CurrencyRateReport.trading_date < end) \
+        .delete(synchronize_session=False)
+
+    start_ts, end_ts = datetime.combine(start, time()), datetime.combine(end, time())
+    rows = db.session.query(CurrencyRate.currency_id, CurrencyRate.base_currency_id, CurrencyRate.ts,
+                            CurrencyRate.rate) \
+        .filter(CurrencyRate.ts >= start_ts, CurrencyRate.ts < end_ts) \
+        .order_by(CurrencyRate.currency_id, CurrencyRate.base_currency_id, CurrencyRate.ts, CurrencyRate.id)
+    rollups = {}
+    for currency_id, base_currency_id, ts, rate in rows.yield_per(batch_size):
+        key = (ts.date(), currency_id, base_currency_id)
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = CurrencyRateReport(
+                trading_date=key[0], currency_id=currency_id, base_currency_id=base_currency_id,
+                first_rate=rate, min_rate=rate, max_rate=rate)
+            db.session.add(rollup)
+        rollup.last_rate = rate
+        rollup.min_rate = min(rollup.min_rate, rate)
+        rollup.max_rate = max(rollup.max_rate, rate)
+    return rollups
+
+
+# daily rollup each table's ticks are folded into before they are dropped
+ROLLUPS = {
+    'price': reports.rebuild,
+    'currency_rate': rollup_rates,
+}
+
+
+# Rolls the raw ticks of every month before `before` into the daily reports
+# and drops them, one month per transaction, oldest first. Each month is
+# rebuilt from its ticks right before they go, so a month is only ever
+# rolled up while it is complete; rebuilding it later would lose its prices.
+def retain(before, batch_size=1000):
+    before = month(before)
+    for table in TABLES:
+        start = oldest(table)
+        for day in months(start, before) if start else ():
+            end = add_months(day, 1)
+            ROLLUPS[table](day, end, batch_size)
+            purge(table, day, end)
+            db.session.commit()
+            yield table, day
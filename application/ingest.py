@@ -0,0 +1,214 @@
+import csv
+import io
+import json
+from datetime import timezone
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app, request
+from flask_restplus import inputs
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+from .models import Currency, CurrencyRate, Item, Offer, Price, Trade, Trader
+from .reports import ReportFolder
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+CSV_MIMETYPE = 'text/csv'
+
+
+def integer(value):
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise ValueError('expected an integer, got {!r}'.format(value))
+    return int(value)
+
+
+def optional_integer(value):
+    return None if value in (None, '') else integer(value)
+
+
+def decimal(value):
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError('expected a number, got {!r}'.format(value))
+    if not value.is_finite():
+        raise ValueError('expected a finite number, got {!r}'.format(value))
+    return value
+
+
+def timestamp(value):
+    if not isinstance(value, str):
+        raise ValueError('expected an ISO 8601 timestamp, got {!r}'.format(value))
+    value = inputs.datetime_from_iso8601(value)
+    # stored as naive UTC, like every other timestamp
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def text(value):
+    if not isinstance(value, str):
+        raise ValueError('expected a string, got {!r}'.format(value))
+    try:
+        value.encode('utf-8')
+    except UnicodeEncodeError:
+        raise ValueError('expected UTF-8 text, got {!r}'.format(value))
+    return value
+
+
+class BulkSpec(object):
+
+    def __init__(self, model, columns, references=(), after_insert=None):
+        self.model = model
+        self.columns = columns
+        self.references = references
+        self.after_insert = after_insert
+
+    def coerce(self, record):
+        if not isinstance(record, dict):
+            raise ValueError('expected an object')
+        row = {}
+        for name, convert in self.columns:
+            value = record.get(name)
+            if value is None and convert is not optional_integer:
+                raise ValueError('{} is required'.format(name))
+            try:
+                row[name] = convert(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError('{}: {}'.format(name, e))
+        return row
+
+    # drops rows pointing at ids that do not exist, one IN query per reference
+    def check_references(self, rows, errors):
+        for column, target in self.references:
+            ids = {row[column] for _, row in rows if row[column] is not None}
+            known = {id for id, in db.session.query(target.id).filter(target.id.in_(ids))} if ids else set()
+            valid = []
+            for n, row in rows:
+                if row[column] is None or row[column] in known:
+                    valid.append((n, row))
+                else:
+                    errors.append((n, 'unknown {} {}'.format(column, row[column])))
+            rows = valid
+        return rows
+
+
+def fold_prices(rows):
+    folder = ReportFolder()
+    for row in sorted(rows, key=lambda row: row['ts']):
+        folder.add_price(row['item_id'], row['currency_id'], row['ts'], row['buy'], row['sell'])
+
+
+def fold_trades(rows):
+    offer_ts = dict(db.session.query(Offer.id, Offer.ts).filter(Offer.id.in_({row['offer_id'] for row in rows})))
+    currencies = dict(db.session.query(Item.id, Item.currency_id).filter(Item.id.in_({row['item_id'] for row in rows})))
+    folder = ReportFolder()
+    for row in rows:
+        folder.add_trade(row['item_id'], currencies[row['item_id']], offer_ts[row['offer_id']].date(),
+                         row['quantity'], row['unit_price'])
+
+
+prices = BulkSpec(
+    Price,
+    (('item_id', integer), ('currency_id', integer), ('buy', decimal), ('sell', decimal), ('ts', timestamp)),
+    references=(('item_id', Item), ('currency_id', Currency)),
+    after_insert=fold_prices
+)
+
+currency_rates = BulkSpec(
+    CurrencyRate,
+    (('currency_id', integer), ('base_currency_id', integer), ('rate', decimal), ('ts', timestamp)),
+    references=(('currency_id', Currency), ('base_currency_id', Currency))
+)
+
+trades = BulkSpec(
+    Trade,
+    (('item_id', integer), ('buyer_id', integer), ('seller_id', optional_integer), ('quantity', decimal),
+     ('unit_price', decimal), ('description', text), ('offer_id', integer)),
+    references=(('item_id', Item), ('buyer_id', Trader), ('seller_id', Trader), ('offer_id', Offer)),
+    after_insert=fold_trades
+)
+
+
+# (row number, record) pairs from a JSON array, NDJSON or CSV body; NDJSON
+# lines are decoded later and CSV bytes that are not UTF-8 are kept as lone
+# surrogates for text() to reject, so one bad line only fails its own row
+def records():
+    mimetype = request.mimetype
+    if mimetype == NDJSON_MIMETYPE:
+        return ((n, line) for n, line in enumerate(request.stream, 1) if line.strip())
+    if mimetype == CSV_MIMETYPE:
+        reader = csv.DictReader(io.TextIOWrapper(request.stream, encoding='utf-8', errors='surrogateescape',
+                                                 newline=''))
+        return ((n, {k: v for k, v in record.items() if v != ''}) for n, record in enumerate(reader, 1))
+
+    body = request.get_json(force=True, silent=True)
+    if not isinstance(body, list):
+        raise ValueError('Expected a JSON array, NDJSON or CSV body.')
+    return enumerate(body, 1)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for entry in iterable:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Validates and inserts records chunk by chunk, one executemany and one
+# transaction per chunk. Bad rows are reported and skipped; if a chunk still
+# fails in the database it is retried row by row to isolate the offenders.
+def ingest(spec, rows, chunk_size=None, max_errors=None):
+    if chunk_size is None:
+        chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    if max_errors is None:
+        max_errors = current_app.config['BULK_MAX_ERRORS']
+    inserted = 0
+    errors = []
+
+    for chunk in chunked(rows, chunk_size):
+        valid = []
+        for n, record in chunk:
+            try:
+                if isinstance(record, bytes):
+                    record = json.loads(record.decode('utf-8'))
+                valid.append((n, spec.coerce(record)))
+            except ValueError as e:
+                errors.append((n, str(e)))
+        valid = spec.check_references(valid, errors)
+        if not valid:
+            continue
+
+        try:
+            write(spec, [row for _, row in valid])
+            inserted += len(valid)
+        except SQLAlchemyError:
+            db.session.rollback()
+            for n, row in valid:
+                try:
+                    write(spec, [row])
+                    inserted += 1
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    errors.append((n, str(e.orig if hasattr(e, 'orig') else e)))
+
+    return {
+        'inserted': inserted,
+        'failed': len(errors),
+        'errors': [{'row': n, 'error': error} for n, error in sorted(errors)[:max_errors]]
+    }
+
+
+def insert(spec, rows):
+    db.session.execute(spec.model.__table__.insert(), rows)
+    if spec.after_insert is not None:
+        spec.after_insert(rows)
+
+
+def write(spec, rows):
+    insert(spec, rows)
+    db.session.commit()
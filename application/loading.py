@@ -0,0 +1,45 @@
+from flask_restplus import fields as restplus_fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+
+_plans = {}
+
+
+# Loader options for everything a marshal model nests, so a page of rows is
+# built with a fixed number of SELECTs instead of one lazy load per relationship
+# per row. Many-to-one references are joined into the main query; collections
+# get one extra IN query each.
+def load_plan(model, fields):
+    key = (model, id(fields))
+    if key not in _plans:
+        _plans[key] = (fields, list(_options(model, fields)))
+    return _plans[key][1]
+
+
+# drops the plans of a marshal model that is going away; each one holds on
+# to its model, so no other model can take the same id until then
+def forget(fields):
+    for key in list(_plans):
+        if key[1] == id(fields):
+            _plans.pop(key, None)
+
+
+def _options(model, fields, parent=None):
+    relationships = inspect(model).relationships
+    for name, field in fields.items():
+        if not isinstance(field, restplus_fields.Nested):
+            continue
+        relationship = relationships.get(field.attribute or name)
+        if relationship is None:
+            continue
+
+        strategy = selectinload if relationship.uselist else joinedload
+        attr = getattr(model, relationship.key)
+        if parent is None:
+            loader = strategy(attr)
+        else:
+            loader = getattr(parent, strategy.__name__)(attr)
+
+        yield loader
+        for option in _options(relationship.mapper.class_, field.nested, loader):
+            yield option
@@ -0,0 +1,198 @@
+import heapq
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from . import db
+from .models import CurrentInventory, Item, Offer, Trade
+from .reports import ReportFolder
+
+
+class Order(object):
+    __slots__ = ('offer_id', 'trader_id', 'buy', 'price', 'quantity')
+
+    def __init__(self, offer_id, trader_id, buy, price, quantity):
+        self.offer_id = offer_id
+        self.trader_id = trader_id
+        self.buy = buy
+        self.price = price
+        self.quantity = quantity
+
+
+# Bid and ask ladders are heaps keyed on (price, offer id), bids with the
+# price negated, so the head of each side is always the best price and, within
+# a price, the order that arrived first. Offer ids are handed out under the
+# item's lock as offers are submitted, so time priority never depends on the
+# client supplied `ts`. Cancelled or filled orders are dropped lazily when they
+# reach the head.
+class OrderBook(object):
+
+    def __init__(self):
+        self.bids = []
+        self.asks = []
+        self.orders = {}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order):
+        if order.buy:
+            heapq.heappush(self.bids, (-order.price, order.offer_id, order))
+        else:
+            heapq.heappush(self.asks, (order.price, order.offer_id, order))
+        self.orders[order.offer_id] = order
+
+    def cancel(self, offer_id):
+        order = self.orders.pop(offer_id, None)
+        if order is not None:
+            order.quantity = 0
+        return order
+
+    def best(self, buy):
+        side = self.bids if buy else self.asks
+        while side and side[0][2].quantity <= 0:
+            heapq.heappop(side)
+        return side[0][2] if side else None
+
+    # Returns (maker, quantity, price) fills at the makers' prices; whatever
+    # is left of `order` rests on the book, unless it reached a resting order
+    # of its own trader, in which case the rest of it is cancelled.
+    def match(self, order):
+        fills = []
+        side = self.asks if order.buy else self.bids
+        while order.quantity > 0:
+            maker = self.best(not order.buy)
+            if maker is None:
+                break
+            if order.buy and maker.price > order.price or not order.buy and maker.price < order.price:
+                break
+            if maker.trader_id == order.trader_id:
+                return fills
+            quantity = min(order.quantity, maker.quantity)
+            order.quantity -= quantity
+            maker.quantity -= quantity
+            fills.append((maker, quantity, maker.price))
+            if maker.quantity <= 0:
+                heapq.heappop(side)
+                del self.orders[maker.offer_id]
+        if order.quantity > 0:
+            self.add(order)
+        return fills
+
+
+    # (count, open quantity, newest offer id) of the resting orders, to be
+    # compared with the same figures for the item's active offers
+    def state(self):
+        return (len(self.orders), sum(order.quantity for order in self.orders.values()),
+                max(self.orders) if self.orders else None)
+
+
+# One book per item, loaded lazily from the active offers. Every submit locks
+# the item's row and checks its book against the active offers first, so a
+# book another process has traded against is reloaded before it is used.
+class MatchingEngine(object):
+
+    def __init__(self):
+        self.books = {}
+        self.lock = threading.Lock()
+
+    def book(self, item_id, exclude=None):
+        book = self.books.get(item_id)
+        offers = Offer.query.filter(Offer.item_id == item_id, Offer.is_active.is_(True), Offer.id != exclude)
+        if book is not None:
+            count, quantity, last = offers.with_entities(db.func.count(Offer.id), db.func.sum(Offer.quantity),
+                                                         db.func.max(Offer.id)).one()
+            if (count, quantity or 0, last) != book.state():
+                book = None
+        if book is None:
+            book = OrderBook()
+            for offer in offers.order_by(Offer.id):
+                book.add(Order(offer.id, offer.trader_id, offer.buy, offer.price, offer.quantity))
+            self.books[item_id] = book
+        return book
+
+    def reset(self, item_id=None):
+        if item_id is None:
+            self.books.clear()
+        else:
+            self.books.pop(item_id, None)
+
+    # Matches a new offer, then writes the trades, the offers' open quantity,
+    # both inventories and the day's report in a single transaction. If that
+    # transaction fails the item's book is dropped and reloaded on next use.
+    def submit(self, offer):
+        with self.lock:
+            try:
+                Item.query.filter(Item.id == offer.item_id).with_for_update().one()
+                db.session.add(offer)
+                db.session.flush()
+                book = self.book(offer.item_id, exclude=offer.id)
+                order = Order(offer.id, offer.trader_id, offer.buy, offer.price, offer.quantity)
+                trades = self.settle(offer, book.match(order))
+                offer.quantity = order.quantity
+                offer.is_active = offer.id in book.orders
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.reset(offer.item_id)
+                raise
+        return trades
+
+    def settle(self, offer, fills):
+        trades = []
+        if not fills:
+            return trades
+
+        currency_id = db.session.query(Item.currency_id).filter(Item.id == offer.item_id).scalar()
+        folder = ReportFolder()
+        makers = {o.id: o for o in Offer.query.filter(Offer.id.in_([m.offer_id for m, _, _ in fills]))}
+
+        for maker, quantity, price in fills:
+            maker_offer = makers[maker.offer_id]
+            maker_offer.quantity = maker.quantity
+            maker_offer.is_active = maker.quantity > 0
+
+            buyer_id, seller_id = (offer.trader_id, maker.trader_id) if offer.buy else (maker.trader_id, offer.trader_id)
+            trade = Trade(
+                item_id=offer.item_id,
+                buyer_id=buyer_id,
+                seller_id=seller_id,
+                quantity=quantity,
+                unit_price=price,
+                description='Offer {} matched resting offer {}'.format(offer.id, maker.offer_id),
+                offer_id=offer.id
+            )
+            db.session.add(trade)
+            trades.append(trade)
+
+            inventory(buyer_id, offer.item_id).quantity += quantity
+            inventory(seller_id, offer.item_id).quantity -= quantity
+            folder.add_trade(offer.item_id, currency_id, offer.ts.date(), quantity, price)
+        return trades
+
+
+def inventory(trader_id, item_id):
+    current_inventory = CurrentInventory.query.filter(
+        CurrentInventory.trader_id == trader_id,
+        CurrentInventory.item_id == item_id
+    ).first()
+    if current_inventory is None:
+        current_inventory = CurrentInventory(trader_id=trader_id, item_id=item_id, quantity=0)
+        db.session.add(current_inventory)
+    return current_inventory
+
+
+def new_offer(trader_id, item_id, buy, price, quantity, ts=None):
+    return Offer(
+        trader_id=trader_id,
+        item_id=item_id,
+        buy=buy,
+        sell=not buy,
+        price=Decimal(str(price)),
+        quantity=Decimal(str(quantity)),
+        ts=ts or datetime.utcnow(),
+        is_active=True
+    )
+
+
+engine = MatchingEngine()
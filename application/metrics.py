@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from .log import logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# statements kept per request for the slow request log
+MAX_STATEMENTS = 100
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def samples(self, name, labels):
+        for bound, count in zip(self.buckets, self.counts):
+            yield name + '_bucket', dict(labels, le=_number(bound)), count
+        yield name + '_bucket', dict(labels, le='+Inf'), self.count
+        yield name + '_sum', labels, self.sum
+        yield name + '_count', labels, self.count
+
+
+# Per-route request metrics for the api blueprint, plus the number of SQL
+# statements and database time attributed to each request. Values are kept
+# per worker process.
+class Metrics(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.histograms = {}
+
+    def init_blueprint(self, blueprint):
+        blueprint.before_request(self.before_request)
+        blueprint.after_request(self.after_request)
+
+    def init_engine(self, engine):
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+        g.db_statements = []
+
+    # recorded once the response is closed, so a streamed body's time and
+    # the queries run while streaming it are counted with the request
+    def after_request(self, response):
+        if 'metrics_started' not in g:
+            return response
+
+        stats = g._get_current_object()
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method, path = request.method, request.full_path
+        slow_ms = current_app.config['SLOW_REQUEST_MS']
+        sample_rate = current_app.config['SLOW_REQUEST_SAMPLE_RATE']
+
+        def record():
+            elapsed = time.perf_counter() - stats.metrics_started
+            labels = {'route': route, 'method': method}
+            with self.lock:
+                key = (route, method, str(response.status_code))
+                self.requests[key] = self.requests.get(key, 0) + 1
+                self.observe('http_request_duration_seconds', LATENCY_BUCKETS, labels, elapsed)
+                if response.content_length is not None:
+                    self.observe('http_response_size_bytes', SIZE_BUCKETS, labels, response.content_length)
+                self.observe('db_queries_per_request', QUERY_BUCKETS, labels, stats.db_queries)
+                self.observe('db_time_per_request_seconds', LATENCY_BUCKETS, labels, stats.db_time)
+
+            if elapsed * 1e3 >= slow_ms and random.random() < sample_rate:
+                self.log_slow_request(method, path, elapsed, stats)
+
+        response.call_on_close(record)
+        return response
+
+    def observe(self, name, buckets, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        if has_request_context() and 'metrics_started' in g:
+            g.db_queries += 1
+            g.db_time += elapsed
+            if len(g.db_statements) < MAX_STATEMENTS:
+                g.db_statements.append((elapsed, statement))
+
+    def log_slow_request(self, method, path, elapsed, stats):
+        statements = sorted(stats.db_statements, key=lambda s: s[0], reverse=True)[:5]
+        logger.warning('Slow request %s %s took %.1f ms with %d queries (%.1f ms in the database)%s',
+                       method, path, elapsed * 1e3, stats.db_queries, stats.db_time * 1e3,
+                       ''.join('\n  %.1f ms: %s' % (t * 1e3, s) for t, s in statements))
+
+    def render(self, prefix='api_', gauges=None):
+        lines = []
+        with self.lock:
+            lines.append('# TYPE {}http_requests_total counter'.format(prefix))
+            for (route, method, status), count in sorted(self.requests.items()):
+                labels = {'route': route, 'method': method, 'status': status}
+                lines.append(_sample(prefix + 'http_requests_total', labels, count))
+
+            typed = set()
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append('# TYPE {}{} histogram'.format(prefix, name))
+                    typed.add(name)
+                for sample_name, sample_labels, value in histogram.samples(prefix + name, dict(labels)):
+                    lines.append(_sample(sample_name, sample_labels, value))
+
+        for name, value in sorted((gauges or {}).items()):
+            if value is not None:
+                lines.append('# TYPE {}{} gauge'.format(prefix, name))
+                lines.append(_sample(prefix + name, {}, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _sample(name, labels, value):
+    if labels:
+        name += '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                               for k, v in sorted(labels.items())) + '}'
+    return '{} {}'.format(name, _number(value))
+
+
+metrics = Metrics()
@@ -38,7 +38,25 @@ class CurrencyRate(db.Model):
     base_currency_id = db.Column(db.Integer, db.ForeignKey('currency.id'), nullable=False)
     base_currency = db.relationship('Currency', backref='base_currency_rate', lazy=True, foreign_keys = [base_currency_id])
     rate = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
-    ts = db.Column(db.DateTime, index=False, unique=False, nullable=False)
+    ts = db.Column(db.DateTime, index=True, unique=False, nullable=False)
+
+
+# daily rollup of CurrencyRate ticks, kept after the raw history is dropped
+class CurrencyRateReport(db.Model):
+    __table_args__ = (
+        db.Index('currency_rate_report_ak_1', 'trading_date', 'currency_id', 'base_currency_id', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    trading_date = db.Column(db.Date, index=True, unique=False, nullable=False)
+    currency_id = db.Column(db.Integer, db.ForeignKey('currency.id'), nullable=False)
+    currency = db.relationship('Currency', backref='currency_rate_report', lazy=True, foreign_keys = [currency_id])
+    base_currency_id = db.Column(db.Integer, db.ForeignKey('currency.id'), nullable=False)
+    base_currency = db.relationship('Currency', backref='base_currency_rate_report', lazy=True, foreign_keys = [base_currency_id])
+    first_rate = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
+    last_rate = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
+    min_rate = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
+    max_rate = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
 
 
 class CurrencyUsed(db.Model):
@@ -55,15 +73,28 @@ class CurrencyUsed(db.Model):
 
 class CurrentInventory(db.Model):
     # __tablename__ = 'current_inventory'
+    __table_args__ = (
+        db.Index('current_inventory_ak_1', 'trader_id', 'item_id', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    trader_id = db.Column(db.Integer, db.ForeignKey('trader.id'), index=True, unique=True, nullable=False)
+    trader_id = db.Column(db.Integer, db.ForeignKey('trader.id'), index=True, unique=False, nullable=False)
     trader = db.relationship('Trader', backref='current_inventory', lazy=True, foreign_keys = [trader_id])
-    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), index=True, unique=True, nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), index=True, unique=False, nullable=False)
     item = db.relationship('Item', backref='current_inventory', lazy=True, foreign_keys = [item_id])
     quantity = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
 
 
+# how far the writer has drained one write-ahead log slot, committed along
+# with the rows it wrote (see application/wal.py)
+class IngestCheckpoint(db.Model):
+
+    slot = db.Column(db.String(255), primary_key=True)
+    segment = db.Column(db.Integer, index=False, unique=False, nullable=False)
+    offset = db.Column(db.Integer, index=False, unique=False, nullable=False)
+    ts = db.Column(db.DateTime, index=False, unique=False, nullable=False)
+
+
 class Item(db.Model):
     # __tablename__ = 'item'
 
@@ -79,9 +110,12 @@ class Item(db.Model):
 # list of all offers avaliable to buy/sell
 class Offer(db.Model):
     # __tablename__ = 'offer'
+    __table_args__ = (
+        db.Index('ix_offer_item_id_is_active', 'item_id', 'is_active'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    trader_id = db.Column(db.Integer, db.ForeignKey('trader.id'), index=True, unique=True, nullable=False)
+    trader_id = db.Column(db.Integer, db.ForeignKey('trader.id'), index=True, unique=False, nullable=False)
     trader = db.relationship('Trader', backref='offer', lazy=True, foreign_keys = [trader_id])
     item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
     item = db.relationship('Item', backref='offer', lazy=True, foreign_keys = [item_id])
@@ -89,13 +123,37 @@ class Offer(db.Model):
     buy = db.Column(db.Boolean, index=False, unique=False, nullable=False)
     sell = db.Column(db.Boolean, index=False, unique=False, nullable=False)
     price = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
-    ts = db.Column(db.DateTime, index=False, unique=False, nullable=False)
+    ts = db.Column(db.DateTime, index=True, unique=False, nullable=False)
     is_active = db.Column(db.Boolean, index=False, unique=False, nullable=False)
 
 
+# a trader's position in one item as replayed from the trade ledger up to
+# `ts`, with the open lots the P&L `method` keeps
+class PositionSnapshot(db.Model):
+    __table_args__ = (
+        db.Index('position_snapshot_ak_1', 'trader_id', 'method', 'ts', 'item_id', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    trader_id = db.Column(db.Integer, db.ForeignKey('trader.id'), nullable=False)
+    trader = db.relationship('Trader', backref='position_snapshot', lazy=True, foreign_keys = [trader_id])
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), index=True, unique=False, nullable=False)
+    item = db.relationship('Item', backref='position_snapshot', lazy=True, foreign_keys = [item_id])
+    method = db.Column(db.String(16), index=False, unique=False, nullable=False)
+    ts = db.Column(db.DateTime, index=False, unique=False, nullable=False)
+    last_trade_id = db.Column(db.Integer, index=False, unique=False, nullable=False)
+    quantity = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
+    realized = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
+    trades = db.Column(db.Integer, index=False, unique=False, nullable=False)
+    lots = db.Column(db.Text, index=False, unique=False, nullable=False)
+
+
 # list of history prices (buy & sell)
 class Price(db.Model):
     # __tablename__ = 'price'
+    __table_args__ = (
+        db.Index('ix_price_item_id_currency_id_ts', 'item_id', 'currency_id', 'ts'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
@@ -104,15 +162,19 @@ class Price(db.Model):
     currency = db.relationship('Currency', backref='price', lazy=True, foreign_keys = [currency_id])
     buy = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
     sell = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
-    ts = db.Column(db.DateTime, index=False, unique=False, nullable=False)
+    ts = db.Column(db.DateTime, index=True, unique=False, nullable=False)
 
 
 class Report(db.Model):
+    __table_args__ = (
+        db.Index('report_ak_1', 'trading_date', 'item_id', 'currency_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    trading_date = db.Column(db.Date, index=True, unique=True, nullable=False)
-    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), index=True, unique=True, nullable=False)
+    trading_date = db.Column(db.Date, index=True, unique=False, nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), index=True, unique=False, nullable=False)
     item = db.relationship('Item', backref='report', lazy=True, foreign_keys = [item_id])
-    currency_id = db.Column(db.Integer, db.ForeignKey('currency.id'), index=True, unique=True, nullable=False)
+    currency_id = db.Column(db.Integer, db.ForeignKey('currency.id'), index=True, unique=False, nullable=False)
     currency = db.relationship('Currency', backref='report', lazy=True, foreign_keys = [currency_id])
     first_price = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=True)
     last_price = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=True)
@@ -127,16 +189,16 @@ class Trade(db.Model):
     # __tablename__ = 'trade'
 
     id = db.Column(db.Integer, primary_key=True)
-    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), index=True, nullable=False)
     item = db.relationship('Item', backref='trade', lazy=True, foreign_keys = [item_id])
-    buyer_id = db.Column(db.Integer, db.ForeignKey('trader.id'), index=True, unique=True, nullable=False)
+    buyer_id = db.Column(db.Integer, db.ForeignKey('trader.id'), index=True, unique=False, nullable=False)
     buyer = db.relationship('Trader', backref='trade_buyer', lazy=True, foreign_keys = [buyer_id])
-    seller_id = db.Column(db.Integer, db.ForeignKey('trader.id'), index=True, unique=True, nullable=True)
+    seller_id = db.Column(db.Integer, db.ForeignKey('trader.id'), index=True, unique=False, nullable=True)
     seller = db.relationship('Trader', backref='trade_seller', lazy=True, foreign_keys = [seller_id])
     quantity = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
     unit_price = db.Column(db.Numeric(16,6), index=False, unique=False, nullable=False)
     description = db.Column(db.Text, index=False, unique=False, nullable=False)
-    offer_id = db.Column(db.Integer, db.ForeignKey('offer.id'), nullable=False)
+    offer_id = db.Column(db.Integer, db.ForeignKey('offer.id'), index=True, nullable=False)
     offer = db.relationship('Offer', backref='trade', lazy=True, foreign_keys = [offer_id])
 
 
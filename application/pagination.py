@@ -0,0 +1,140 @@
+import base64
+import json
+from datetime import date, datetime
+from urllib.parse import urlencode
+
+from flask import Response, current_app, request, stream_with_context
+from flask_restplus import abort, inputs, marshal, reqparse
+from sqlalchemy import and_, or_
+
+from .loading import load_plan
+from .projection import VIEWS, project
+from .serializers import dumps, serializer_for
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+page_parser = reqparse.RequestParser()
+page_parser.add_argument('limit', type=inputs.positive, location='args',
+                         help='Maximum number of rows per page')
+page_parser.add_argument('after', type=str, location='args',
+                         help='Cursor returned by the previous page (X-Next-Cursor header)')
+page_parser.add_argument('stream', type=inputs.boolean, default=False, location='args',
+                         help='Stream every row after the cursor as NDJSON')
+page_parser.add_argument('fields', type=str, location='args',
+                         help='Comma separated fields to return, e.g. id,item.code,quantity')
+page_parser.add_argument('view', choices=VIEWS, default='full', location='args',
+                         help='Nested references in full or as a summary')
+
+
+def encode_cursor(values):
+    values = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor, keys):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode())
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [_parse_key(key, value) for key, value in zip(keys, values)]
+    except (TypeError, ValueError):
+        abort(400, 'Invalid cursor.')
+
+
+def _parse_key(key, value):
+    column = key.property.columns[0] if hasattr(key, 'property') else key
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+# rows strictly after `values` in (k1, k2, ...) ascending order
+def after_clause(keys, values):
+    clauses = []
+    for i, key in enumerate(keys):
+        equal = [k == v for k, v in zip(keys[:i], values[:i])]
+        clauses.append(and_(*equal, key > values[i]))
+    return or_(*clauses)
+
+
+def wants_stream(args):
+    return args['stream'] or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+# `fast` selects plain column tuples through serializers.Serializer instead of
+# loading mapped objects and marshalling them, as does any request for a
+# projection of `fields`, so only the columns it returns are read. `columns`
+# are root columns `transform` reads from the rows besides those.
+def paginate(model, fields, query=None, keys=None, args=None, transform=None, fast=False, columns=()):
+    query = model.query if query is None else query
+    keys = (model.id,) if keys is None else keys
+    args = page_parser.parse_args() if args is None else args
+    projected = project(fields, args.get('fields'), args.get('view'))
+    fast = fast or projected is not fields
+    fields = projected
+    serializer = serializer_for(model, fields) if fast else None
+    if serializer is not None:
+        query = serializer.query(query, tuple(keys) + tuple(columns))
+    else:
+        query = query.options(*load_plan(model, fields))
+
+    if args['after']:
+        query = query.filter(after_clause(keys, decode_cursor(args['after'], keys)))
+    query = query.order_by(*keys)
+
+    if wants_stream(args):
+        return stream(query, fields, transform, serializer)
+
+    limit = min(args['limit'] or current_app.config['API_PAGE_SIZE'],
+                current_app.config['API_MAX_PAGE_SIZE'])
+    rows = query.limit(limit + 1).all()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+        headers['X-Next-Cursor'] = cursor
+        headers['Link'] = '<{}>; rel="next"'.format(next_url(cursor, limit))
+
+    if serializer is not None:
+        data = [serializer.row(row) for row in rows]
+    else:
+        data = marshal(rows, fields)
+    if transform is not None:
+        data = [transform(row, item) for row, item in zip(rows, data)]
+    if serializer is not None:
+        return Response(dumps(data), 200, headers, mimetype='application/json')
+    return data, 200, headers
+
+
+def next_url(cursor, limit):
+    args = request.args.copy()
+    args['after'] = cursor
+    args['limit'] = limit
+    return '{}?{}'.format(request.base_url, urlencode(list(args.items(multi=True))))
+
+
+# rows are pulled through a server-side cursor and written out batch by batch,
+# so memory stays flat however large the table is
+def stream(query, fields, transform=None, serializer=None):
+    batch_size = current_app.config['API_STREAM_BATCH_SIZE']
+
+    def generate():
+        batch = []
+        for row in query.yield_per(batch_size):
+            item = serializer.row(row) if serializer is not None else marshal(row, fields)
+            if transform is not None:
+                item = transform(row, item)
+            batch.append(dumps(item) if serializer is not None else (json.dumps(item) + '\n').encode())
+            if len(batch) >= batch_size:
+                yield b''.join(batch)
+                batch = []
+        if batch:
+            yield b''.join(batch)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
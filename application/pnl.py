@@ -0,0 +1,254 @@
+import json
+from collections import deque
+from decimal import Decimal
+
+from sqlalchemy import and_, or_
+
+from . import db, fx
+from .models import Item, Offer, PositionSnapshot, Price, Trade
+
+METHODS = ('fifo', 'average')
+
+ZERO = Decimal(0)
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+# Open lots of one item as signed (quantity, price) pairs, all long or all
+# short. A trade against the position closes lots first, realizing
+# (price - lot price) on what it closes, and opens a lot with whatever is
+# left. FIFO closes the oldest lot first; average cost keeps a single lot
+# at the average price.
+class Position(object):
+
+    def __init__(self, method, lots=(), realized=ZERO, trades=0):
+        self.method = method
+        self.lots = deque([_decimal(quantity), _decimal(price)] for quantity, price in lots)
+        self.realized = _decimal(realized)
+        self.trades = trades
+
+    @property
+    def quantity(self):
+        return sum((lot[0] for lot in self.lots), ZERO)
+
+    @property
+    def cost(self):
+        return sum((lot[0] * lot[1] for lot in self.lots), ZERO)
+
+    # `quantity` is positive for a buy and negative for a sell
+    def trade(self, quantity, price):
+        lots = self.lots
+        while quantity and lots and (lots[0][0] > 0) != (quantity > 0):
+            lot = lots[0]
+            closed = min(abs(quantity), abs(lot[0])) * (1 if lot[0] > 0 else -1)
+            self.realized += closed * (price - lot[1])
+            lot[0] -= closed
+            quantity += closed
+            if not lot[0]:
+                lots.popleft()
+        if quantity:
+            if self.method == 'average' and lots:
+                lot = lots[0]
+                total = lot[0] + quantity
+                lot[1] = (lot[0] * lot[1] + quantity * price) / total
+                lot[0] = total
+            else:
+                lots.append([quantity, price])
+        self.trades += 1
+
+
+# Every position of one trader, replayed from the trade ledger in trade id
+# order, the order trades were booked in, so a trade on a back-dated offer
+# is never left behind a snapshot taken before it was booked. `last_id` is
+# the last trade the loaded snapshot holds and `at` the offer time the
+# ledger has been replayed up to since.
+class Ledger(object):
+
+    def __init__(self, trader_id, method):
+        self.trader_id = trader_id
+        self.method = method
+        self.last_id = None
+        self.at = None
+        self.positions = {}
+
+    def position(self, item_id):
+        position = self.positions.get(item_id)
+        if position is None:
+            position = self.positions[item_id] = Position(self.method)
+        return position
+
+    # state at the latest snapshot at or before `at`; returns its ts, or
+    # None when there is none
+    def load(self, at):
+        ts = db.session.query(db.func.max(PositionSnapshot.ts)).filter(
+            PositionSnapshot.trader_id == self.trader_id,
+            PositionSnapshot.method == self.method,
+            PositionSnapshot.ts <= at
+        ).scalar()
+        if ts is None:
+            return None
+        snapshots = PositionSnapshot.query.filter(
+            PositionSnapshot.trader_id == self.trader_id,
+            PositionSnapshot.method == self.method,
+            PositionSnapshot.ts == ts
+        )
+        for snapshot in snapshots:
+            self.positions[snapshot.item_id] = Position(self.method, json.loads(snapshot.lots), snapshot.realized,
+                                                        snapshot.trades)
+            self.last_id = snapshot.last_trade_id
+        return ts
+
+    def query(self):
+        query = db.session.query(Trade.id, Trade.item_id, Trade.buyer_id, Trade.seller_id, Trade.quantity,
+                                 Trade.unit_price) \
+            .join(Offer, Offer.id == Trade.offer_id) \
+            .filter(or_(Trade.buyer_id == self.trader_id, Trade.seller_id == self.trader_id))
+        if self.last_id is not None:
+            query = query.filter(Trade.id > self.last_id)
+        return query
+
+    def apply(self, trades):
+        count = 0
+        for id, item_id, buyer_id, seller_id, quantity, unit_price in trades:
+            quantity, unit_price = _decimal(quantity), _decimal(unit_price)
+            position = self.position(item_id)
+            if buyer_id == self.trader_id:
+                position.trade(quantity, unit_price)
+            if seller_id == self.trader_id:
+                position.trade(-quantity, unit_price)
+            count += 1
+        return count
+
+    # replays the trades on offers in [at, end) and returns how many there were
+    def replay(self, end, batch_size=1000):
+        query = self.query().filter(Offer.ts < end)
+        if self.at is not None:
+            query = query.filter(Offer.ts >= self.at)
+        count = self.apply(query.order_by(Trade.id).yield_per(batch_size))
+        self.at = end
+        return count
+
+    # Replays the trades booked before the first one on an offer at or after
+    # `at` and stores the positions as of `at`. Every trade the snapshot
+    # holds is then dated before `at` and every later one has a greater id.
+    def snapshot(self, at, batch_size=1000):
+        first = self.query().filter(Offer.ts >= at).with_entities(db.func.min(Trade.id)).scalar()
+        query = self.query()
+        if first is not None:
+            query = query.filter(Trade.id < first)
+        last_id = self.last_id
+        count = 0
+        for trade in query.order_by(Trade.id).yield_per(batch_size):
+            count += self.apply([trade])
+            last_id = trade[0]
+        self.last_id = last_id
+
+        PositionSnapshot.query.filter(
+            PositionSnapshot.trader_id == self.trader_id,
+            PositionSnapshot.method == self.method,
+            PositionSnapshot.ts == at
+        ).delete(synchronize_session=False)
+        for item_id, position in self.positions.items():
+            db.session.add(PositionSnapshot(
+                trader_id=self.trader_id,
+                item_id=item_id,
+                method=self.method,
+                ts=at,
+                last_trade_id=last_id,
+                quantity=position.quantity,
+                realized=position.realized,
+                trades=position.trades,
+                lots=json.dumps([[str(quantity), str(price)] for quantity, price in position.lots])
+            ))
+        return count
+
+    def realized(self):
+        return {item_id: position.realized for item_id, position in self.positions.items()}
+
+
+# A trader's ledger at `end`, with the realized P&L per item at `start`
+# when there is one, replayed from the latest snapshot at or before
+# `start` (or `end`) so the cost only grows with the trades since then.
+# Returns (ledger, snapshot ts, trades replayed, realized at start).
+def compute(trader_id, method, start, end, batch_size=1000):
+    ledger = Ledger(trader_id, method)
+    snapshot = ledger.load(start or end)
+    replayed = 0
+    opening = {}
+    if start is not None:
+        replayed += ledger.replay(start, batch_size)
+        opening = ledger.realized()
+    replayed += ledger.replay(end, batch_size)
+    return ledger, snapshot, replayed, opening
+
+
+# latest mid price of each item in its own currency at or before `at`, in
+# one query; of prices sharing the latest ts the last inserted wins
+def marks(item_ids, at):
+    if not item_ids:
+        return {}
+    latest = db.session.query(Price.item_id, db.func.max(Price.ts).label('ts')) \
+        .join(Item, Item.id == Price.item_id) \
+        .filter(Price.item_id.in_(item_ids), Price.currency_id == Item.currency_id, Price.ts <= at) \
+        .group_by(Price.item_id).subquery()
+    rows = db.session.query(Price.item_id, Price.buy, Price.sell, Price.ts) \
+        .join(Item, Item.id == Price.item_id) \
+        .join(latest, and_(Price.item_id == latest.c.item_id, Price.ts == latest.c.ts)) \
+        .filter(Price.currency_id == Item.currency_id) \
+        .order_by(Price.id)
+    return {item_id: ((_decimal(buy) + _decimal(sell)) / 2, ts) for item_id, buy, sell, ts in rows}
+
+
+# One dict per item held at the ledger's time or with P&L realized since
+# `opening`, amounts in the item currency, and the realized and unrealized
+# totals in `currency_id`. Positions without a mark or rate are counted as
+# unpriced and left out of the totals.
+def positions(ledger, opening, currency_id, at):
+    item_ids = sorted(ledger.positions)
+    currencies = dict(db.session.query(Item.id, Item.currency_id).filter(Item.id.in_(item_ids))) if item_ids else {}
+    prices = marks(item_ids, at)
+    rates = fx.rates.refresh()
+    out = []
+    realized_total = unrealized_total = 0.0
+    unpriced = 0
+    for item_id in item_ids:
+        position = ledger.positions[item_id]
+        quantity = position.quantity
+        realized = position.realized - opening.get(item_id, ZERO)
+        if not quantity and not realized:
+            continue
+        mark = prices[item_id][0] if item_id in prices else None
+        unrealized = quantity * mark - position.cost if mark is not None else None
+        rate = rates.rate(currencies[item_id], currency_id, at)
+        if rate is None or unrealized is None and quantity:
+            unpriced += 1
+        if rate is not None:
+            realized_total += float(realized * rate)
+            if unrealized is not None:
+                unrealized_total += float(unrealized * rate)
+        out.append({
+            'item_id': item_id,
+            'currency_id': currencies[item_id],
+            'quantity': quantity,
+            'average_cost': position.cost / quantity if quantity else None,
+            'mark': mark,
+            'realized': realized,
+            'unrealized': unrealized,
+            'rate': rate
+        })
+    return out, realized_total, unrealized_total, unpriced
+
+
+# Snapshots every trader with trades before `at`, one trader per transaction;
+# yields (trader_id, trades replayed).
+def snapshot_all(at, method, batch_size=1000):
+    trader_ids = db.session.query(Trade.buyer_id).union(
+        db.session.query(Trade.seller_id).filter(Trade.seller_id.isnot(None))).all()
+    for trader_id, in sorted(trader_ids):
+        ledger = Ledger(trader_id, method)
+        ledger.load(at)
+        count = ledger.snapshot(at, batch_size)
+        db.session.commit()
+        yield trader_id, count
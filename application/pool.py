@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+# QueuePool that times how long each checkout waits for a connection,
+# including opening a new one when the pool has room to grow.
+class TimedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kwargs):
+        self.stats = kwargs.pop('stats', None)
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        finally:
+            if self.stats is not None:
+                self.stats.waited(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super(TimedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+
+# Counters fed by SQLAlchemy pool events, kept per worker process.
+class PoolStats(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.engine = None
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_max = 0
+
+    def init_app(self, app):
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        if 'pool_size' in options and 'poolclass' not in options:
+            options['poolclass'] = TimedQueuePool
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    def init_engine(self, engine):
+        self.engine = engine
+        if isinstance(engine.pool, TimedQueuePool):
+            engine.pool.stats = self
+        event.listen(engine, 'connect', self.on_connect)
+        event.listen(engine, 'checkout', self.on_checkout)
+        event.listen(engine, 'checkin', self.on_checkin)
+        event.listen(engine, 'invalidate', self.on_invalidate)
+        event.listen(engine, 'soft_invalidate', self.on_soft_invalidate)
+
+    def waited(self, seconds):
+        with self.lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def on_connect(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self.lock:
+            self.checkouts += 1
+            if isinstance(self.engine.pool, QueuePool):
+                self.overflow_max = max(self.overflow_max, self.engine.pool.overflow())
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.checkins += 1
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self.lock:
+            self.invalidations += 1
+
+    def on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        with self.lock:
+            self.soft_invalidations += 1
+
+    def snapshot(self):
+        pool = self.engine.pool
+        queue_pool = isinstance(pool, QueuePool)
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'pool_class': type(pool).__name__,
+                'size': pool.size() if queue_pool else None,
+                'checked_in': pool.checkedin() if queue_pool else None,
+                'checked_out': pool.checkedout() if queue_pool else None,
+                'overflow': max(pool.overflow(), 0) if queue_pool else None,
+                'overflow_max': self.overflow_max,
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+                'wait_total_ms': self.wait_total * 1e3,
+                'wait_avg_ms': self.wait_total * 1e3 / self.waits if self.waits else 0.0,
+                'wait_max_ms': self.wait_max * 1e3,
+            }
+
+
+pool_stats = PoolStats()
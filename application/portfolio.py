@@ -0,0 +1,116 @@
+import numpy as np
+
+from . import db, fx
+from .models import CurrentInventory, Trader
+from .ticker import ticker
+
+
+# Non-zero holdings as parallel arrays, each tagged with the holder's
+# preferred currency.
+class Holdings(object):
+
+    def __init__(self, rows):
+        trader_ids, item_ids, quantities, currency_ids = zip(*rows) if rows else ((), (), (), ())
+        self.trader_id = np.array(trader_ids, dtype=np.int64)
+        self.item_id = np.array(item_ids, dtype=np.int64)
+        self.quantity = np.array(quantities, dtype=np.float64)
+        self.currency_id = np.array(currency_ids, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.item_id)
+
+
+# Ticker quotes, one per item, as arrays sorted by item_id, valued at mid.
+class PriceTable(object):
+
+    def __init__(self, quotes):
+        quotes = sorted(quotes, key=lambda quote: quote[1])
+        self.item_id = np.array([quote[1] for quote in quotes], dtype=np.int64)
+        self.currency_id = np.array([quote[2] for quote in quotes], dtype=np.int64)
+        self.price = np.array([(quote[3] + quote[4]) / 2 for quote in quotes], dtype=np.float64)
+        self.ts = np.array([quote[5] for quote in quotes], dtype=object)
+
+    def __len__(self):
+        return len(self.item_id)
+
+
+def holdings(trader_id=None):
+    query = db.session.query(CurrentInventory.trader_id, CurrentInventory.item_id, CurrentInventory.quantity,
+                             Trader.preferred_currency_id) \
+        .join(Trader, Trader.id == CurrentInventory.trader_id) \
+        .filter(CurrentInventory.quantity != 0)
+    if trader_id is not None:
+        query = query.filter(CurrentInventory.trader_id == trader_id)
+    return Holdings(query.all())
+
+
+# Values every holding in one pass: holdings are matched to their item's
+# price by binary search over the price table, and FX rates are looked up
+# once per distinct (price currency, preferred currency) pair. Holdings
+# without a price or rate get NaN.
+class Valuation(object):
+
+    def __init__(self, holdings, prices, at, rates):
+        self.holdings = holdings
+        self.at = at
+        n = len(holdings)
+
+        index = np.searchsorted(prices.item_id, holdings.item_id)
+        priced = index < len(prices)
+        priced[priced] = prices.item_id[index[priced]] == holdings.item_id[priced]
+        index = index[priced]
+        self.price = np.full(n, np.nan)
+        self.price[priced] = prices.price[index]
+        self.price_currency_id = np.full(n, -1, dtype=np.int64)
+        self.price_currency_id[priced] = prices.currency_id[index]
+        self.price_ts = np.full(n, None, dtype=object)
+        self.price_ts[priced] = prices.ts[index]
+
+        self.rate = np.full(n, np.nan)
+        if n:
+            pairs, inverse = np.unique(np.stack([self.price_currency_id, holdings.currency_id], axis=1),
+                                       axis=0, return_inverse=True)
+            pair_rates = np.array([_rate(rates, from_id, to_id, at) for from_id, to_id in pairs], dtype=np.float64)
+            self.rate = pair_rates[inverse.reshape(-1)]
+
+        self.value = holdings.quantity * self.price * self.rate
+
+    # (trader_ids, currency_ids, totals, positions, unpriced) per trader
+    def totals(self):
+        trader_ids, first, inverse = np.unique(self.holdings.trader_id, return_index=True, return_inverse=True)
+        missing = np.isnan(self.value)
+        totals = np.bincount(inverse, weights=np.where(missing, 0.0, self.value), minlength=len(trader_ids))
+        positions = np.bincount(inverse, minlength=len(trader_ids))
+        unpriced = np.bincount(inverse, weights=missing, minlength=len(trader_ids)).astype(np.int64)
+        return trader_ids, self.holdings.currency_id[first], totals, positions, unpriced
+
+    def positions(self):
+        columns = zip(self.holdings.item_id.tolist(), self.holdings.quantity.tolist(), self.price.tolist(),
+                      self.price_currency_id.tolist(), self.price_ts.tolist(), self.rate.tolist(), self.value.tolist())
+        return [{
+            'item_id': item_id,
+            'quantity': quantity,
+            'price': _number(price),
+            'price_currency_id': price_currency_id if price_currency_id >= 0 else None,
+            'price_ts': price_ts,
+            'rate': _number(rate),
+            'value': _number(value),
+        } for item_id, quantity, price, price_currency_id, price_ts, rate, value in columns]
+
+
+def _number(value):
+    return None if value != value else value
+
+
+def _rate(rates, from_id, to_id, at):
+    if from_id < 0:
+        return np.nan
+    rate = rates.rate(int(from_id), int(to_id), at)
+    return np.nan if rate is None else float(rate)
+
+
+# `prices` defaults to the ticker's latest quotes of the held items
+def value(holdings, at, prices=None):
+    if prices is None:
+        prices = PriceTable(ticker.refresh().snapshot(np.unique(holdings.item_id).tolist()))
+    return Valuation(holdings, prices, at, fx.rates.refresh())
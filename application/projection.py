@@ -0,0 +1,105 @@
+import copy
+import threading
+from collections import OrderedDict
+
+from flask_restplus import abort, fields as restplus_fields
+
+from . import loading, serializers
+
+VIEWS = ('full', 'summary')
+
+# distinct (model, mask, view) projections kept per process, least recently
+# used first out; the serializer and load plan caches key on them by
+# identity, so their entries go with them
+MAX_PROJECTIONS = 1024
+
+_summaries = {}
+_projections = OrderedDict()
+_lock = threading.Lock()
+
+
+# `summary_fields` stands in for `fields` wherever it is nested and the
+# summary view is asked for
+def summarize(fields, summary_fields):
+    _summaries[id(fields)] = (fields, summary_fields)
+
+
+# {'id': None, 'item': {'code': None}} from 'id,item.code'; a field listed
+# whole wins over paths inside it
+def parse_mask(mask):
+    tree = OrderedDict()
+    for path in mask.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        names = path.split('.')
+        for name in names[:-1]:
+            if name in node and node[name] is None:
+                break
+            node = node.setdefault(name, OrderedDict())
+        else:
+            node[names[-1]] = None
+    return tree
+
+
+def canonical(tree):
+    if tree is None:
+        return None
+    return tuple((name, canonical(tree[name])) for name in sorted(tree))
+
+
+# The part of marshal model `fields` a request selects: `mask` keeps the
+# listed fields, dotted paths selecting inside nested ones, and the summary
+# view swaps every nested model left whole for its registered summary.
+# Projections are cached, so the same request gets the same (compiled)
+# model every time. Unknown fields abort with 400.
+def project(fields, mask=None, view=None):
+    tree = (parse_mask(mask) if mask else None) or None
+    summary = view == 'summary'
+    if tree is None and not summary:
+        return fields
+    key = (id(fields), canonical(tree), summary)
+    with _lock:
+        projected = _projections.get(key)
+        if projected is not None:
+            _projections.move_to_end(key)
+            return projected
+    projected = _project(fields, tree, summary, '')
+    with _lock:
+        if key not in _projections:
+            _projections[key] = projected
+            while len(_projections) > MAX_PROJECTIONS:
+                _, evicted = _projections.popitem(last=False)
+                serializers.forget(evicted)
+                loading.forget(evicted)
+        projected = _projections[key]
+    return projected
+
+
+def _project(fields, tree, summary, prefix):
+    if tree is not None:
+        unknown = [name for name in tree if name not in fields]
+        if unknown:
+            abort(400, 'Unknown fields: {}'.format(', '.join(prefix + name for name in unknown)))
+
+    projected = OrderedDict()
+    for name, field in fields.items():
+        if tree is not None and name not in tree:
+            continue
+        subtree = None if tree is None else tree[name]
+        if isinstance(field, type):
+            field = field()
+        if isinstance(field, restplus_fields.Nested):
+            model = field.model
+            if subtree is None and summary and id(model) in _summaries:
+                model = _summaries[id(model)][1]
+            elif subtree is not None or summary:
+                model = _project(field.model, subtree, summary, prefix + name + '.')
+            if model is not field.model:
+                field = copy.copy(field)
+                field.model = model
+        elif subtree is not None:
+            abort(400, 'Field {} has no fields of its own.'.format(prefix + name))
+        projected[name] = field
+    return projected
@@ -0,0 +1,116 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import Item, Offer, Price, Report, Trade
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+# Running daily aggregates keyed by (trading_date, item_id, currency_id).
+# Ticks feed first/last/min/max on the mid price and trades feed
+# total_amount/quantity, with avg_price kept as the volume-weighted average.
+# first/last assume rows arrive in ts order; `backfill` rebuilds a range
+# exactly when that does not hold. A report looked up is locked (SELECT ...
+# FOR UPDATE) until the caller's transaction ends, so concurrent folds into
+# the same day queue up instead of overwriting each other; a new one is
+# inserted in a savepoint and, when another transaction got there first,
+# read back locked.
+class ReportFolder(object):
+
+    def __init__(self, lookup=True):
+        self.lookup = lookup
+        self.reports = {}
+
+    def report(self, trading_date, item_id, currency_id):
+        key = (trading_date, item_id, currency_id)
+        report = self.reports.get(key)
+        if report is None and self.lookup:
+            report = self.locked(trading_date, item_id, currency_id)
+            if report is None:
+                report = Report(trading_date=trading_date, item_id=item_id, currency_id=currency_id)
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(report)
+                except IntegrityError:
+                    report = self.locked(trading_date, item_id, currency_id)
+        elif report is None:
+            report = Report(trading_date=trading_date, item_id=item_id, currency_id=currency_id)
+            db.session.add(report)
+        self.reports[key] = report
+        return report
+
+    def locked(self, trading_date, item_id, currency_id):
+        return Report.query.filter(
+            Report.trading_date == trading_date,
+            Report.item_id == item_id,
+            Report.currency_id == currency_id
+        ).with_for_update().populate_existing().first()
+
+    def add_price(self, item_id, currency_id, ts, buy, sell):
+        price = (_decimal(buy) + _decimal(sell)) / 2
+        report = self.report(ts.date(), item_id, currency_id)
+        if report.first_price is None:
+            report.first_price = price
+        report.last_price = price
+        if report.min_price is None or price < report.min_price:
+            report.min_price = price
+        if report.max_price is None or price > report.max_price:
+            report.max_price = price
+
+    def add_trade(self, item_id, currency_id, trading_date, quantity, unit_price):
+        quantity = _decimal(quantity)
+        report = self.report(trading_date, item_id, currency_id)
+        report.total_amount = (report.total_amount or 0) + quantity * _decimal(unit_price)
+        report.quantity = (report.quantity or 0) + quantity
+        if report.quantity:
+            report.avg_price = report.total_amount / report.quantity
+
+
+def fold_price(price):
+    ReportFolder().add_price(price.item_id, price.currency_id, price.ts, price.buy, price.sell)
+
+
+# a trade is dated by the offer that triggered it and reported in the item currency
+def fold_trade(trade):
+    ts, currency_id = db.session.query(Offer.ts, Item.currency_id) \
+        .filter(Offer.id == trade.offer_id, Item.id == trade.item_id).one()
+    ReportFolder().add_trade(trade.item_id, currency_id, ts.date(), trade.quantity, trade.unit_price)
+
+
+def backfill(start, end, chunk_days=1, batch_size=1000):
+    day = start
+    while day < end:
+        chunk_end = min(day + timedelta(days=chunk_days), end)
+        rebuild(day, chunk_end, batch_size)
+        db.session.commit()
+        yield day, chunk_end
+        day = chunk_end
+
+
+# rebuilds [start, end) from raw history inside the caller's transaction
+def rebuild(start, end, batch_size=1000):
+    Report.query.filter(Report.trading_date >= start, Report.trading_date < end) \
+        .delete(synchronize_session=False)
+
+    folder = ReportFolder(lookup=False)
+    start_ts, end_ts = datetime.combine(start, time()), datetime.combine(end, time())
+
+    prices = db.session.query(Price.item_id, Price.currency_id, Price.ts, Price.buy, Price.sell) \
+        .filter(Price.ts >= start_ts, Price.ts < end_ts) \
+        .order_by(Price.item_id, Price.currency_id, Price.ts)
+    for row in prices.yield_per(batch_size):
+        folder.add_price(*row)
+
+    trades = db.session.query(Trade.item_id, Item.currency_id, Offer.ts, Trade.quantity, Trade.unit_price) \
+        .join(Offer, Trade.offer_id == Offer.id) \
+        .join(Item, Trade.item_id == Item.id) \
+        .filter(Offer.ts >= start_ts, Offer.ts < end_ts)
+    for item_id, currency_id, ts, quantity, unit_price in trades.yield_per(batch_size):
+        folder.add_trade(item_id, currency_id, ts.date(), quantity, unit_price)
+
+    return folder.reports
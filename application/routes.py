@@ -1,17 +1,29 @@
 from .log import logger
 import traceback
-from flask import Flask, Blueprint
+from flask import Flask, Blueprint, Response, stream_with_context
 from flask import current_app as app
-from flask_restplus import Api, Resource, fields
+from flask_restplus import Api, Resource, fields, inputs, marshal
 from sqlalchemy.orm.exc import NoResultFound
 from . import db
+from .broker import broker
+from .cache import cache
+from . import candles, export, fx, ingest, matching, pnl, portfolio, reports, search
+from .loading import load_plan
+from .metrics import metrics
+from .pagination import page_parser, paginate
+from .projection import project, summarize
+from .serializers import dumps
+from .pool import pool_stats
+from .ticker import ticker
+from .wal import wal
 from .models import Country, Currency, CurrencyRate, CurrencyUsed, Trader, Item, CurrentInventory, Offer, Price, Report, Trade
-from datetime import datetime
+from datetime import datetime, time
 
 blueprint = Blueprint('api', __name__, url_prefix='/api')
 
 api = Api(blueprint, doc='/doc/')
 
+metrics.init_blueprint(blueprint)
 app.register_blueprint(blueprint)
 
 ns_default = api.default_namespace
@@ -50,6 +62,9 @@ api.add_namespace(ns_report)
 ns_trade = api.namespace('trades')
 api.add_namespace(ns_trade)
 
+ns_internal = api.namespace('internal')
+api.add_namespace(ns_internal)
+
 
 class DateTime(fields.Raw):
     def parse(self, value):
@@ -98,15 +113,20 @@ trader_fields = api.model('Trader', {
     'first_name': fields.String(required=True),
     'last_name': fields.String(required=True),
     'user_name': fields.String(required=True),
-    'password': fields.String(required=True),
     'email': fields.String(required=True),
-    'confirmation_code': fields.String(required=True),
     'time_registered': fields.DateTime(required=True),
     'time_confirmed': fields.DateTime(required=True),
     'country': fields.Nested(country_fields, required=True),
     'preferred_currency': fields.Nested(currency_fields, required=True)
 })
 
+# what a new trader is posted with; the password and confirmation code are
+# never returned
+trader_input_fields = api.clone('TraderInput', trader_fields, {
+    'password': fields.String(required=True),
+    'confirmation_code': fields.String(required=True)
+})
+
 item_fields = api.model('Item', {
     'id': fields.Integer(readonly=True),
     'code': fields.String(required=True),
@@ -116,6 +136,31 @@ item_fields = api.model('Item', {
     'details': fields.String(required=False)
 })
 
+# what a nested reference turns into under ?view=summary
+country_summary_fields = api.model('CountrySummary', {
+    'id': fields.Integer(readonly=True),
+    'code': fields.String(readonly=True)
+})
+summarize(country_fields, country_summary_fields)
+
+currency_summary_fields = api.model('CurrencySummary', {
+    'id': fields.Integer(readonly=True),
+    'code': fields.String(readonly=True)
+})
+summarize(currency_fields, currency_summary_fields)
+
+trader_summary_fields = api.model('TraderSummary', {
+    'id': fields.Integer(readonly=True),
+    'user_name': fields.String(readonly=True)
+})
+summarize(trader_fields, trader_summary_fields)
+
+item_summary_fields = api.model('ItemSummary', {
+    'id': fields.Integer(readonly=True),
+    'code': fields.String(readonly=True)
+})
+summarize(item_fields, item_summary_fields)
+
 current_inventory_fields = api.model('CurrentInventory', {
     'id': fields.Integer(readonly=True),
     'trader': fields.Nested(trader_fields, required=True),
@@ -125,20 +170,24 @@ current_inventory_fields = api.model('CurrentInventory', {
 
 offer_fields = api.model('Offer', {
     'id': fields.Integer(readonly=True),
-    'trader': fields.Nested(trader_fields, required=True),
-    'item': fields.Nested(item_fields, required=True),
+    'trader_id': fields.Integer(required=True),
+    'trader': fields.Nested(trader_fields, required=False),
+    'item_id': fields.Integer(required=True),
+    'item': fields.Nested(item_fields, required=False),
     'quantity': fields.Float(required=True),
     'buy': fields.Boolean(required=True),
     'sell': fields.Boolean(required=True),
     'price': fields.Float(required=False),
-    'ts': fields.DateTime(required=True),
-    'is_active': fields.Boolean(required=True)
+    'ts': fields.DateTime(required=False, description='Trade date of the offer; priority follows arrival order'),
+    'is_active': fields.Boolean(readonly=True)
 })
 
 price_fields = api.model('Price', {
     'id': fields.Integer(readonly=True),
-    'item': fields.Nested(item_fields, required=True),
-    'currency': fields.Nested(currency_fields, required=True),
+    'item_id': fields.Integer(required=True),
+    'item': fields.Nested(item_fields, required=False),
+    'currency_id': fields.Integer(required=True),
+    'currency': fields.Nested(currency_fields, required=False),
     'buy': fields.Float(required=True),
     'sell': fields.Float(required=True),
     'ts': fields.DateTime(required=True)
@@ -160,15 +209,197 @@ report_fields = api.model('Report', {
 
 trade_fields = api.model('Trade', {
     'id': fields.Integer(readonly=True),
+    'item_id': fields.Integer(required=True),
     'item': fields.Nested(item_fields),
+    'buyer_id': fields.Integer(required=True),
     'buyer': fields.Nested(trader_fields),
+    'seller_id': fields.Integer(required=False),
     'seller': fields.Nested(trader_fields, required=False),
     'quantity': fields.Float(required=True),
     'unit_price': fields.Float(required=True),
     'description': fields.String(required=True),
-    'offer': fields.Nested(offer_fields, required=True)
+    'offer_id': fields.Integer(required=True),
+    'offer': fields.Nested(offer_fields, required=False)
+})
+
+offer_summary_fields = api.model('OfferSummary', {
+    'id': fields.Integer(readonly=True),
+    'ts': fields.DateTime(readonly=True)
+})
+summarize(offer_fields, offer_summary_fields)
+
+candle_fields = api.model('Candle', {
+    'ts': fields.DateTime(readonly=True),
+    'open': fields.Float(readonly=True),
+    'high': fields.Float(readonly=True),
+    'low': fields.Float(readonly=True),
+    'close': fields.Float(readonly=True),
+    'volume': fields.Integer(readonly=True)
+})
+
+conversion_fields = api.model('Conversion', {
+    'from': fields.String(readonly=True),
+    'to': fields.String(readonly=True),
+    'at': fields.DateTime(readonly=True),
+    'rate': fields.Float(readonly=True),
+    'amount': fields.Float(readonly=True),
+    'value': fields.Float(readonly=True)
 })
 
+bulk_error_fields = api.model('BulkError', {
+    'row': fields.Integer(readonly=True),
+    'error': fields.String(readonly=True)
+})
+
+bulk_result_fields = api.model('BulkResult', {
+    'inserted': fields.Integer(readonly=True),
+    'failed': fields.Integer(readonly=True),
+    'errors': fields.List(fields.Nested(bulk_error_fields), readonly=True)
+})
+
+pool_fields = api.model('PoolStats', {
+    'pid': fields.Integer(readonly=True),
+    'pool_class': fields.String(readonly=True),
+    'size': fields.Integer(readonly=True),
+    'checked_in': fields.Integer(readonly=True),
+    'checked_out': fields.Integer(readonly=True),
+    'overflow': fields.Integer(readonly=True),
+    'overflow_max': fields.Integer(readonly=True),
+    'connects': fields.Integer(readonly=True),
+    'checkouts': fields.Integer(readonly=True),
+    'checkins': fields.Integer(readonly=True),
+    'invalidations': fields.Integer(readonly=True),
+    'soft_invalidations': fields.Integer(readonly=True),
+    'wait_total_ms': fields.Float(readonly=True),
+    'wait_avg_ms': fields.Float(readonly=True),
+    'wait_max_ms': fields.Float(readonly=True)
+})
+
+broker.feed('price', Price, price_fields)
+broker.feed('trade', Trade, trade_fields)
+
+latest_price_fields = api.model('LatestPrice', {
+    'item_id': fields.Integer(readonly=True),
+    'item': fields.String(readonly=True, description='Item code'),
+    'currency_id': fields.Integer(readonly=True),
+    'price_id': fields.Integer(readonly=True),
+    'buy': fields.Float(readonly=True),
+    'sell': fields.Float(readonly=True),
+    'ts': fields.DateTime(readonly=True)
+})
+
+position_fields = api.model('Position', {
+    'item_id': fields.Integer(readonly=True),
+    'quantity': fields.Float(readonly=True),
+    'price': fields.Float(readonly=True, description='Latest mid price, in price_currency_id'),
+    'price_currency_id': fields.Integer(readonly=True),
+    'price_ts': fields.DateTime(readonly=True),
+    'rate': fields.Float(readonly=True, description='Price currency to preferred currency'),
+    'value': fields.Float(readonly=True, description='In the preferred currency, null when unpriced')
+})
+
+portfolio_fields = api.model('Portfolio', {
+    'trader_id': fields.Integer(readonly=True),
+    'currency': fields.Nested(currency_fields, readonly=True),
+    'at': fields.DateTime(readonly=True),
+    'value': fields.Float(readonly=True, description='Sum of the priced positions'),
+    'unpriced': fields.Integer(readonly=True, description='Positions without a price or rate'),
+    'positions': fields.List(fields.Nested(position_fields), readonly=True)
+})
+
+pnl_position_fields = api.model('PnlPosition', {
+    'item_id': fields.Integer(readonly=True),
+    'currency_id': fields.Integer(readonly=True, description='Item currency, which the amounts are in'),
+    'quantity': fields.Float(readonly=True, description='Held at `to`, negative when short'),
+    'average_cost': fields.Float(readonly=True, description='Of the open lots'),
+    'mark': fields.Float(readonly=True, description='Latest mid price at `to`'),
+    'realized': fields.Float(readonly=True, description='Realized between `from` and `to`'),
+    'unrealized': fields.Float(readonly=True, description='Open lots at the mark, null when unpriced'),
+    'rate': fields.Float(readonly=True, description='Item currency to preferred currency')
+})
+
+pnl_fields = api.model('Pnl', {
+    'trader_id': fields.Integer(readonly=True),
+    'method': fields.String(readonly=True),
+    'from': fields.DateTime(readonly=True),
+    'to': fields.DateTime(readonly=True),
+    'currency': fields.Nested(currency_fields, readonly=True),
+    'realized': fields.Float(readonly=True, description='In the preferred currency'),
+    'unrealized': fields.Float(readonly=True, description='In the preferred currency, over the priced positions'),
+    'unpriced': fields.Integer(readonly=True, description='Positions without a mark or rate'),
+    'snapshot': fields.DateTime(readonly=True, description='Snapshot the replay started from'),
+    'replayed': fields.Integer(readonly=True, description='Trades replayed after the snapshot'),
+    'positions': fields.List(fields.Nested(pnl_position_fields), readonly=True)
+})
+
+price_parser = page_parser.copy()
+price_parser.add_argument('item', type=str, location='args', help='Item code')
+price_parser.add_argument('currency', type=str, location='args', help='Currency code')
+price_parser.add_argument('from', type=inputs.datetime_from_iso8601, location='args',
+                          help='Inclusive lower bound on ts (ISO 8601)')
+price_parser.add_argument('to', type=inputs.datetime_from_iso8601, location='args',
+                          help='Exclusive upper bound on ts (ISO 8601)')
+price_parser.add_argument('trader', type=int, location='args',
+                          help="Convert buy/sell into this trader's preferred currency")
+
+search_parser = page_parser.copy()
+search_parser.add_argument('q', type=str, required=True, location='args',
+                           help='Words to match as prefixes, all of them')
+
+report_parser = page_parser.copy()
+report_parser.add_argument('trader', type=int, location='args',
+                           help="Convert prices and amounts into this trader's preferred currency")
+
+latest_parser = api.parser()
+latest_parser.add_argument('items', type=str, action='split', location='args',
+                           help='Comma separated item codes, defaults to every quoted item')
+latest_parser.add_argument('currency', type=str, location='args',
+                           help='Currency code, defaults to the currency each item was quoted in last')
+
+stream_parser = api.parser()
+stream_parser.add_argument('items', type=str, action='split', location='args',
+                           help='Comma separated item codes, defaults to every item')
+stream_parser.add_argument('types', type=str, action='split', default=['price', 'trade'], location='args',
+                           help='Comma separated event types: price, trade')
+
+pnl_parser = api.parser()
+pnl_parser.add_argument('from', type=inputs.datetime_from_iso8601, location='args',
+                        help='Start of the realized P&L window (ISO 8601), defaults to the first trade')
+pnl_parser.add_argument('to', type=inputs.datetime_from_iso8601, location='args',
+                        help='End of the window and time of the marks (ISO 8601), defaults to now')
+pnl_parser.add_argument('method', choices=pnl.METHODS, default='fifo', location='args')
+
+convert_parser = api.parser()
+convert_parser.add_argument('from', type=str, required=True, location='args', help='Currency code')
+convert_parser.add_argument('to', type=str, required=True, location='args', help='Currency code')
+convert_parser.add_argument('amount', type=float, default=1.0, location='args')
+convert_parser.add_argument('at', type=inputs.datetime_from_iso8601, location='args',
+                            help='Rate as of this time (ISO 8601), defaults to now')
+
+candle_parser = api.parser()
+candle_parser.add_argument('interval', choices=tuple(candles.INTERVALS), default='1h', location='args')
+candle_parser.add_argument('currency', type=str, location='args',
+                           help='Currency code, defaults to the item currency')
+candle_parser.add_argument('side', choices=candles.SIDES, default='mid', location='args')
+candle_parser.add_argument('from', type=inputs.datetime_from_iso8601, location='args',
+                           help='Inclusive lower bound on ts (ISO 8601)')
+candle_parser.add_argument('to', type=inputs.datetime_from_iso8601, location='args',
+                           help='Exclusive upper bound on ts (ISO 8601)')
+candle_parser.add_argument('downsample', type=inputs.positive, location='args',
+                           help='Reduce the series to this many candles (LTTB on close)')
+
+export_parser = api.parser()
+export_parser.add_argument('format', choices=tuple(export.FORMATS), default='csv', location='args',
+                           help='csv, arrow (an Arrow IPC stream) or parquet; the last two need pyarrow')
+export_parser.add_argument('item', type=str, location='args', help='Item code')
+export_parser.add_argument('from', type=inputs.datetime_from_iso8601, location='args',
+                           help='Inclusive lower bound on ts (ISO 8601)')
+export_parser.add_argument('to', type=inputs.datetime_from_iso8601, location='args',
+                           help='Exclusive upper bound on ts (ISO 8601)')
+
+price_export_parser = export_parser.copy()
+price_export_parser.add_argument('currency', type=str, location='args', help='Currency code')
+
 
 @api.errorhandler
 def default_error_handler(e):
@@ -189,15 +420,89 @@ def database_not_found_error_handler(e):
 #         return {'hello': 'world'}
 
 
+BULK_DESCRIPTION = ('Insert {} from a JSON array, NDJSON (application/x-ndjson) or CSV (text/csv) body. '
+                    'Rows are validated and written in chunks; invalid rows are reported and skipped.')
+
+
+def bulk_ingest(spec):
+    try:
+        rows = ingest.records()
+    except ValueError as e:
+        api.abort(400, str(e))
+    return ingest.ingest(spec, rows)
+
+
+# With INGEST_MODE = wal a single tick is validated, appended to this
+# worker's write-ahead log and acknowledged with 202 before it has an id;
+# the log's writer thread inserts it (see application/wal.py).
+def log_tick(spec, kind):
+    try:
+        row = spec.coerce(api.payload)
+    except ValueError as e:
+        api.abort(400, str(e))
+    wal.append(app._get_current_object(), kind, row)
+    return spec.model(**row), 202
+
+
+# Converts the `values` columns of each row into the trader's preferred
+# currency at the rate in force at `at(row)`. Rows with no usable rate are
+# left in their own currency, which the row still names. Only the fields
+# the response's `fields` model has are written.
+def preferred_currency(trader_id, values, at, fields):
+    currency = Trader.query.filter(Trader.id == trader_id).one().preferred_currency
+    currency_data = marshal(currency, fields['currency'].nested) if 'currency' in fields else None
+    rates = fx.rates.refresh()
+
+    def transform(obj, data):
+        rate = rates.rate(obj.currency_id, currency.id, at(obj))
+        if rate is None:
+            return data
+        for name in values:
+            if name in data:
+                value = getattr(obj, name)
+                data[name] = None if value is None else float(value * rate)
+        if 'currency_id' in data:
+            data['currency_id'] = currency.id
+        if currency_data is not None:
+            data['currency'] = currency_data
+        return data
+
+    return transform
+
+
+def latest_quotes(codes, quotes):
+    return [{
+        'item_id': item_id,
+        'item': codes.get(item_id),
+        'currency_id': currency_id,
+        'price_id': price_id,
+        'buy': buy,
+        'sell': sell,
+        'ts': ts
+    } for price_id, item_id, currency_id, buy, sell, ts in quotes]
+
+
+# best matches first, paged on (rank, id)
+def search_page(index, fields):
+    args = search_parser.parse_args()
+    if not search.terms(args['q']):
+        return []
+    query, keys = index.query(db.engine.dialect.name, args['q'], app.config['SEARCH_MAX_MATCHES'],
+                              app.config['SEARCH_MIN_RANKED'])
+    return paginate(index.model, fields, query, keys, args, fast=True)
+
+
 @ns_country.route('/')
 class CountryCollection(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super(CountryCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(country_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [country_fields])
+    @cache.cached('countries')
     def get(self):
-        return Country.query.all()
+        return paginate(Country, country_fields)
 
     @api.expect(country_fields)
     @api.marshal_with(country_fields, code=201)
@@ -208,6 +513,7 @@ class CountryCollection(Resource):
         )
         db.session.add(country)
         db.session.commit()
+        cache.invalidate('countries')
 
         return country
 
@@ -218,9 +524,11 @@ class CurrencyCollection(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super(CurrencyCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(currency_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [currency_fields])
+    @cache.cached('currencies')
     def get(self):
-        return Currency.query.all()
+        return paginate(Currency, currency_fields)
 
     @api.expect(currency_fields)
     @api.marshal_with(currency_fields, code=201)
@@ -233,6 +541,7 @@ class CurrencyCollection(Resource):
         )
         db.session.add(currency)
         db.session.commit()
+        cache.invalidate('currencies')
 
         return currency
 
@@ -243,18 +552,23 @@ class CurrencyRateCollection(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super(CurrencyRateCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(currency_rate_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [currency_rate_fields])
     def get(self):
-        return CurrencyRate.query.all()
+        return paginate(CurrencyRate, currency_rate_fields)
 
     @api.expect(currency_rate_fields)
     @api.marshal_with(currency_rate_fields, code=201)
+    @api.response(202, 'Accepted into the ingest log.', currency_rate_fields)
     def post(self):
+        if app.config['INGEST_MODE'] == 'wal':
+            return log_tick(ingest.currency_rates, 'currency_rate')
+
         currency_rate = CurrencyRate(
             currency_id=api.payload['currency_id'],
             base_currency_id=api.payload['base_currency_id'],
             rate=api.payload['rate'],
-            ts=api.payload['ts']
+            ts=ingest.timestamp(api.payload['ts'])
         )
         
         db.session.add(currency_rate)
@@ -263,15 +577,58 @@ class CurrencyRateCollection(Resource):
         return currency_rate
 
 
+@ns_currency_rate.route('/convert')
+@api.response(404, 'Currency or rate not found.')
+class CurrencyRateConvert(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(CurrencyRateConvert, self).__init__(api, args, kwargs)
+
+    @api.expect(convert_parser)
+    @api.marshal_with(conversion_fields)
+    def get(self):
+        args = convert_parser.parse_args()
+        from_currency = Currency.query.filter(Currency.code == args['from']).one()
+        to_currency = Currency.query.filter(Currency.code == args['to']).one()
+        at = args['at'] or datetime.utcnow()
+
+        rate = fx.rates.refresh().rate(from_currency.id, to_currency.id, at)
+        if rate is None:
+            api.abort(404, 'No rate from {} to {} at {}.'.format(args['from'], args['to'], at.isoformat()))
+
+        return {
+            'from': from_currency.code,
+            'to': to_currency.code,
+            'at': at,
+            'rate': rate,
+            'amount': args['amount'],
+            'value': float(rate) * args['amount']
+        }
+
+
+@ns_currency_rate.route('/bulk')
+class CurrencyRateBulk(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(CurrencyRateBulk, self).__init__(api, args, kwargs)
+
+    @api.doc(description=BULK_DESCRIPTION.format('currency rates'))
+    @api.marshal_with(bulk_result_fields)
+    @api.response(400, 'Unreadable request body.')
+    def post(self):
+        return bulk_ingest(ingest.currency_rates)
+
+
 @ns_currency_used.route('/')
 class CurrencyUsedCollection(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super(CurrencyUsedCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(currency_used_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [currency_used_fields])
     def get(self):
-        return CurrencyUsed.query.all()
+        return paginate(CurrencyUsed, currency_used_fields)
 
     @api.expect(currency_used_fields)
     @api.marshal_with(currency_used_fields, code=201)
@@ -291,11 +648,12 @@ class TraderCollection(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super(TraderCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(trader_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [trader_fields])
     def get(self):
-        return Trader.query.all()
+        return paginate(Trader, trader_fields)
 
-    @api.expect(trader_fields)
+    @api.expect(trader_input_fields)
     @api.marshal_with(trader_fields, code=201)
     def post(self):
         trader = Trader(
@@ -309,6 +667,18 @@ class TraderCollection(Resource):
         return trader
 
 
+@ns_trader.route('/search')
+class TraderSearch(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(TraderSearch, self).__init__(api, args, kwargs)
+
+    @api.expect(search_parser)
+    @api.response(200, 'Success', [trader_fields])
+    def get(self):
+        return search_page(search.traders, trader_fields)
+
+
 @ns_trader.route('/<int:id>')
 @api.response(404, 'Trader not found.')
 class TraderItem(Resource):
@@ -318,7 +688,64 @@ class TraderItem(Resource):
 
     @api.marshal_with(trader_fields)
     def get(self, id):
-        return Trader.query.filter(Trader.id == id).one()
+        return Trader.query.options(*load_plan(Trader, trader_fields)).filter(Trader.id == id).one()
+
+
+@ns_trader.route('/<int:id>/portfolio')
+@api.response(404, 'Trader not found.')
+class TraderPortfolio(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(TraderPortfolio, self).__init__(api, args, kwargs)
+
+    @api.marshal_with(portfolio_fields)
+    def get(self, id):
+        trader = Trader.query.filter(Trader.id == id).one()
+        at = datetime.utcnow()
+        valuation = portfolio.value(portfolio.holdings(id), at)
+        positions = valuation.positions()
+        return {
+            'trader_id': trader.id,
+            'currency': trader.preferred_currency,
+            'at': at,
+            'value': sum(p['value'] for p in positions if p['value'] is not None),
+            'unpriced': sum(1 for p in positions if p['value'] is None),
+            'positions': positions
+        }
+
+
+@ns_trader.route('/<int:id>/pnl')
+@api.response(404, 'Trader not found.')
+class TraderPnl(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(TraderPnl, self).__init__(api, args, kwargs)
+
+    @api.expect(pnl_parser)
+    @api.marshal_with(pnl_fields)
+    def get(self, id):
+        args = pnl_parser.parse_args()
+        trader = Trader.query.filter(Trader.id == id).one()
+        end = args['to'] or datetime.utcnow()
+        if args['from'] is not None and args['from'] > end:
+            api.abort(400, 'from must not be after to.')
+        ledger, snapshot, replayed, opening = pnl.compute(id, args['method'], args['from'], end,
+                                                          app.config['API_STREAM_BATCH_SIZE'])
+        positions, realized, unrealized, unpriced = pnl.positions(ledger, opening, trader.preferred_currency_id, end)
+
+        return {
+            'trader_id': trader.id,
+            'method': args['method'],
+            'from': args['from'],
+            'to': end,
+            'currency': trader.preferred_currency,
+            'realized': realized,
+            'unrealized': unrealized,
+            'unpriced': unpriced,
+            'snapshot': snapshot,
+            'replayed': replayed,
+            'positions': positions
+        }
 
 
 @ns_item.route('/')
@@ -327,9 +754,11 @@ class ItemCollection(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super(ItemCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(item_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [item_fields])
+    @cache.cached('items')
     def get(self):
-        return Item.query.all()
+        return paginate(Item, item_fields)
 
     @api.expect(item_fields)
     @api.marshal_with(item_fields, code=201)
@@ -340,19 +769,33 @@ class ItemCollection(Resource):
         )
         db.session.add(item)
         db.session.commit()
+        cache.invalidate('items')
 
         return item
 
 
+@ns_item.route('/search')
+class ItemSearch(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(ItemSearch, self).__init__(api, args, kwargs)
+
+    @api.expect(search_parser)
+    @api.response(200, 'Success', [item_fields])
+    def get(self):
+        return search_page(search.items, item_fields)
+
+
 @ns_current_inventory.route('/')
 class CurrentInventoryCollection(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super(CurrentInventoryCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(current_inventory_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [current_inventory_fields])
     def get(self):
-        return CurrentInventory.query.all()
+        return paginate(CurrentInventory, current_inventory_fields)
 
     @api.expect(current_inventory_fields)
     @api.marshal_with(current_inventory_fields, code=201)
@@ -371,17 +814,30 @@ class OfferCollection(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super(OfferCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(offer_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [offer_fields])
     def get(self):
-        return Offer.query.all()
+        return paginate(Offer, offer_fields)
 
     @api.expect(offer_fields)
     @api.marshal_with(offer_fields, code=201)
+    @api.response(400, 'An offer must either buy or sell at a given price.')
+    @api.response(400, 'An offer must have a positive price and quantity.')
     def post(self):
-        offer = Offer(
+        if api.payload['buy'] == api.payload['sell'] or api.payload.get('price') is None:
+            api.abort(400, 'An offer must either buy or sell at a given price.')
+        if api.payload['price'] <= 0 or api.payload['quantity'] <= 0:
+            api.abort(400, 'An offer must have a positive price and quantity.')
+
+        offer = matching.new_offer(
+            trader_id=api.payload['trader_id'],
+            item_id=api.payload['item_id'],
+            buy=api.payload['buy'],
+            price=api.payload['price'],
+            quantity=api.payload['quantity'],
+            ts=inputs.datetime_from_iso8601(api.payload['ts']) if api.payload.get('ts') else None
         )
-        db.session.add(offer)
-        db.session.commit()
+        matching.engine.submit(offer)
 
         return offer
 
@@ -392,30 +848,178 @@ class PriceCollection(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super(PriceCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(price_fields)
+    @api.expect(price_parser)
+    @api.response(200, 'Success', [price_fields])
+    @api.response(404, 'Item or currency not found.')
     def get(self):
-        return Price.query.all()
+        args = price_parser.parse_args()
+        query = Price.query
+        keys = (Price.id,)
+
+        # an instrument window is served by ix_price_item_id_currency_id_ts
+        # in ts order, so keyset on (ts, id) to walk the index
+        if args['item']:
+            item = Item.query.filter(Item.code == args['item']).one()
+            query = query.filter(Price.item_id == item.id)
+            keys = (Price.ts, Price.id)
+        if args['currency']:
+            currency = Currency.query.filter(Currency.code == args['currency']).one()
+            query = query.filter(Price.currency_id == currency.id)
+        if args['from']:
+            query = query.filter(Price.ts >= args['from'])
+        if args['to']:
+            query = query.filter(Price.ts < args['to'])
+
+        transform = None
+        columns = ()
+        if args['trader']:
+            transform = preferred_currency(args['trader'], ('buy', 'sell'), lambda price: price.ts,
+                                           project(price_fields, args['fields'], args['view']))
+            columns = (Price.currency_id, Price.buy, Price.sell, Price.ts)
+
+        return paginate(Price, price_fields, query=query, keys=keys, args=args, transform=transform, fast=True,
+                        columns=columns)
 
     @api.expect(price_fields)
     @api.marshal_with(price_fields, code=201)
+    @api.response(202, 'Accepted into the ingest log.', price_fields)
     def post(self):
+        if app.config['INGEST_MODE'] == 'wal':
+            return log_tick(ingest.prices, 'price')
+
         price = Price(
+            item_id=api.payload['item_id'],
+            currency_id=api.payload['currency_id'],
+            buy=api.payload['buy'],
+            sell=api.payload['sell'],
+            ts=ingest.timestamp(api.payload['ts'])
         )
         db.session.add(price)
+        reports.fold_price(price)
         db.session.commit()
+        ticker.add(price)
 
         return price
 
 
+@ns_price.route('/bulk')
+class PriceBulk(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(PriceBulk, self).__init__(api, args, kwargs)
+
+    @api.doc(description=BULK_DESCRIPTION.format('prices'))
+    @api.marshal_with(bulk_result_fields)
+    @api.response(400, 'Unreadable request body.')
+    def post(self):
+        return bulk_ingest(ingest.prices)
+
+
+@ns_price.route('/latest')
+@api.response(404, 'Item or currency not found.')
+class PriceLatest(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(PriceLatest, self).__init__(api, args, kwargs)
+
+    @api.expect(latest_parser)
+    @api.marshal_list_with(latest_price_fields)
+    def get(self):
+        args = latest_parser.parse_args()
+        query = db.session.query(Item.id, Item.code)
+        if args['items']:
+            query = query.filter(Item.code.in_(args['items']))
+        codes = dict(query.all())
+        missing = set(args['items'] or ()) - set(codes.values())
+        if missing:
+            api.abort(404, 'Unknown items: {}'.format(', '.join(sorted(missing))))
+
+        currency_id = None
+        if args['currency']:
+            currency_id = Currency.query.filter(Currency.code == args['currency']).one().id
+
+        item_ids = sorted(codes) if args['items'] else None
+        return latest_quotes(codes, ticker.refresh().snapshot(item_ids, currency_id))
+
+
+@ns_price.route('/export')
+@api.response(404, 'Item or currency not found.')
+@api.response(501, 'Format not available on this server.')
+class PriceExport(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(PriceExport, self).__init__(api, args, kwargs)
+
+    @api.expect(price_export_parser)
+    @api.response(200, 'Flat price rows streamed as CSV, an Arrow IPC stream or Parquet')
+    def get(self):
+        args = price_export_parser.parse_args()
+        if not export.available(args['format']):
+            api.abort(501, 'The {} format needs pyarrow installed on the server.'.format(args['format']))
+
+        item_id = currency_id = None
+        if args['item']:
+            item_id = Item.query.filter(Item.code == args['item']).one().id
+        if args['currency']:
+            currency_id = Currency.query.filter(Currency.code == args['currency']).one().id
+
+        query = export.prices(item_id, currency_id, args['from'], args['to'])
+        return export.response('prices', export.PRICE_COLUMNS, query, args['format'])
+
+
+@ns_price.route('/<string:item>/candles')
+@api.response(404, 'Item or currency not found.')
+class PriceCandles(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(PriceCandles, self).__init__(api, args, kwargs)
+
+    @api.expect(candle_parser)
+    @api.marshal_list_with(candle_fields)
+    def get(self, item):
+        args = candle_parser.parse_args()
+        item = Item.query.filter(Item.code == item).one()
+        currency_id = item.currency_id
+        if args['currency']:
+            currency_id = Currency.query.filter(Currency.code == args['currency']).one().id
+
+        query = db.session.query(Price.ts, Price.buy, Price.sell) \
+            .filter(Price.item_id == item.id, Price.currency_id == currency_id)
+        if args['from']:
+            query = query.filter(Price.ts >= args['from'])
+        if args['to']:
+            query = query.filter(Price.ts < args['to'])
+        rows = query.order_by(Price.ts).yield_per(app.config['API_STREAM_BATCH_SIZE'])
+
+        series = candles.candles(rows, candles.INTERVALS[args['interval']], args['side'])
+        if args['downsample']:
+            return candles.downsample(series, args['downsample'])
+        return list(series)
+
+
 @ns_report.route('/')
 class ReportCollection(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super(ReportCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(report_fields)
+    @api.expect(report_parser)
+    @api.response(200, 'Success', [report_fields])
     def get(self):
-        return Report.query.all()
+        args = report_parser.parse_args()
+        transform = None
+        columns = ()
+        if args['trader']:
+            values = ('first_price', 'last_price', 'min_price', 'max_price', 'avg_price', 'total_amount')
+            transform = preferred_currency(
+                args['trader'],
+                values,
+                lambda report: datetime.combine(report.trading_date, time.max),
+                project(report_fields, args['fields'], args['view'])
+            )
+            columns = (Report.currency_id, Report.trading_date) + tuple(getattr(Report, name) for name in values)
+
+        return paginate(Report, report_fields, args=args, transform=transform, columns=columns)
 
     @api.expect(report_fields)
     @api.marshal_with(report_fields, code=201)
@@ -434,16 +1038,131 @@ class TradeCollection(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super(TradeCollection, self).__init__(api, args, kwargs)
 
-    @api.marshal_list_with(trade_fields)
+    @api.expect(page_parser)
+    @api.response(200, 'Success', [trade_fields])
     def get(self):
-        return Trade.query.all()
+        return paginate(Trade, trade_fields, fast=True)
 
     @api.expect(trade_fields)
     @api.marshal_with(trade_fields, code=201)
     def post(self):
         trade = Trade(
+            item_id=api.payload['item_id'],
+            buyer_id=api.payload['buyer_id'],
+            seller_id=api.payload.get('seller_id'),
+            quantity=api.payload['quantity'],
+            unit_price=api.payload['unit_price'],
+            description=api.payload['description'],
+            offer_id=api.payload['offer_id']
         )
         db.session.add(trade)
+        reports.fold_trade(trade)
         db.session.commit()
 
         return trade
+
+
+@ns_trade.route('/bulk')
+class TradeBulk(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(TradeBulk, self).__init__(api, args, kwargs)
+
+    @api.doc(description=BULK_DESCRIPTION.format('trades'))
+    @api.marshal_with(bulk_result_fields)
+    @api.response(400, 'Unreadable request body.')
+    def post(self):
+        return bulk_ingest(ingest.trades)
+
+
+@ns_trade.route('/export')
+@api.response(404, 'Item not found.')
+@api.response(501, 'Format not available on this server.')
+class TradeExport(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(TradeExport, self).__init__(api, args, kwargs)
+
+    @api.expect(export_parser)
+    @api.response(200, 'Flat trade rows streamed as CSV, an Arrow IPC stream or Parquet')
+    def get(self):
+        args = export_parser.parse_args()
+        if not export.available(args['format']):
+            api.abort(501, 'The {} format needs pyarrow installed on the server.'.format(args['format']))
+
+        item_id = None
+        if args['item']:
+            item_id = Item.query.filter(Item.code == args['item']).one().id
+
+        query = export.trades(item_id, args['from'], args['to'])
+        return export.response('trades', export.TRADE_COLUMNS, query, args['format'])
+
+
+@ns_default.route('/stream')
+@api.response(404, 'Item not found.')
+class EventStream(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(EventStream, self).__init__(api, args, kwargs)
+
+    @api.expect(stream_parser)
+    @api.response(200, 'text/event-stream of price and trade events, each data line a Price or Trade object')
+    def get(self):
+        args = stream_parser.parse_args()
+        kinds = set(args['types'])
+        if not kinds or not kinds <= {'price', 'trade'}:
+            api.abort(400, 'types must be price and/or trade.')
+
+        item_ids = None
+        if args['items']:
+            codes = dict(db.session.query(Item.code, Item.id).filter(Item.code.in_(args['items'])).all())
+            missing = set(args['items']) - set(codes)
+            if missing:
+                api.abort(404, 'Unknown items: {}'.format(', '.join(sorted(missing))))
+            item_ids = set(codes.values())
+
+        subscription = broker.subscribe(app._get_current_object(), item_ids, kinds)
+        # the stream outlives the request's need for a connection
+        db.session.close()
+        keepalive = app.config['STREAM_KEEPALIVE']
+
+        def generate():
+            try:
+                yield 'retry: 2000\n\n'
+                while True:
+                    events, dropped = subscription.get(keepalive)
+                    if dropped:
+                        yield 'event: dropped\ndata: {}\n\n'.format(dropped)
+                    if not events and not dropped:
+                        yield ': keepalive\n\n'
+                    for kind, data in events:
+                        yield 'event: {}\ndata: {}\n\n'.format(kind, dumps(data).decode().rstrip('\n'))
+            finally:
+                broker.unsubscribe(subscription)
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@ns_internal.route('/pool')
+class PoolStatus(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(PoolStatus, self).__init__(api, args, kwargs)
+
+    @api.marshal_with(pool_fields)
+    def get(self):
+        return pool_stats.snapshot()
+
+
+@ns_internal.route('/metrics')
+class MetricsExport(Resource):
+
+    def __init__(self, api=None, *args, **kwargs):
+        super(MetricsExport, self).__init__(api, args, kwargs)
+
+    @api.response(200, 'Prometheus text exposition format')
+    def get(self):
+        gauges = {'db_pool_' + k: v for k, v in pool_stats.snapshot().items()
+                  if k != 'pid' and isinstance(v, (int, float))}
+        return Response(metrics.render(gauges=gauges), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,113 @@
+import re
+
+from sqlalchemy import Float, Integer, and_, event, func, or_, select, text
+
+from .models import Item, Trader
+
+WORD = re.compile(r'[^\W_]+')
+
+
+def terms(q):
+    return WORD.findall(q.lower())
+
+
+# Ranked prefix search over some text columns of a model. On SQLite the
+# columns are mirrored by triggers into an FTS5 table with prefix indexes and
+# ranked by bm25; on PostgreSQL a GIN index over their weighted tsvector is
+# ranked by ts_rank. Both are created along with the table and by migration
+# for existing databases. Other databases fall back to a LIKE prefix match.
+# Every term of the query has to prefix a word of some column, and a lower
+# rank is a better match. Ranking scores every match, which over a large
+# table is too slow for the one- and two-letter prefixes of autocomplete, so
+# a query whose terms are all shorter than `min_ranked` only looks at the
+# first column (an item's code, a trader's user name) and ranks just the
+# first `limit` of those matches in index order. Longer queries keep the
+# `limit` best ranked matches.
+class SearchIndex(object):
+
+    def __init__(self, model, columns, weights):
+        self.model = model
+        self.table = model.__tablename__
+        self.name = '{}_search'.format(self.table)
+        self.columns = columns
+        self.weights = weights
+        event.listen(model.__table__, 'after_create', self.after_create)
+
+    def vector(self):
+        return ' || '.join("setweight(to_tsvector('simple', coalesce({}, '')), '{}')".format(column, weight)
+                           for column, weight in zip(self.columns, 'ABCD'))
+
+    def ddl(self, dialect):
+        columns = ', '.join(self.columns)
+        new = ', '.join('new.{}'.format(column) for column in self.columns)
+        old = ', '.join('old.{}'.format(column) for column in self.columns)
+        if dialect == 'sqlite':
+            return [
+                "CREATE VIRTUAL TABLE {0} USING fts5({1}, content='{2}', content_rowid='id', prefix='1 2 3')".format(
+                    self.name, columns, self.table),
+                'CREATE TRIGGER {0}_ai AFTER INSERT ON {1} BEGIN '
+                'INSERT INTO {0}(rowid, {2}) VALUES (new.id, {3}); END'.format(self.name, self.table, columns, new),
+                'CREATE TRIGGER {0}_ad AFTER DELETE ON {1} BEGIN '
+                "INSERT INTO {0}({0}, rowid, {2}) VALUES ('delete', old.id, {3}); END".format(
+                    self.name, self.table, columns, old),
+                'CREATE TRIGGER {0}_au AFTER UPDATE ON {1} BEGIN '
+                "INSERT INTO {0}({0}, rowid, {2}) VALUES ('delete', old.id, {3}); "
+                'INSERT INTO {0}(rowid, {2}) VALUES (new.id, {4}); END'.format(
+                    self.name, self.table, columns, old, new),
+                "INSERT INTO {0}({0}) VALUES ('rebuild')".format(self.name),
+            ]
+        if dialect == 'postgresql':
+            return ['CREATE INDEX ix_{} ON {} USING gin (({}))'.format(self.name, self.table, self.vector())]
+        return []
+
+    def after_create(self, target, connection, **kw):
+        for statement in self.ddl(connection.dialect.name):
+            connection.execute(text(statement))
+
+    # (id, rank) of `limit` rows matching all `words`, the best ranked ones
+    # unless `short`, when they only have to match the first column
+    def ranked(self, dialect, words, limit, short=False):
+        if dialect == 'sqlite':
+            weights = ''.join(', {}'.format(weight) for weight in self.weights)
+            q = ' '.join('"{}"*'.format(word) for word in words)
+            if short:
+                statement = text('SELECT rowid AS id, bm25({0}{1}) AS rank FROM {0} WHERE {0} MATCH :q '
+                                 'LIMIT :limit'.format(self.name, weights)) \
+                    .bindparams(q='{} : ({})'.format(self.columns[0], q), limit=limit)
+            else:
+                statement = text('SELECT rowid AS id, bm25({0}{1}) AS rank FROM {0} WHERE {0} MATCH :q '
+                                 'ORDER BY bm25({0}{1}), rowid LIMIT :limit'.format(self.name, weights)) \
+                    .bindparams(q=q, limit=limit)
+        elif dialect == 'postgresql':
+            if short:
+                first = "AND to_tsvector('simple', coalesce({}, '')) @@ to_tsquery('simple', :q)".format(
+                    self.columns[0])
+                order = ''
+            else:
+                first = ''
+                order = 'ORDER BY rank, id'
+            statement = text("SELECT id, -ts_rank({0}, to_tsquery('simple', :q))::float8 AS rank FROM {1} "
+                             "WHERE {0} @@ to_tsquery('simple', :q) {2} {3} LIMIT :limit".format(
+                                 self.vector(), self.table, first, order)) \
+                .bindparams(q=' & '.join('{}:*'.format(word) for word in words), limit=limit)
+        else:
+            model = self.model
+            first = getattr(model, self.columns[0])
+            columns = self.columns[:1] if short else self.columns
+            matches = [or_(*(func.lower(getattr(model, column)).like('{}%'.format(word))
+                             for column in columns)) for word in words]
+            rank = func.length(first).cast(Float)
+            order = (model.id,) if short else (rank, model.id)
+            return select([model.id.label('id'), rank.label('rank')]) \
+                .where(and_(*matches)).order_by(*order).limit(limit).alias(self.name)
+        return statement.columns(id=Integer, rank=Float).alias(self.name)
+
+    # the model query restricted to matches, and the (rank, id) keys to page it by
+    def query(self, dialect, q, limit, min_ranked=0):
+        words = terms(q)
+        ranked = self.ranked(dialect, words, limit, short=max(map(len, words)) < min_ranked)
+        return self.model.query.join(ranked, ranked.c.id == self.model.id), (ranked.c.rank, self.model.id)
+
+
+items = SearchIndex(Item, ('code', 'name', 'details'), (10.0, 5.0, 1.0))
+traders = SearchIndex(Trader, ('user_name', 'first_name', 'last_name'), (10.0, 5.0, 5.0))
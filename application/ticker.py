@@ -0,0 +1,99 @@
+import threading
+
+from sqlalchemy import and_, func, select
+
+from . import db
+from .models import Price
+from .watermark import Watermark
+
+COLUMNS = (Price.id, Price.item_id, Price.currency_id, Price.buy, Price.sell, Price.ts)
+
+
+# Last price per (item_id, currency_id), plus which of an item's currencies
+# was quoted last. The first refresh() loads the latest rows with one grouped
+# query over ix_price_item_id_currency_id_ts; after that only rows with an id
+# past the last one seen (or skipped over, see Watermark) are read, so
+# calling it once per request keeps every worker current. Quotes are (id,
+# item_id, currency_id, buy, sell, ts) and the latest is the one with the
+# greatest (ts, id).
+class Ticker(object):
+
+    def __init__(self):
+        self.quotes = {}
+        self.items = {}
+        self.watermark = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        if self.watermark is None:
+            last_id = db.session.execute(self.last_id_statement()).scalar()
+            self.load(db.session.execute(self.latest_statement()), last_id)
+        self.update(db.session.execute(self.since_statement()))
+        return self
+
+    # the statements are plain Core selects, so the async read path runs
+    # the same refresh through its own driver
+    def last_id_statement(self):
+        return select([func.coalesce(func.max(Price.id), 0)])
+
+    def latest_statement(self):
+        latest = select([Price.item_id, Price.currency_id, func.max(Price.ts).label('ts')]) \
+            .group_by(Price.item_id, Price.currency_id).alias('latest')
+        return select(COLUMNS).select_from(
+            Price.__table__.join(latest, and_(Price.item_id == latest.c.item_id,
+                                              Price.currency_id == latest.c.currency_id,
+                                              Price.ts == latest.c.ts)))
+
+    def since_statement(self):
+        return select(COLUMNS).where(self.watermark.unread(Price.id)).order_by(Price.id)
+
+    def load(self, rows, last_id):
+        with self.lock:
+            if self.watermark is not None:
+                return
+            for row in rows:
+                self._add(tuple(row[i] for i in range(len(COLUMNS))))
+            self.watermark = Watermark(last_id)
+
+    def update(self, rows):
+        with self.lock:
+            for row in rows:
+                if self.watermark.seen(row[0]):
+                    self._add(tuple(row[i] for i in range(len(COLUMNS))))
+
+    def add(self, price):
+        with self.lock:
+            self._add((price.id, price.item_id, price.currency_id, price.buy, price.sell, price.ts))
+
+    def _add(self, quote):
+        id, item_id, currency_id, buy, sell, ts = quote
+        current = self.quotes.get((item_id, currency_id))
+        if current is not None and (current[5], current[0]) >= (ts, id):
+            return
+        self.quotes[(item_id, currency_id)] = quote
+
+        latest = self.items.get(item_id)
+        latest = self.quotes[(item_id, latest)] if latest is not None else None
+        if latest is None or (latest[5], latest[0]) <= (ts, id):
+            self.items[item_id] = currency_id
+
+    # latest quote of the item in `currency_id`, or in whichever currency
+    # it was quoted last; None when there is none
+    def latest(self, item_id, currency_id=None):
+        with self.lock:
+            if currency_id is None:
+                currency_id = self.items.get(item_id)
+            return self.quotes.get((item_id, currency_id))
+
+    def snapshot(self, item_ids=None, currency_id=None):
+        with self.lock:
+            item_ids = sorted(self.items) if item_ids is None else item_ids
+            quotes = []
+            for item_id in item_ids:
+                quote = self.quotes.get((item_id, self.items.get(item_id) if currency_id is None else currency_id))
+                if quote is not None:
+                    quotes.append(quote)
+            return quotes
+
+
+ticker = Ticker()
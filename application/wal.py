@@ -0,0 +1,292 @@
+import fcntl
+import json
+import mmap
+import os
+import socket
+import struct
+import threading
+import zlib
+from datetime import datetime
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from . import db, ingest
+from .log import logger
+from .models import IngestCheckpoint
+
+# payload length and crc32 ahead of every record; segments are allocated
+# zeroed, so a zero length marks the end of what was written
+HEADER = struct.Struct('<II')
+SUFFIX = '.wal'
+
+SPECS = {'price': ingest.prices, 'currency_rate': ingest.currency_rates}
+
+
+def encode(kind, row):
+    return json.dumps([kind, row], separators=(',', ':'),
+                      default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value)).encode()
+
+
+# One fixed size, memory mapped log file. A segment is appended to only by
+# the process that created it; one found on disk is read up to its last
+# intact record and never appended to again.
+class Segment(object):
+
+    def __init__(self, path, number, size=None):
+        self.path = path
+        self.number = number
+        if size is not None:
+            # allocated under a temporary name, so a segment on disk always has its full size
+            with open(path + '.tmp', 'wb') as f:
+                f.truncate(size)
+            os.rename(path + '.tmp', path)
+        with open(path, 'r+b') as f:
+            self.map = mmap.mmap(f.fileno(), 0)
+        self.size = len(self.map)
+        self.end = 0 if size is not None else self.scan()
+
+    # offset past the last record whose checksum holds
+    def scan(self):
+        offset = 0
+        while offset + HEADER.size <= self.size:
+            length, crc = HEADER.unpack_from(self.map, offset)
+            start = offset + HEADER.size
+            if not length or start + length > self.size or zlib.crc32(self.map[start:start + length]) != crc:
+                break
+            offset = start + length
+        return offset
+
+    def append(self, payload, sync):
+        offset = self.end
+        end = offset + HEADER.size + len(payload)
+        if end > self.size:
+            return False
+        self.map[offset + HEADER.size:end] = payload
+        HEADER.pack_into(self.map, offset, len(payload), zlib.crc32(payload))
+        if sync:
+            start = offset - offset % mmap.PAGESIZE
+            self.map.flush(start, end - start)
+        self.end = end
+        return True
+
+    # (offset past it, payload) of the record at `offset`
+    def record(self, offset):
+        length, _ = HEADER.unpack_from(self.map, offset)
+        start = offset + HEADER.size
+        return start + length, self.map[start:start + length]
+
+    def remove(self):
+        self.map.close()
+        os.remove(self.path)
+
+
+# The log of one process: numbered segments in a directory it holds an
+# exclusive lock on, so every worker appends to its own and whoever claims
+# the directory next replays what was left undrained. `position` is the
+# (segment, offset) of the next record to write to the database, committed
+# as an IngestCheckpoint in the same transaction as the rows before it.
+class Slot(object):
+
+    def __init__(self, path, segment_size):
+        self.path = path
+        self.segment_size = segment_size
+        self.name = '{}:{}'.format(socket.gethostname(), os.path.abspath(path))
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.lock_file = open(os.path.join(path, 'lock'), 'a')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.lock_file.close()
+            raise
+
+        checkpoint = IngestCheckpoint.query.get(self.name)
+        db.session.rollback()
+        self.position = (checkpoint.segment, checkpoint.offset) if checkpoint else (0, 0)
+        self.segments = {}
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith(SUFFIX):
+                number = int(filename[:-len(SUFFIX)])
+                if number < self.position[0]:
+                    os.remove(os.path.join(path, filename))
+                else:
+                    self.segments[number] = Segment(os.path.join(path, filename), number)
+        self.head = None
+        self.last = max([self.position[0]] + list(self.segments))
+
+    # the first free slot under `directory`
+    @classmethod
+    def claim(cls, directory, segment_size):
+        n = 0
+        while True:
+            try:
+                return cls(os.path.join(directory, 'slot-{}'.format(n)), segment_size)
+            except BlockingIOError:
+                n += 1
+
+    def release(self):
+        for segment in self.segments.values():
+            segment.map.close()
+        self.lock_file.close()
+
+    def append(self, payload, sync):
+        if HEADER.size + len(payload) > self.segment_size:
+            raise ValueError('record of {} bytes does not fit a log segment'.format(len(payload)))
+        with self.lock:
+            if self.head is None or not self.head.append(payload, sync):
+                self.last += 1
+                self.head = Segment(os.path.join(self.path, '{:012d}{}'.format(self.last, SUFFIX)), self.last,
+                                    self.segment_size)
+                self.segments[self.last] = self.head
+                self.head.append(payload, sync)
+
+    # Up to `limit` records from `position` as (position past it, payload),
+    # and the position reached. A segment is only left behind once a later
+    # one exists, as only then has it stopped growing.
+    def read(self, limit):
+        with self.lock:
+            segments = dict(self.segments)
+        number, offset = self.position
+        records = []
+        while len(records) < limit:
+            later = [n for n in segments if n > number]
+            segment = segments.get(number)
+            if segment is not None and offset < segment.end:
+                offset, payload = segment.record(offset)
+                records.append(((number, offset), payload))
+            elif later:
+                number, offset = min(later), 0
+            else:
+                break
+        return records, (number, offset)
+
+    def checkpoint(self, position):
+        db.session.merge(IngestCheckpoint(slot=self.name, segment=position[0], offset=position[1],
+                                          ts=datetime.utcnow()))
+
+    # after the checkpoint is committed; drops the segments it moved past
+    def advance(self, position):
+        self.position = position
+        with self.lock:
+            drained = [segment for number, segment in self.segments.items() if number < position[0]]
+            for segment in drained:
+                del self.segments[segment.number]
+        for segment in drained:
+            segment.remove()
+
+
+def decode(payload):
+    kind, record = json.loads(bytes(payload).decode())
+    return kind, SPECS[kind].coerce(record)
+
+
+def write(slot, rows, position):
+    for kind, spec in SPECS.items():
+        batch = [row for row_kind, row in rows if row_kind == kind]
+        if batch:
+            ingest.insert(spec, batch)
+    slot.checkpoint(position)
+    db.session.commit()
+    slot.advance(position)
+
+
+# Writes the next `limit` records of `slot` to the database and moves its
+# checkpoint past them, in one transaction. Rows pointing at ids that do not
+# exist are logged and dropped; if the database rejects the batch it is
+# written again a record per transaction to drop only the offenders. Any
+# other error leaves the checkpoint where it was, to be retried. Returns the
+# number of records read.
+def drain(slot, limit):
+    records, position = slot.read(limit)
+    if not records:
+        if position != slot.position:
+            slot.checkpoint(position)
+            db.session.commit()
+            slot.advance(position)
+        return 0
+
+    rows = [decode(payload) for _, payload in records]
+    errors = []
+    valid = set()
+    for kind, spec in SPECS.items():
+        checked = spec.check_references([(n, row) for n, (row_kind, row) in enumerate(rows) if row_kind == kind],
+                                        errors)
+        valid.update(n for n, _ in checked)
+    for n, error in errors:
+        logger.warning('Dropped ingest log record before %s: %s', records[n][0], error)
+
+    try:
+        write(slot, [row for n, row in enumerate(rows) if n in valid], position)
+    except (DataError, IntegrityError):
+        db.session.rollback()
+        for n, (record_position, _) in enumerate(records):
+            try:
+                write(slot, [rows[n]] if n in valid else [], record_position)
+            except (DataError, IntegrityError) as e:
+                db.session.rollback()
+                logger.warning('Dropped ingest log record before %s: %s', record_position, e.orig)
+                write(slot, [], record_position)
+    return len(records)
+
+
+# Ticks acknowledged once they are in this process's log; a daemon thread
+# started with the server process, or else with the first tick, drains it
+# in transactions of up to INGEST_FLUSH_SIZE records, as soon as that many
+# are waiting or every INGEST_FLUSH_INTERVAL seconds. With INGEST_FSYNC each record is flushed
+# to disk before it is acknowledged; without it a record survives the
+# process but not the machine going down.
+class WriteAheadLog(object):
+
+    def __init__(self):
+        self.app = None
+        self.slot = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.ready = threading.Condition()
+        self.pending = 0
+
+    # called by the server entry points rather than create_app(), so CLI
+    # commands never claim a slot; with INGEST_MODE = wal the slot is claimed
+    # and whatever an earlier process left in it replayed right away
+    def init_app(self, app):
+        self.app = app
+        if app.config['INGEST_MODE'] == 'wal':
+            self.start(app)
+
+    def start(self, app):
+        with self.lock:
+            if self.pid != os.getpid():
+                with app.app_context():
+                    self.slot = Slot.claim(app.config['INGEST_WAL_DIR'], app.config['INGEST_SEGMENT_SIZE'])
+                self.pid = os.getpid()
+                threading.Thread(target=self.run, args=(app, self.slot), name='ingest-writer', daemon=True).start()
+        return self.slot
+
+    def append(self, app, kind, row):
+        slot = self.slot if self.pid == os.getpid() else self.start(app)
+        slot.append(encode(kind, row), app.config['INGEST_FSYNC'])
+        with self.ready:
+            self.pending += 1
+            if self.pending >= app.config['INGEST_FLUSH_SIZE']:
+                self.ready.notify()
+
+    def run(self, app, slot):
+        flush_size = app.config['INGEST_FLUSH_SIZE']
+        interval = app.config['INGEST_FLUSH_INTERVAL']
+        with app.app_context():
+            while True:
+                try:
+                    while drain(slot, flush_size) >= flush_size:
+                        pass
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Ingest log drain failed')
+                finally:
+                    db.session.remove()
+                with self.ready:
+                    if self.pending < flush_size:
+                        self.ready.wait(interval)
+                    self.pending = 0
+
+
+wal = WriteAheadLog()
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from sqlalchemy import or_
+
+# On PostgreSQL an id is handed out when a row is inserted but the row only
+# shows once its transaction commits, so a poll can read id 11 while id 10
+# is still to come. Ids skipped over are looked for again for GAP_TIMEOUT
+# seconds, up to MAX_GAPS of them.
+GAP_TIMEOUT = 60
+MAX_GAPS = 1000
+
+
+# Position of a poll over a table in id order: every row up to `last_id` has
+# been read, except the `gaps` skipped on the way there.
+class Watermark(object):
+
+    def __init__(self, last_id):
+        self.last_id = last_id
+        self.gaps = {}
+        self.lock = threading.Lock()
+
+    # condition on `column` for the rows not read yet
+    def unread(self, column):
+        with self.lock:
+            now = time.monotonic()
+            for id, skipped in list(self.gaps.items()):
+                if now - skipped > GAP_TIMEOUT:
+                    del self.gaps[id]
+            gaps = sorted(self.gaps)
+        return or_(column > self.last_id, column.in_(gaps)) if gaps else column > self.last_id
+
+    # records a row as read; False when it already was
+    def seen(self, id):
+        with self.lock:
+            if id > self.last_id:
+                now = time.monotonic()
+                for gap in range(max(self.last_id + 1, id - MAX_GAPS), id):
+                    self.gaps[gap] = now
+                while len(self.gaps) > MAX_GAPS:
+                    del self.gaps[next(iter(self.gaps))]
+                self.last_id = id
+                return True
+            return self.gaps.pop(id, None) is not None
@@ -0,0 +1,7 @@
+import application
+from application.aio import create_asgi_app
+from application.wal import wal
+
+flask_app = application.create_app()
+wal.init_app(flask_app)
+app = create_asgi_app(flask_app)
@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# row counts of the generated market; `full` is a trading year of a
+# mid-sized venue
+PRESETS = {
+    'small': {'items': 1000, 'traders': 1000, 'prices': 100000, 'trades': 10000, 'days': 20},
+    'medium': {'items': 5000, 'traders': 5000, 'prices': 1000000, 'trades': 100000, 'days': 60},
+    'full': {'items': 10000, 'traders': 10000, 'prices': 10000000, 'trades': 1000000, 'days': 250},
+}
+
+# (code, name, share of items and traders, rate in USD)
+CURRENCIES = [
+    ('USD', 'US Dollar', 0.55, 1.0),
+    ('EUR', 'Euro', 0.2, 1.18),
+    ('GBP', 'Pound Sterling', 0.1, 1.36),
+    ('JPY', 'Yen', 0.05, 0.0091),
+    ('BRL', 'Real', 0.05, 0.19),
+    ('CHF', 'Swiss Franc', 0.05, 1.08),
+]
+
+# (code, name, currency code)
+COUNTRIES = [
+    ('US', 'United States', 'USD'), ('DE', 'Germany', 'EUR'), ('FR', 'France', 'EUR'), ('IT', 'Italy', 'EUR'),
+    ('GB', 'United Kingdom', 'GBP'), ('JP', 'Japan', 'JPY'), ('BR', 'Brazil', 'BRL'), ('CH', 'Switzerland', 'CHF'),
+]
+
+WORDS = ['North', 'South', 'Global', 'United', 'First', 'Pacific', 'Atlantic', 'Golden', 'Silver', 'Blue', 'Green',
+         'Copper', 'Iron', 'Solar', 'Nova', 'Apex', 'Summit', 'River', 'Harbor', 'Crest']
+SECTORS = ['Energy', 'Mining', 'Bank', 'Telecom', 'Pharma', 'Foods', 'Motors', 'Logistics', 'Software', 'Retail',
+           'Utilities', 'Insurance', 'Chemicals', 'Airlines', 'Steel', 'Coin', 'Token', 'Holdings']
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elena', 'Felipe', 'Gabriela', 'Hugo', 'Isabel', 'Joao', 'Kenji',
+               'Laura', 'Marco', 'Nina', 'Oscar', 'Paula', 'Rafael', 'Sofia', 'Thomas', 'Yuki']
+LAST_NAMES = ['Silva', 'Santos', 'Muller', 'Rossi', 'Smith', 'Tanaka', 'Dubois', 'Garcia', 'Costa', 'Brown',
+              'Schmidt', 'Moreau', 'Sato', 'Oliveira', 'Jones', 'Weber', 'Ricci', 'Martin', 'Lopez', 'Ito']
+
+START = date(2021, 1, 4)
+OPEN, CLOSE = 9 * 3600, 17 * 3600 + 1800
+RATE_INTERVAL = 300
+CHUNK = 50000
+
+
+def trading_days(count):
+    days = []
+    day = START
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+# `count` sorted timestamps spread uniformly over the trading hours of `days`
+def timestamps(rng, days, count):
+    seconds = np.sort(rng.uniform(0, len(days) * (CLOSE - OPEN), count))
+    day_index = (seconds // (CLOSE - OPEN)).astype(np.int64)
+    offsets = OPEN + seconds % (CLOSE - OPEN)
+    midnights = np.array([datetime.combine(day, datetime.min.time()) for day in days], dtype='datetime64[us]')
+    return midnights[day_index] + (offsets * 1e6).astype('timedelta64[us]')
+
+
+# a few items draw most of the ticks and trades, as on a real venue
+def popularity(items):
+    weights = 1 / np.arange(1, items + 1) ** 0.8
+    return weights / weights.sum()
+
+
+# One random walk per item over its own ticks: the steps are summed in item
+# order and each item's run starts from the total before it.
+def walks(rng, item_index, start_prices, volatility=0.002):
+    order = np.argsort(item_index, kind='stable')
+    sorted_items = item_index[order]
+    totals = np.cumsum(rng.normal(0, volatility, len(order)))
+    starts = np.flatnonzero(np.r_[True, sorted_items[1:] != sorted_items[:-1]])
+    before = np.repeat(np.r_[0, totals][starts], np.diff(np.r_[starts, len(order)]))
+    path = np.empty(len(order))
+    path[order] = start_prices[sorted_items] * np.exp(totals - before)
+    return path
+
+
+def insert(db, table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[start:start + CHUNK])
+    db.session.commit()
+
+
+def insert_columns(db, table, columns):
+    names = list(columns)
+    count = len(columns[names[0]])
+    for start in range(0, count, CHUNK):
+        values = [columns[name][start:start + CHUNK] for name in names]
+        values = [v.tolist() if isinstance(v, np.ndarray) else v for v in values]
+        db.session.execute(table.insert(), [dict(zip(names, row)) for row in zip(*values)])
+    db.session.commit()
+
+
+# Fills an empty database with a synthetic market of `volumes`: currencies
+# with 5 minute FX history, countries, items and traders spread over the
+# currencies, price ticks as per-item random walks, one filled offer per
+# trade plus resting ones, the inventory the trades add up to and the
+# daily reports. Returns a manifest of what was generated.
+def generate(db, models, volumes, seed=1, log=print):
+    from application import reports
+
+    rng = np.random.default_rng(seed)
+    days = trading_days(volumes['days'])
+    end = datetime.combine(days[-1] + timedelta(days=1), datetime.min.time())
+    for pragma in ('PRAGMA synchronous = OFF', 'PRAGMA journal_mode = MEMORY'):
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(pragma)
+
+    started = time.perf_counter()
+    currency_ids = {code: n for n, (code, _, _, _) in enumerate(CURRENCIES, 1)}
+    insert(db, models.Currency.__table__, [
+        {'id': n, 'code': code, 'name': name, 'is_active': True, 'is_base_currency': code == 'USD'}
+        for (code, name, _, _), n in zip(CURRENCIES, currency_ids.values())])
+    insert(db, models.Country.__table__, [{'id': n, 'code': code, 'name': name}
+                                          for n, (code, name, _) in enumerate(COUNTRIES, 1)])
+    insert(db, models.CurrencyUsed.__table__, [
+        {'country_id': n, 'currency_id': currency_ids[currency], 'date_from': date(1999, 1, 1), 'date_to': None}
+        for n, (_, _, currency) in enumerate(COUNTRIES, 1)])
+
+    rate_times = np.concatenate([
+        np.arange(np.datetime64(datetime.combine(day, datetime.min.time())) + np.timedelta64(OPEN, 's'),
+                  np.datetime64(datetime.combine(day, datetime.min.time())) + np.timedelta64(CLOSE, 's'),
+                  np.timedelta64(RATE_INTERVAL, 's')) for day in days]).astype('datetime64[us]')
+    for code, _, _, usd in CURRENCIES[1:]:
+        path = usd * np.exp(np.cumsum(rng.normal(0, 0.0005, len(rate_times))))
+        insert_columns(db, models.CurrencyRate.__table__, {
+            'currency_id': [currency_ids[code]] * len(rate_times),
+            'base_currency_id': [currency_ids['USD']] * len(rate_times),
+            'rate': np.round(path, 6),
+            'ts': rate_times.tolist(),
+        })
+    log('currencies and {} rates in {:.1f} s'.format(len(rate_times) * (len(CURRENCIES) - 1),
+                                                   time.perf_counter() - started))
+
+    started = time.perf_counter()
+    shares = np.array([share for _, _, share, _ in CURRENCIES])
+    item_currency = rng.choice(len(CURRENCIES), volumes['items'], p=shares) + 1
+    codes = set()
+    item_rows = []
+    for n in range(volumes['items']):
+        code = ''.join(chr(65 + c) for c in rng.integers(0, 26, 4))
+        while code in codes:
+            code = ''.join(chr(65 + c) for c in rng.integers(0, 26, 4))
+        codes.add(code)
+        name = '{} {} {}'.format(WORDS[n % len(WORDS)], WORDS[n // len(WORDS) % len(WORDS)],
+                                 SECTORS[n % len(SECTORS)])
+        item_rows.append({'id': n + 1, 'code': code, 'name': name, 'is_active': n % 50 != 49,
+                          'currency_id': int(item_currency[n]),
+                          'details': '{} listed in {}'.format(SECTORS[n % len(SECTORS)],
+                                                             CURRENCIES[item_currency[n] - 1][0])})
+    insert(db, models.Item.__table__, item_rows)
+
+    trader_currency = rng.choice(len(CURRENCIES), volumes['traders'], p=shares) + 1
+    country_of = {currency_ids[currency]: n for n, (_, _, currency) in enumerate(COUNTRIES, 1)}
+    registered = datetime(2020, 1, 1)
+    insert(db, models.Trader.__table__, [{
+        'id': n + 1,
+        'first_name': FIRST_NAMES[n % len(FIRST_NAMES)],
+        'last_name': LAST_NAMES[n // len(FIRST_NAMES) % len(LAST_NAMES)],
+        'user_name': 'trader{}'.format(n + 1),
+        'password': 'x',
+        'email': 'trader{}@example.com'.format(n + 1),
+        'confirmation_code': 'x',
+        'time_registered': registered + timedelta(minutes=n),
+        'time_confirmed': registered + timedelta(minutes=n + 5),
+        'country_id': country_of[int(trader_currency[n])],
+        'preferred_currency_id': int(trader_currency[n]),
+    } for n in range(volumes['traders'])])
+    log('{} items and {} traders in {:.1f} s'.format(volumes['items'], volumes['traders'],
+                                                     time.perf_counter() - started))
+
+    started = time.perf_counter()
+    weights = popularity(volumes['items'])
+    start_prices = np.round(np.exp(rng.uniform(np.log(1), np.log(500), volumes['items'])), 2)
+    written = 0
+    # prices are generated a slice of days at a time to bound memory
+    per_day = volumes['prices'] / len(days)
+    last = np.zeros(volumes['items'])
+    for first in range(0, len(days), 10):
+        chunk_days = days[first:first + 10]
+        count = int(round(per_day * (first + len(chunk_days)))) - written
+        item_index = rng.choice(volumes['items'], count, p=weights)
+        path = walks(rng, item_index, np.where(last > 0, last, start_prices))
+        last[item_index] = path
+        buy = np.round(path, 2).clip(0.01)
+        insert_columns(db, models.Price.__table__, {
+            'item_id': item_index + 1,
+            'currency_id': item_currency[item_index],
+            'buy': buy,
+            'sell': np.round(buy * (1 + rng.uniform(0.0005, 0.005, count)), 2),
+            'ts': timestamps(rng, chunk_days, count).tolist(),
+        })
+        written += count
+        log('  {} prices'.format(written))
+    log('{} prices in {:.1f} s'.format(written, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    trades = volumes['trades']
+    resting = trades // 10
+    offers = trades + resting
+    offer_item = rng.choice(volumes['items'], offers, p=weights)
+    offer_trader = rng.integers(1, volumes['traders'] + 1, offers)
+    offer_buy = rng.random(offers) < 0.5
+    offer_price = np.round(last[offer_item] * rng.uniform(0.98, 1.02, offers), 2).clip(0.01)
+    offer_quantity = rng.integers(1, 101, offers)
+    offer_ts = timestamps(rng, days, offers)
+    # the resting offers are the last ones, still active at the end of the period
+    insert_columns(db, models.Offer.__table__, {
+        'id': np.arange(1, offers + 1),
+        'trader_id': offer_trader,
+        'item_id': offer_item + 1,
+        'quantity': np.where(np.arange(offers) < trades, 0, offer_quantity),
+        'buy': offer_buy.tolist(),
+        'sell': (~offer_buy).tolist(),
+        'price': offer_price,
+        'ts': offer_ts.tolist(),
+        'is_active': (np.arange(offers) >= trades).tolist(),
+    })
+
+    filled = np.arange(trades)
+    counterparty = rng.integers(1, volumes['traders'] + 1, trades)
+    counterparty = np.where(counterparty == offer_trader[filled], counterparty % volumes['traders'] + 1,
+                            counterparty)
+    house = rng.random(trades) < 0.1
+    buyer = np.where(offer_buy[filled], offer_trader[filled], counterparty)
+    seller = np.where(offer_buy[filled], counterparty, offer_trader[filled])
+    # trades against the house only ever have a buyer
+    buyer = np.where(house, offer_trader[filled], buyer)
+    seller = np.where(house, 0, seller)
+    quantity = offer_quantity[filled]
+    insert_columns(db, models.Trade.__table__, {
+        'item_id': offer_item[filled] + 1,
+        'buyer_id': buyer,
+        'seller_id': [None if s == 0 else s for s in seller.tolist()],
+        'quantity': quantity,
+        'unit_price': offer_price[filled],
+        'description': ['Offer {} matched'.format(n + 1) for n in filled.tolist()],
+        'offer_id': filled + 1,
+    })
+
+    holder = np.concatenate([buyer, seller[seller > 0]])
+    held_item = np.concatenate([offer_item[filled], offer_item[filled][seller > 0]])
+    held = np.concatenate([quantity, -quantity[seller > 0]])
+    keys, inverse = np.unique(holder * (volumes['items'] + 1) + held_item, return_inverse=True)
+    totals = np.bincount(inverse.reshape(-1), weights=held)
+    nonzero = totals != 0
+    insert_columns(db, models.CurrentInventory.__table__, {
+        'trader_id': keys[nonzero] // (volumes['items'] + 1),
+        'item_id': keys[nonzero] % (volumes['items'] + 1) + 1,
+        'quantity': totals[nonzero],
+    })
+    log('{} offers, {} trades and {} positions in {:.1f} s'.format(offers, trades, int(nonzero.sum()),
+                                                                   time.perf_counter() - started))
+
+    started = time.perf_counter()
+    for _ in reports.backfill(days[0], days[-1] + timedelta(days=1), chunk_days=5):
+        pass
+    log('{} reports in {:.1f} s'.format(db.session.query(db.func.count(models.Report.id)).scalar(),
+                                        time.perf_counter() - started))
+
+    return {
+        'volumes': volumes,
+        'seed': seed,
+        'start': days[0].isoformat(),
+        'end': end.isoformat(),
+        'days': [day.isoformat() for day in days],
+        'rates': len(rate_times) * (len(CURRENCIES) - 1),
+        'offers': offers,
+        'positions': int(nonzero.sum()),
+    }
+
+
+def default_path(preset, seed):
+    return os.path.join(tempfile.gettempdir(), 'my-investments-benchmark-{}-{}.db'.format(preset, seed))
+
+
+# the manifest of the market at `path` if it was generated from `preset`
+# and `seed`, else None
+def load(path, preset, seed=1):
+    manifest_path = path + '.json'
+    if os.path.exists(path) and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['volumes'] == PRESETS[preset] and manifest['seed'] == seed:
+            return manifest
+    return None
+
+
+# The database of `preset` at `path` and its manifest, generated first
+# unless a finished one is there already. The manifest is written last, so
+# an interrupted run is started over. Generating creates the app, so this
+# has to run before any other app is created in the process.
+def ensure(path, preset, seed=1, log=print):
+    manifest = load(path, preset, seed)
+    if manifest is not None:
+        return manifest
+    manifest_path = path + '.json'
+    for stale in (path, manifest_path):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(path)
+    from application import create_app, db, models
+    app = create_app()
+    with app.app_context():
+        log('generating the {} market into {}'.format(preset, path))
+        manifest = generate(db, models, PRESETS[preset], seed, log)
+        db.session.remove()
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic market database for the benchmark suite.')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help='SQLite file to generate, a file under the temp directory by default')
+    args = parser.parse_args()
+
+    path = args.db or default_path(args.preset, args.seed)
+    manifest = ensure(path, args.preset, args.seed)
+    print(json.dumps(dict(manifest, days=len(manifest['days']), path=path)))
+
+
+if __name__ == '__main__':
+    main()
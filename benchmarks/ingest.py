@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks import percentile
+
+
+def seed(db, models):
+    insert = lambda model, values: db.session.execute(model.__table__.insert(), values)
+    insert(models.Currency, [{'id': 1, 'code': 'USD', 'name': 'Dollar', 'is_active': True, 'is_base_currency': True},
+                             {'id': 2, 'code': 'EUR', 'name': 'Euro', 'is_active': True, 'is_base_currency': False}])
+    insert(models.Item, [{'id': i, 'code': 'IT{}'.format(i), 'name': 'Item {}'.format(i), 'is_active': True,
+                          'currency_id': 1, 'details': None} for i in range(1, 51)])
+    db.session.commit()
+
+
+# one price tick in 20 is a currency rate tick
+def ticks(client_id, count):
+    for n in range(count):
+        second = client_id * count + n
+        ts = '2021-01-04T{:02d}:{:02d}:{:02d}'.format(9 + second // 3600 % 12, second // 60 % 60, second % 60)
+        if n % 20 == 19:
+            yield '/api/currency_rates/', {'currency_id': 2, 'base_currency_id': 1, 'rate': 1.1 + n % 10 / 100,
+                                           'ts': ts}
+        else:
+            yield '/api/prices/', {'item_id': 1 + n % 50, 'currency_id': 1, 'buy': 100 + n % 7, 'sell': 101 + n % 7,
+                                   'ts': ts}
+
+
+def stored(db, models):
+    count = db.session.query(db.func.count(models.Price.id)).scalar() \
+        + db.session.query(db.func.count(models.CurrencyRate.id)).scalar()
+    db.session.remove()
+    return count
+
+
+# Posts `count` ticks from each of `clients` threads through the Flask test
+# client and reports the acknowledged ticks/sec and request latencies, and
+# the sustained ticks/sec: ticks over the time until all of them are stored.
+def run(app, db, models, mode, fsync, clients, count, timeout):
+    app.config.update(INGEST_MODE=mode, INGEST_FSYNC=fsync)
+    with app.app_context():
+        start_count = stored(db, models)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def post(client_id):
+        client = app.test_client()
+        samples = []
+        for path, body in ticks(client_id, count):
+            started = time.perf_counter()
+            response = client.post(path, json=body)
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 300:
+                with lock:
+                    errors.append('{} {}: {}'.format(path, response.status_code, response.get_data(as_text=True)))
+                return
+        with lock:
+            latencies.extend(samples)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=post, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    acknowledged = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(errors[0])
+
+    total = clients * count
+    with app.app_context():
+        while stored(db, models) - start_count < total:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError('{} ticks not stored after {} s'.format(total, timeout))
+            time.sleep(0.01)
+    finished = time.perf_counter() - started
+
+    return {
+        'benchmark': 'ingest',
+        'mode': mode if mode == 'direct' else '{} fsync={}'.format(mode, 'on' if fsync else 'off'),
+        'ticks': total,
+        'clients': clients,
+        'acknowledged_ticks_per_sec': total / acknowledged,
+        'sustained_ticks_per_sec': total / finished,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sustained price and currency rate ticks/sec, committed per '
+                                                 'request or through the write-ahead ingest log.')
+    parser.add_argument('--ticks', type=int, default=5000, help='ticks posted per client')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent posting threads')
+    parser.add_argument('--commit-latency-ms', type=float, default=0,
+                        help='delay added to every database commit, to stand in for a slow database')
+    parser.add_argument('--flush-size', type=int, default=1000, help='INGEST_FLUSH_SIZE')
+    parser.add_argument('--flush-interval', type=float, default=0.2, help='INGEST_FLUSH_INTERVAL')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for the writer to catch up')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    # a scratch database and log directory, so the benchmark never touches the configured ones
+    directory = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'ingest.db')
+    os.environ['INGEST_WAL_DIR'] = os.path.join(directory, 'wal')
+    os.environ['INGEST_FLUSH_SIZE'] = str(args.flush_size)
+    os.environ['INGEST_FLUSH_INTERVAL'] = str(args.flush_interval)
+
+    from sqlalchemy import event
+    from application import create_app, db, models
+    app = create_app()
+    with app.app_context():
+        seed(db, models)
+        if args.commit_latency_ms:
+            event.listen(db.engine, 'commit', lambda conn: time.sleep(args.commit_latency_ms / 1000))
+
+    results = [run(app, db, models, mode, fsync, args.clients, args.ticks, args.timeout)
+               for mode, fsync in (('direct', True), ('wal', True), ('wal', False))]
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for result in results:
+            print('{mode}: {ticks} ticks from {clients} clients, acknowledged {acknowledged_ticks_per_sec:.0f}/s, '
+                  'sustained {sustained_ticks_per_sec:.0f}/s, p50 {p50_ms:.2f} ms, p99 {p99_ms:.2f} ms'.format(
+                      **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'dev': [sys.executable, 'server.py'],
+    'wsgi': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+    'asgi': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-k', 'uvicorn.workers.UvicornWorker',
+             'asgi:app'],
+}
+
+
+def wait_for_port(process, host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline and process.poll() is None:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start on {}:{}'.format(host, port))
+
+
+# each client thread keeps one connection alive and cycles through the paths
+def client(host, port, paths, deadline, latencies, errors, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    samples = []
+    failed = 0
+    i = 0
+    while time.time() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 400:
+                failed += 1
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        samples.append(time.perf_counter() - t0)
+    conn.close()
+    with lock:
+        latencies.extend(samples)
+        errors.append(failed)
+
+
+def run(url, paths, concurrency, duration):
+    parts = urlsplit(url)
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=client, args=(parts.hostname, parts.port or 80, paths, deadline,
+                                                     latencies, errors, lock))
+               for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        raise RuntimeError('no request succeeded against {}'.format(url))
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1e3,
+        'p90_ms': percentile(latencies, 90) * 1e3,
+        'p99_ms': percentile(latencies, 99) * 1e3,
+    }
+
+
+def spawn(mode, port):
+    env = dict(os.environ, PORT=str(port), GUNICORN_BIND='127.0.0.1:{}'.format(port),
+               GUNICORN_ACCESSLOG='', FLASK_ENV='production')
+    process = subprocess.Popen(SERVERS[mode], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(process, '127.0.0.1', port)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Requests/sec and latency percentiles for the API.')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='server to load when not spawning one')
+    parser.add_argument('--mode', action='append', choices=sorted(SERVERS),
+                        help='start the dev server, the gunicorn server and/or the async read path '
+                             'under gunicorn and load each in turn')
+    parser.add_argument('--port', type=int, default=5050, help='port for spawned servers')
+    parser.add_argument('--path', action='append',
+                        help='path to request, may be repeated (default: the reference collections)')
+    parser.add_argument('--concurrency', type=int, action='append',
+                        help='open connections, may be repeated to compare scaling (default: 16)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--warmup', type=float, default=3, help='untimed seconds before each run')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    paths = args.path or ['/api/countries/', '/api/currencies/', '/api/items/', '/api/prices/?limit=100']
+    results = []
+    for mode in args.mode or [None]:
+        process = spawn(mode, args.port) if mode else None
+        try:
+            url = 'http://127.0.0.1:{}'.format(args.port) if mode else args.url
+            for concurrency in args.concurrency or [16]:
+                # warm up so every worker has booted and built its app before timing
+                run(url, paths, concurrency, args.warmup)
+                result = dict(benchmark='loadtest', mode=mode or url, **run(url, paths, concurrency, args.duration))
+                results.append(result)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for result in results:
+            print('{mode} x{concurrency}: {requests_per_sec:.1f} req/s, p50 {p50_ms:.2f} ms, p90 {p90_ms:.2f} ms, '
+                  'p99 {p99_ms:.2f} ms, {errors} errors'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
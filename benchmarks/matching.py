@@ -0,0 +1,69 @@
+import argparse
+import json
+import random
+import time
+from decimal import Decimal
+
+from application.matching import Order, OrderBook
+from benchmarks import percentile
+
+
+# Rests `depth` orders on each side around a mid of 100, then times incoming
+# orders whose limit prices straddle the spread so roughly half of them trade.
+def run(depth, orders, seed):
+    rnd = random.Random(seed)
+    book = OrderBook()
+    offer_id = 0
+
+    def order(buy, price):
+        nonlocal offer_id
+        offer_id += 1
+        quantity = Decimal(rnd.randint(1, 100))
+        return Order(offer_id, rnd.randint(1, 1000), buy, Decimal(price).quantize(Decimal('0.01')), quantity)
+
+    for _ in range(depth):
+        book.add(order(True, 100 - rnd.uniform(0.01, 10)))
+        book.add(order(False, 100 + rnd.uniform(0.01, 10)))
+
+    latencies = []
+    fills = 0
+    started = time.perf_counter()
+    for _ in range(orders):
+        buy = rnd.random() < 0.5
+        incoming = order(buy, 100 + rnd.uniform(-10, 10))
+        t0 = time.perf_counter()
+        fills += len(book.match(incoming))
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'benchmark': 'matching',
+        'depth': depth,
+        'orders': orders,
+        'fills': fills,
+        'resting': len(book),
+        'orders_per_sec': orders / elapsed,
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p99_us': percentile(latencies, 99) * 1e6,
+        'max_us': max(latencies) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Order book matching throughput and latency.')
+    parser.add_argument('--depth', type=int, default=100000, help='resting orders per side')
+    parser.add_argument('--orders', type=int, default=100000, help='incoming orders to match')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    args = parser.parse_args()
+
+    result = run(args.depth, args.orders, args.seed)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print('{:>16}: {}'.format(key, round(value, 2) if isinstance(value, float) else value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+
+def seed(db, models, rows, seed):
+    rnd = random.Random(seed)
+    insert = lambda model, values: db.session.execute(model.__table__.insert(), values)
+    insert(models.Currency, [{'id': 1, 'code': 'USD', 'name': 'Dollar', 'is_active': True, 'is_base_currency': True}])
+    insert(models.Country, [{'id': 1, 'code': 'BR', 'name': 'Brazil'}])
+    insert(models.Item, [{'id': i, 'code': 'IT{}'.format(i), 'name': 'Item {}'.format(i), 'is_active': True,
+                          'currency_id': 1, 'details': None} for i in range(1, 51)])
+    insert(models.Trader, [{'id': i, 'first_name': 'First', 'last_name': 'Last', 'user_name': 'user{}'.format(i),
+                            'password': 'x', 'email': 'user{}@example.com'.format(i), 'confirmation_code': 'x',
+                            'time_registered': datetime(2021, 1, 1), 'time_confirmed': datetime(2021, 1, 1),
+                            'country_id': 1, 'preferred_currency_id': 1} for i in range(1, 101)])
+
+    ts = datetime(2021, 1, 4)
+    prices, offers, trades = [], [], []
+    for i in range(1, rows + 1):
+        ts += timedelta(seconds=1)
+        price = Decimal(rnd.randint(1000, 20000)) / 100
+        prices.append({'item_id': rnd.randint(1, 50), 'currency_id': 1, 'buy': price, 'sell': price + 1, 'ts': ts})
+        offers.append({'id': i, 'trader_id': rnd.randint(1, 100), 'item_id': rnd.randint(1, 50),
+                       'quantity': Decimal(0), 'buy': True, 'sell': False, 'price': price, 'ts': ts,
+                       'is_active': False})
+        trades.append({'item_id': offers[-1]['item_id'], 'buyer_id': offers[-1]['trader_id'],
+                       'seller_id': rnd.choice([None, rnd.randint(1, 100)]), 'quantity': Decimal(rnd.randint(1, 100)),
+                       'unit_price': price, 'description': 'Offer {} matched'.format(i), 'offer_id': i})
+    insert(models.Price, prices)
+    insert(models.Offer, offers)
+    insert(models.Trade, trades)
+    db.session.commit()
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+# Builds the JSON body of a `rows` long list of prices and trades through
+# load_plan + marshal + output_json and through serializers.Serializer, from
+# query to bytes, and reports the best of `repeat` runs as rows/sec.
+def run(rows, repeat, seed_value):
+    from application import create_app, db, models
+    from application.loading import load_plan
+    from application.serializers import dumps, serializer_for
+    from flask_restplus import marshal
+    from flask_restplus.representations import output_json
+
+    app = create_app()
+    from application.routes import price_fields, trade_fields
+    results = []
+    with app.test_request_context():
+        seed(db, models, rows, seed_value)
+        for name, model, fields in (('prices', models.Price, price_fields), ('trades', models.Trade, trade_fields)):
+            def restplus():
+                objects = model.query.options(*load_plan(model, fields)).order_by(model.id).all()
+                body = output_json(marshal(objects, fields), 200).get_data()
+                db.session.expunge_all()
+                return body
+
+            def fast():
+                serializer = serializer_for(model, fields)
+                result = serializer.query(model.query, (model.id,)).order_by(model.id).all()
+                return dumps([serializer.row(row) for row in result])
+
+            restplus_time, restplus_body = timed(restplus, repeat)
+            fast_time, fast_body = timed(fast, repeat)
+            results.append({
+                'benchmark': 'serializers',
+                'endpoint': name,
+                'rows': rows,
+                'identical': json.loads(restplus_body) == json.loads(fast_body),
+                'restplus_rows_per_sec': rows / restplus_time,
+                'fast_rows_per_sec': rows / fast_time,
+                'speedup': restplus_time / fast_time,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rows/sec of the restplus and column tuple list serializers.')
+    parser.add_argument('--rows', type=int, default=20000, help='prices and trades to serialize')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per path, the best is reported')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    # a scratch database, so the benchmark never touches the configured one
+    directory = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'serializers.db')
+    results = run(args.rows, args.repeat, args.seed)
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for result in results:
+            print('{endpoint}: restplus {restplus_rows_per_sec:.0f} rows/s, fast {fast_rows_per_sec:.0f} rows/s, '
+                  '{speedup:.2f}x, identical: {identical}'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
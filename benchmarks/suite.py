@@ -0,0 +1,460 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = []
+
+
+# A named, timed piece of work. `func(ctx)` is a generator: what runs
+# before its yield is setup, it yields the callable to time, or (callable,
+# reset) with `reset` run untimed after every round to undo what the
+# callable wrote, and what runs after it is teardown.
+class Scenario(object):
+
+    def __init__(self, group, name, func, rounds=None):
+        self.group = group
+        self.name = name
+        self.func = func
+        self.rounds = rounds
+
+    @property
+    def fullname(self):
+        return '{}/{}'.format(self.group, self.name)
+
+
+def scenario(group, name=None, rounds=None):
+    def register(func):
+        SCENARIOS.append(Scenario(group, name or func.__name__, func, rounds))
+        return func
+    return register
+
+
+# What scenarios need to know about the generated market: its app, a test
+# client, the busiest item and trader, a trading day in the middle of the
+# period and a day past its end that ingestion scenarios write into and
+# clean up after.
+class Context(object):
+
+    def __init__(self, app, manifest):
+        from application import db
+        from application.models import Item, Trade, Trader
+        self.app = app
+        self.client = app.test_client()
+        self.manifest = manifest
+        days = [date.fromisoformat(day) for day in manifest['days']]
+        self.day = days[len(days) // 2]
+        self.end = datetime.fromisoformat(manifest['end'])
+        self.future = self.end.date() + timedelta(days=7)
+        with app.app_context():
+            self.items = [code for code, in db.session.query(Item.code).order_by(Item.id).limit(10)]
+            self.trader = db.session.query(Trader.id).join(Trade, Trade.buyer_id == Trader.id) \
+                .group_by(Trader.id).order_by(db.func.count(Trade.id).desc()).limit(1).scalar()
+            db.session.remove()
+        self.params = {
+            'item': self.items[0],
+            'items': ','.join(self.items),
+            'trader': self.trader,
+            'day': self.day.isoformat(),
+            'next_day': (self.day + timedelta(days=1)).isoformat(),
+            'week_end': (self.day + timedelta(days=7)).isoformat(),
+            'end': self.end.isoformat(),
+        }
+
+    def get(self, path):
+        response = self.client.get(path)
+        body = response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError('GET {}: {} {}'.format(path, response.status_code, body[:200]))
+        return body
+
+    def post(self, path, **kwargs):
+        response = self.client.post(path, **kwargs)
+        if response.status_code >= 300:
+            raise RuntimeError('POST {}: {} {}'.format(path, response.status_code, response.get_data()[:200]))
+        return response
+
+    # undoes what the ingestion scenarios wrote past the end of the period
+    def reset(self, max_trade_id=None):
+        from application import db
+        from application.models import CurrencyRate, Price, Report, Trade
+        start = datetime.combine(self.future, datetime.min.time())
+        with self.app.app_context():
+            Price.query.filter(Price.ts >= start).delete(synchronize_session=False)
+            CurrencyRate.query.filter(CurrencyRate.ts >= start).delete(synchronize_session=False)
+            Report.query.filter(Report.trading_date >= self.future).delete(synchronize_session=False)
+            if max_trade_id is not None:
+                Trade.query.filter(Trade.id > max_trade_id).delete(synchronize_session=False)
+            db.session.commit()
+            db.session.remove()
+
+    def ticks(self, count):
+        start = datetime.combine(self.future, datetime.min.time()) + timedelta(hours=9)
+        return [{'item_id': 1 + n % 10, 'currency_id': 1, 'buy': 100 + n % 7, 'sell': 101 + n % 7,
+                 'ts': (start + timedelta(seconds=n)).isoformat()} for n in range(count)]
+
+
+def endpoint(name, path, rounds=None):
+    def get(ctx):
+        url = path.format(**ctx.params)
+        yield lambda: ctx.get(url)
+    scenario('endpoints', name, rounds)(get)
+
+
+endpoint('countries', '/api/countries/')
+endpoint('currencies', '/api/currencies/')
+endpoint('currency_rates', '/api/currency_rates/')
+endpoint('currencies_used', '/api/currencies_used/')
+endpoint('traders', '/api/traders/')
+endpoint('items', '/api/items/')
+endpoint('current_inventories', '/api/current_inventories/')
+endpoint('offers', '/api/offers/')
+endpoint('prices', '/api/prices/')
+endpoint('prices_item_day', '/api/prices/?item={item}&from={day}T00:00:00&to={next_day}T00:00:00&limit=1000')
+endpoint('prices_trader_currency', '/api/prices/?item={item}&trader={trader}&limit=1000')
+endpoint('prices_summary', '/api/prices/?view=summary&limit=1000')
+endpoint('prices_fields', '/api/prices/?fields=id,item.code,buy,sell,ts&limit=1000')
+endpoint('prices_stream_day', '/api/prices/?item={item}&from={day}T00:00:00&to={next_day}T00:00:00&stream=true')
+endpoint('prices_latest', '/api/prices/latest?items={items}')
+endpoint('prices_candles_week', '/api/prices/{item}/candles?interval=1h&from={day}T00:00:00&to={week_end}T00:00:00')
+endpoint('prices_export_day', '/api/prices/export?item={item}&from={day}T00:00:00&to={next_day}T00:00:00')
+endpoint('reports', '/api/reports/')
+endpoint('reports_trader_currency', '/api/reports/?trader={trader}&limit=1000')
+endpoint('trades', '/api/trades/')
+endpoint('trades_export', '/api/trades/export?item={item}')
+endpoint('currency_convert', '/api/currency_rates/convert?from=EUR&to=JPY&amount=100&at={day}T12:00:00')
+endpoint('items_search', '/api/items/search?q=north')
+endpoint('items_search_one_letter', '/api/items/search?q=s')
+endpoint('traders_search', '/api/traders/search?q=ana')
+endpoint('trader_portfolio', '/api/traders/{trader}/portfolio')
+endpoint('trader_pnl', '/api/traders/{trader}/pnl?to={end}')
+
+
+def bulk_prices(ctx, content_type, encode, rows=1000):
+    body = encode(ctx.ticks(rows))
+    ctx.reset()
+    yield (lambda: ctx.post('/api/prices/bulk', data=body, content_type=content_type)), ctx.reset
+
+
+def csv_body(rows):
+    lines = ['item_id,currency_id,buy,sell,ts']
+    lines.extend('{item_id},{currency_id},{buy},{sell},{ts}'.format(**row) for row in rows)
+    return '\n'.join(lines) + '\n'
+
+
+@scenario('ingest')
+def bulk_prices_json(ctx):
+    yield from bulk_prices(ctx, 'application/json', json.dumps)
+
+
+@scenario('ingest')
+def bulk_prices_ndjson(ctx):
+    yield from bulk_prices(ctx, 'application/x-ndjson', lambda rows: ''.join(json.dumps(row) + '\n' for row in rows))
+
+
+@scenario('ingest')
+def bulk_prices_csv(ctx):
+    yield from bulk_prices(ctx, 'text/csv', csv_body)
+
+
+@scenario('ingest')
+def bulk_currency_rates_json(ctx):
+    start = datetime.combine(ctx.future, datetime.min.time()) + timedelta(hours=9)
+    body = json.dumps([{'currency_id': 2 + n % 5, 'base_currency_id': 1, 'rate': 1 + n % 10 / 100,
+                        'ts': (start + timedelta(seconds=n)).isoformat()} for n in range(1000)])
+    ctx.reset()
+    yield (lambda: ctx.post('/api/currency_rates/bulk', data=body, content_type='application/json')), ctx.reset
+
+
+# trades against offers made on the future day, so only that day's reports move
+@scenario('ingest')
+def bulk_trades_json(ctx):
+    from application import db
+    from application.models import Offer, Trade
+    start = datetime.combine(ctx.future, datetime.min.time()) + timedelta(hours=9)
+    with ctx.app.app_context():
+        max_trade_id = db.session.query(db.func.max(Trade.id)).scalar()
+        max_offer_id = db.session.query(db.func.max(Offer.id)).scalar()
+        db.session.execute(Offer.__table__.insert(), [
+            {'id': max_offer_id + n + 1, 'trader_id': 1 + n % 10, 'item_id': 1 + n % 10, 'quantity': 0, 'buy': True,
+             'sell': False, 'price': 100, 'ts': start + timedelta(seconds=n), 'is_active': False}
+            for n in range(1000)])
+        db.session.commit()
+        db.session.remove()
+    body = json.dumps([{'item_id': 1 + n % 10, 'buyer_id': 1 + n % 10, 'seller_id': 2 + n % 10, 'quantity': 10,
+                        'unit_price': 100, 'description': 'benchmark', 'offer_id': max_offer_id + n + 1}
+                       for n in range(1000)])
+    reset = lambda: ctx.reset(max_trade_id)
+    yield (lambda: ctx.post('/api/trades/bulk', data=body, content_type='application/json')), reset
+    reset()
+    with ctx.app.app_context():
+        Offer.query.filter(Offer.id > max_offer_id).delete(synchronize_session=False)
+        db.session.commit()
+        db.session.remove()
+
+
+def post_prices(ctx, mode, count=100):
+    from application import db
+    from application.models import Price
+    ticks = ctx.ticks(count)
+    start = datetime.combine(ctx.future, datetime.min.time())
+
+    def post():
+        for tick in ticks:
+            ctx.post('/api/prices/', json=tick)
+        if mode == 'wal':
+            # acknowledged is not stored; the round ends once the writer caught up
+            with ctx.app.app_context():
+                while Price.query.filter(Price.ts >= start).count() < count:
+                    db.session.remove()
+                    time.sleep(0.005)
+                db.session.remove()
+
+    previous = ctx.app.config['INGEST_MODE']
+    ctx.app.config['INGEST_MODE'] = mode
+    ctx.reset()
+    yield post, ctx.reset
+    ctx.app.config['INGEST_MODE'] = previous
+
+
+@scenario('ingest')
+def post_prices_direct(ctx):
+    yield from post_prices(ctx, 'direct')
+
+
+@scenario('ingest')
+def post_prices_wal(ctx):
+    yield from post_prices(ctx, 'wal')
+
+
+def in_app(ctx, func):
+    from application import db
+
+    def run():
+        with ctx.app.app_context():
+            try:
+                return func()
+            finally:
+                db.session.remove()
+    return run
+
+
+@scenario('compute', rounds=5)
+def reports_rebuild_day(ctx):
+    from application import db, reports
+
+    def rebuild():
+        reports.rebuild(ctx.day, ctx.day + timedelta(days=1))
+        db.session.commit()
+    yield in_app(ctx, rebuild)
+
+
+@scenario('compute', rounds=5)
+def portfolio_value_all(ctx):
+    from application import portfolio
+    yield in_app(ctx, lambda: portfolio.value(portfolio.holdings(), ctx.end).totals())
+
+
+def pnl_replay(ctx, method):
+    from application import pnl
+    from application.models import Trader
+
+    def replay():
+        ledger, _, _, opening = pnl.compute(ctx.trader, method, None, ctx.end)
+        currency_id = Trader.query.get(ctx.trader).preferred_currency_id
+        return pnl.positions(ledger, opening, currency_id, ctx.end)
+    yield in_app(ctx, replay)
+
+
+@scenario('compute')
+def pnl_fifo(ctx):
+    yield from pnl_replay(ctx, 'fifo')
+
+
+@scenario('compute')
+def pnl_average(ctx):
+    yield from pnl_replay(ctx, 'average')
+
+
+@scenario('compute', rounds=5)
+def fx_rate_book_load(ctx):
+    from application.fx import RateBook
+    yield in_app(ctx, lambda: RateBook().refresh())
+
+
+@scenario('compute', rounds=5)
+def ticker_load(ctx):
+    from application.ticker import Ticker
+    yield in_app(ctx, lambda: Ticker().refresh())
+
+
+@scenario('compute', rounds=5)
+def order_book_match(ctx):
+    from benchmarks import matching
+    yield lambda: matching.run(10000, 10000, 1)
+
+
+def stats(samples):
+    ordered = sorted(samples)
+    n = len(ordered)
+    q1, q3 = (ordered[n // 4], ordered[3 * n // 4]) if n > 1 else (ordered[0], ordered[0])
+    mean = statistics.mean(ordered)
+    return {
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': mean,
+        'stddev': statistics.stdev(ordered) if n > 1 else 0.0,
+        'median': statistics.median(ordered),
+        'q1': q1,
+        'q3': q3,
+        'iqr': q3 - q1,
+        'rounds': n,
+        'total': sum(ordered),
+        'ops': 1 / mean if mean else 0.0,
+    }
+
+
+# Sets a scenario up, calls it `warmup` times untimed and `rounds` times
+# timed, resetting after each call, then tears it down.
+def measure(ctx, item, rounds, warmup):
+    steps = item.func(ctx)
+    target = next(steps)
+    run, reset = target if isinstance(target, tuple) else (target, None)
+    samples = []
+    try:
+        for n in range(warmup + rounds):
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            if n >= warmup:
+                samples.append(elapsed)
+            if reset is not None:
+                reset()
+    finally:
+        for _ in steps:
+            pass
+    return samples
+
+
+def machine_info():
+    import sqlite3
+    return {
+        'node': platform.node(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python_version': platform.python_version(),
+        'python_implementation': platform.python_implementation(),
+        'system': '{} {}'.format(platform.system(), platform.release()),
+        'sqlite_version': sqlite3.sqlite_version,
+    }
+
+
+def commit_info():
+    def git(*args):
+        return subprocess.check_output(('git',) + args, cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    try:
+        return {'id': git('rev-parse', 'HEAD'), 'branch': git('rev-parse', '--abbrev-ref', 'HEAD'),
+                'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+
+# change of each benchmark's median against a previous run, slower positive
+def compare(results, baseline):
+    before = {entry['fullname']: entry['stats']['median'] for entry in baseline['benchmarks']}
+    changes = {}
+    for entry in results['benchmarks']:
+        if entry['fullname'] in before and before[entry['fullname']]:
+            changes[entry['fullname']] = entry['stats']['median'] / before[entry['fullname']] - 1
+    return changes
+
+
+def selected(patterns, groups):
+    for item in SCENARIOS:
+        if groups and item.group not in groups:
+            continue
+        if patterns and not any(pattern in item.fullname for pattern in patterns):
+            continue
+        yield item
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Endpoint, ingestion and computation scenarios over a generated market, with results as JSON '
+                    'to compare runs.')
+    parser.add_argument('--preset', choices=sorted(generate.PRESETS), default='small',
+                        help='market size, generated on first use and reused after')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help='SQLite file of the market, a file under the temp directory by default')
+    parser.add_argument('-k', dest='patterns', action='append', help='only scenarios whose group/name contains this')
+    parser.add_argument('--group', action='append', choices=('endpoints', 'ingest', 'compute'))
+    parser.add_argument('--rounds', type=int, default=10, help='timed calls per scenario')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed calls per scenario')
+    parser.add_argument('--json', dest='output', help='file to write the results to')
+    parser.add_argument('--compare', help='results of an earlier run to compare medians with')
+    parser.add_argument('--max-regression', type=float,
+                        help='exit with status 1 when a median is slower than in --compare by more than this '
+                             'fraction, e.g. 0.2')
+    parser.add_argument('--list', action='store_true', help='list the scenarios and exit')
+    args = parser.parse_args()
+
+    scenarios = list(selected(args.patterns, args.group))
+    if args.list:
+        for item in scenarios:
+            print(item.fullname)
+        return
+
+    path = args.db or generate.default_path(args.preset, args.seed)
+    log = lambda message: print(message, file=sys.stderr)
+    manifest = generate.load(path, args.preset, args.seed)
+    if manifest is None:
+        # generated by a process of its own, as the app's routes are only
+        # registered with the first app created in a process
+        subprocess.check_call([sys.executable, '-m', 'benchmarks.generate', '--preset', args.preset,
+                               '--seed', str(args.seed), '--db', path], cwd=ROOT, stdout=sys.stderr)
+        manifest = generate.load(path, args.preset, args.seed)
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(path)
+    # a log directory of its own per market, so the writer's checkpoint is reused across runs
+    os.environ['INGEST_WAL_DIR'] = os.path.abspath(path) + '.wal'
+    from application import create_app
+    app = create_app()
+    ctx = Context(app, manifest)
+
+    results = {
+        'machine_info': machine_info(),
+        'commit_info': commit_info(),
+        'datetime': datetime.utcnow().isoformat(),
+        'dataset': dict(manifest, days=len(manifest['days']), preset=args.preset),
+        'benchmarks': [],
+    }
+    for item in scenarios:
+        rounds = min(args.rounds, item.rounds) if item.rounds else args.rounds
+        samples = measure(ctx, item, rounds, args.warmup)
+        entry = {'group': item.group, 'name': item.name, 'fullname': item.fullname, 'stats': stats(samples)}
+        results['benchmarks'].append(entry)
+        log('{:<45} median {:>10.2f} ms  min {:>10.2f} ms  max {:>10.2f} ms  ({} rounds)'.format(
+            item.fullname, entry['stats']['median'] * 1e3, entry['stats']['min'] * 1e3,
+            entry['stats']['max'] * 1e3, rounds))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            changes = compare(results, json.load(f))
+        for name, change in sorted(changes.items(), key=lambda entry: -entry[1]):
+            log('{:<45} {:>+8.1%}'.format(name, change))
+        if args.max_regression is not None and any(change > args.max_regression for change in changes.values()):
+            sys.exit(1)
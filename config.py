@@ -1,3 +1,4 @@
+import re
 from os import environ, path
 from dotenv import load_dotenv
 
@@ -5,6 +6,43 @@ basedir = path.abspath(path.dirname(__file__))
 load_dotenv(path.join(basedir, '.env'))
 
 
+def engine_options(uri):
+    options = {
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if not uri or uri.startswith('sqlite'):
+        # SQLite connections are file handles; there is no server-side pool to size
+        return options
+
+    options.update({
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+    })
+    statement_timeout = int(environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout and uri.startswith('postgresql'):
+        options['connect_args'] = {'options': '-c statement_timeout={}'.format(statement_timeout)}
+    elif statement_timeout and uri.startswith('mysql'):
+        options['connect_args'] = {'init_command': 'SET SESSION max_execution_time={}'.format(statement_timeout)}
+    return options
+
+
+# options for the async read path's `databases` pool; SQLite has none
+def async_database_options(uri):
+    if not uri or uri.startswith('sqlite'):
+        return {}
+    pool_size = int(environ.get('DB_POOL_SIZE', 5))
+    options = {
+        'min_size': pool_size,
+        'max_size': pool_size + int(environ.get('DB_MAX_OVERFLOW', 10)),
+    }
+    statement_timeout = int(environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout and uri.startswith('postgresql'):
+        options['server_settings'] = {'statement_timeout': str(statement_timeout)}
+    return options
+
+
 class Config:
     SECRET_KEY = environ.get('SECRET_KEY')
     FLASK_APP = environ.get('FLASK_APP')
@@ -16,4 +54,45 @@ class Config:
     SQLALCHEMY_DATABASE_URI = environ.get("SQLALCHEMY_DATABASE_URI")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # same database through an async driver (asyncpg, aiosqlite); drops a
+    # sync driver suffix such as +psycopg2 from the URI
+    ASYNC_DATABASE_URI = environ.get('ASYNC_DATABASE_URI') \
+        or re.sub(r'^(\w+)\+\w+:', r'\1:', SQLALCHEMY_DATABASE_URI or '')
+    ASYNC_DATABASE_OPTIONS = async_database_options(ASYNC_DATABASE_URI)
+
+    API_PAGE_SIZE = int(environ.get('API_PAGE_SIZE', 100))
+    API_MAX_PAGE_SIZE = int(environ.get('API_MAX_PAGE_SIZE', 1000))
+    API_STREAM_BATCH_SIZE = int(environ.get('API_STREAM_BATCH_SIZE', 1000))
+    EXPORT_BATCH_SIZE = int(environ.get('EXPORT_BATCH_SIZE', 10000))
+    SEARCH_MAX_MATCHES = int(environ.get('SEARCH_MAX_MATCHES', 1000))
+    SEARCH_MIN_RANKED = int(environ.get('SEARCH_MIN_RANKED', 3))
+
+    STREAM_POLL_INTERVAL = float(environ.get('STREAM_POLL_INTERVAL', 0.5))
+    STREAM_QUEUE_SIZE = int(environ.get('STREAM_QUEUE_SIZE', 1000))
+    STREAM_KEEPALIVE = float(environ.get('STREAM_KEEPALIVE', 15))
+
+    BULK_CHUNK_SIZE = int(environ.get('BULK_CHUNK_SIZE', 1000))
+    BULK_MAX_ERRORS = int(environ.get('BULK_MAX_ERRORS', 1000))
+
+    # 'wal' acknowledges single price and currency rate posts once they are
+    # in a local write-ahead log, written to the database in batches
+    INGEST_MODE = environ.get('INGEST_MODE', 'direct')
+    INGEST_WAL_DIR = environ.get('INGEST_WAL_DIR', path.join(basedir, 'wal'))
+    INGEST_SEGMENT_SIZE = int(environ.get('INGEST_SEGMENT_SIZE', 16 * 1024 * 1024))
+    INGEST_FLUSH_SIZE = int(environ.get('INGEST_FLUSH_SIZE', 1000))
+    INGEST_FLUSH_INTERVAL = float(environ.get('INGEST_FLUSH_INTERVAL', 0.2))
+    INGEST_FSYNC = environ.get('INGEST_FSYNC', 'true').lower() in ('1', 'true', 'yes')
+
+    CACHE_BACKEND = environ.get('CACHE_BACKEND', 'local')
+    CACHE_URL = environ.get('CACHE_URL')
+    CACHE_TIMEOUT = int(environ.get('CACHE_TIMEOUT', 300))
+    CACHE_MAX_ENTRIES = int(environ.get('CACHE_MAX_ENTRIES', 1024))
+
+    SLOW_REQUEST_MS = float(environ.get('SLOW_REQUEST_MS', 500))
+    SLOW_REQUEST_SAMPLE_RATE = float(environ.get('SLOW_REQUEST_SAMPLE_RATE', 1.0))
+
+    HISTORY_RETENTION_MONTHS = int(environ.get('HISTORY_RETENTION_MONTHS', 0))
+    HISTORY_PARTITIONS_AHEAD = int(environ.get('HISTORY_PARTITIONS_AHEAD', 3))
@@ -0,0 +1,39 @@
+# Production serving for wsgi:app, e.g.
+#   pipenv run gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be tuned per host through the environment.
+from os import environ
+
+bind = environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# A single worker, serving requests from a small thread pool. The default
+# local response cache is only invalidated by the writes its own worker
+# serves, so with more workers a client can be handed reference data another
+# worker has already changed. Only raise GUNICORN_WORKERS together with a
+# shared CACHE_BACKEND.
+workers = int(environ.get('GUNICORN_WORKERS', 1))
+worker_class = environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(environ.get('GUNICORN_THREADS', 4))
+
+keepalive = int(environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# recycle workers now and then so slow leaks cannot build up
+max_requests = int(environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# the app is created in each worker after the fork, so no database
+# connection is ever shared between processes; SIGHUP reloads the workers
+preload_app = False
+
+# an empty GUNICORN_ACCESSLOG turns the access log off
+accesslog = environ.get('GUNICORN_ACCESSLOG', '-') or None
+loglevel = environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+# with the app preloaded all the same, every worker claims an ingest log
+# slot of its own instead of sharing the master's
+def post_fork(server, worker):
+    from application.wal import wal
+    if wal.app is not None:
+        wal.init_app(wal.app)
@@ -0,0 +1,36 @@
+"""report composite key
+
+Revision ID: 25b112fb288a
+Revises: 62d4bcc864cf
+Create Date: 2026-10-18 15:02:44.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '25b112fb288a'
+down_revision = '62d4bcc864cf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_report_trading_date', table_name='report')
+    op.drop_index('ix_report_item_id', table_name='report')
+    op.drop_index('ix_report_currency_id', table_name='report')
+    op.create_index(op.f('ix_report_trading_date'), 'report', ['trading_date'], unique=False)
+    op.create_index(op.f('ix_report_item_id'), 'report', ['item_id'], unique=False)
+    op.create_index(op.f('ix_report_currency_id'), 'report', ['currency_id'], unique=False)
+    op.create_index('report_ak_1', 'report', ['trading_date', 'item_id', 'currency_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('report_ak_1', table_name='report')
+    op.drop_index(op.f('ix_report_currency_id'), table_name='report')
+    op.drop_index(op.f('ix_report_item_id'), table_name='report')
+    op.drop_index(op.f('ix_report_trading_date'), table_name='report')
+    op.create_index('ix_report_currency_id', 'report', ['currency_id'], unique=True)
+    op.create_index('ix_report_item_id', 'report', ['item_id'], unique=True)
+    op.create_index('ix_report_trading_date', 'report', ['trading_date'], unique=True)
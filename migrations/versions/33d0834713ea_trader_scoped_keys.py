@@ -0,0 +1,44 @@
+"""trader scoped keys
+
+Revision ID: 33d0834713ea
+Revises: 25b112fb288a
+Create Date: 2026-10-18 15:31:07.264113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '33d0834713ea'
+down_revision = '25b112fb288a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_offer_trader_id', table_name='offer')
+    op.create_index(op.f('ix_offer_trader_id'), 'offer', ['trader_id'], unique=False)
+    op.drop_index('ix_trade_buyer_id', table_name='trade')
+    op.create_index(op.f('ix_trade_buyer_id'), 'trade', ['buyer_id'], unique=False)
+    op.drop_index('ix_trade_seller_id', table_name='trade')
+    op.create_index(op.f('ix_trade_seller_id'), 'trade', ['seller_id'], unique=False)
+    op.drop_index('ix_current_inventory_trader_id', table_name='current_inventory')
+    op.create_index(op.f('ix_current_inventory_trader_id'), 'current_inventory', ['trader_id'], unique=False)
+    op.drop_index('ix_current_inventory_item_id', table_name='current_inventory')
+    op.create_index(op.f('ix_current_inventory_item_id'), 'current_inventory', ['item_id'], unique=False)
+    op.create_index('current_inventory_ak_1', 'current_inventory', ['trader_id', 'item_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('current_inventory_ak_1', table_name='current_inventory')
+    op.drop_index(op.f('ix_current_inventory_item_id'), table_name='current_inventory')
+    op.create_index('ix_current_inventory_item_id', 'current_inventory', ['item_id'], unique=True)
+    op.drop_index(op.f('ix_current_inventory_trader_id'), table_name='current_inventory')
+    op.create_index('ix_current_inventory_trader_id', 'current_inventory', ['trader_id'], unique=True)
+    op.drop_index(op.f('ix_trade_seller_id'), table_name='trade')
+    op.create_index('ix_trade_seller_id', 'trade', ['seller_id'], unique=True)
+    op.drop_index(op.f('ix_trade_buyer_id'), table_name='trade')
+    op.create_index('ix_trade_buyer_id', 'trade', ['buyer_id'], unique=True)
+    op.drop_index(op.f('ix_offer_trader_id'), table_name='offer')
+    op.create_index('ix_offer_trader_id', 'offer', ['trader_id'], unique=True)
@@ -0,0 +1,24 @@
+"""price time series index
+
+Revision ID: 62d4bcc864cf
+Revises: b5b301f4ea25
+Create Date: 2026-10-18 14:32:10.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '62d4bcc864cf'
+down_revision = 'b5b301f4ea25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_price_item_id_currency_id_ts', 'price', ['item_id', 'currency_id', 'ts'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_price_item_id_currency_id_ts', table_name='price')
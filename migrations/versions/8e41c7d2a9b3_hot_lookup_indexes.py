@@ -0,0 +1,32 @@
+"""hot lookup indexes
+
+Revision ID: 8e41c7d2a9b3
+Revises: 33d0834713ea
+Create Date: 2026-10-18 16:48:22.507311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41c7d2a9b3'
+down_revision = '33d0834713ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_price_ts'), 'price', ['ts'], unique=False)
+    op.create_index('ix_offer_item_id_is_active', 'offer', ['item_id', 'is_active'], unique=False)
+    op.create_index(op.f('ix_offer_ts'), 'offer', ['ts'], unique=False)
+    op.create_index(op.f('ix_trade_item_id'), 'trade', ['item_id'], unique=False)
+    op.create_index(op.f('ix_trade_offer_id'), 'trade', ['offer_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_trade_offer_id'), table_name='trade')
+    op.drop_index(op.f('ix_trade_item_id'), table_name='trade')
+    op.drop_index(op.f('ix_offer_ts'), table_name='offer')
+    op.drop_index('ix_offer_item_id_is_active', table_name='offer')
+    op.drop_index(op.f('ix_price_ts'), table_name='price')
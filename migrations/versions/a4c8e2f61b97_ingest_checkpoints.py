@@ -0,0 +1,30 @@
+"""ingest checkpoints
+
+Revision ID: a4c8e2f61b97
+Revises: f19b6c3e8d27
+Create Date: 2026-10-18 19:41:52.208164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c8e2f61b97'
+down_revision = 'f19b6c3e8d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingest_checkpoint',
+    sa.Column('slot', sa.String(length=255), nullable=False),
+    sa.Column('segment', sa.Integer(), nullable=False),
+    sa.Column('offset', sa.Integer(), nullable=False),
+    sa.Column('ts', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('slot')
+    )
+
+
+def downgrade():
+    op.drop_table('ingest_checkpoint')
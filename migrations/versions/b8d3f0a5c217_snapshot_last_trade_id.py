@@ -0,0 +1,29 @@
+"""snapshot last trade id
+
+Revision ID: b8d3f0a5c217
+Revises: a4c8e2f61b97
+Create Date: 2026-10-18 21:12:40.518330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f0a5c217'
+down_revision = 'a4c8e2f61b97'
+branch_labels = None
+depends_on = None
+
+
+# snapshots taken before trades were replayed in id order cannot be resumed
+# from; they are dropped and rebuilt by `flask pnl snapshot`
+def upgrade():
+    op.execute('DELETE FROM position_snapshot')
+    with op.batch_alter_table('position_snapshot') as batch_op:
+        batch_op.add_column(sa.Column('last_trade_id', sa.Integer(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('position_snapshot') as batch_op:
+        batch_op.drop_column('last_trade_id')
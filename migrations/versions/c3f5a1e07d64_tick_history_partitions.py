@@ -0,0 +1,111 @@
+"""tick history partitions
+
+Revision ID: c3f5a1e07d64
+Revises: 8e41c7d2a9b3
+Create Date: 2026-10-18 17:36:51.902214
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f5a1e07d64'
+down_revision = '8e41c7d2a9b3'
+branch_labels = None
+depends_on = None
+
+# (table, foreign keys, indexes) of the tick tables that become monthly range
+# partitions of ts on PostgreSQL 11+; the primary key grows to (id, ts)
+# because a partitioned table can only enforce keys that include ts
+TICK_TABLES = [
+    ('price', [('item_id', 'item'), ('currency_id', 'currency')],
+     [('ix_price_item_id_currency_id_ts', 'item_id, currency_id, ts'), ('ix_price_ts', 'ts')]),
+    ('currency_rate', [('currency_id', 'currency'), ('base_currency_id', 'currency')],
+     [('ix_currency_rate_ts', 'ts')]),
+]
+
+# months created past the current one; `flask history partition` keeps
+# creating them from there
+AHEAD = 3
+
+
+def add_months(day, count):
+    count += day.year * 12 + day.month - 1
+    return date(count // 12, count % 12 + 1, 1)
+
+
+def is_partitioned(bind, table):
+    return bool(bind.execute(sa.text(
+        'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :table'),
+        table=table).scalar())
+
+
+def rebuild(table, foreign_keys, indexes, old, partition_by=''):
+    op.execute('ALTER TABLE {0} RENAME TO {0}_{1}'.format(table, old))
+    op.execute('ALTER INDEX {0}_pkey RENAME TO {0}_{1}_pkey'.format(table, old))
+    for name, _ in indexes:
+        op.execute('DROP INDEX {}'.format(name))
+    op.execute('CREATE TABLE {0} (LIKE {0}_{1} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) {2}'.format(
+        table, old, partition_by))
+    op.execute('ALTER TABLE {} ADD PRIMARY KEY ({})'.format(table, 'id, ts' if partition_by else 'id'))
+    op.execute('ALTER SEQUENCE {0}_id_seq OWNED BY {0}.id'.format(table))
+    for column, target in foreign_keys:
+        op.execute('ALTER TABLE {} ADD FOREIGN KEY ({}) REFERENCES {} (id)'.format(table, column, target))
+    for name, columns in indexes:
+        op.execute('CREATE INDEX {} ON {} ({})'.format(name, table, columns))
+
+
+def copy(table, old):
+    op.execute('INSERT INTO {0} SELECT * FROM {0}_{1}'.format(table, old))
+    op.execute('DROP TABLE {0}_{1}'.format(table, old))
+
+
+def upgrade():
+    op.create_table('currency_rate_report',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('trading_date', sa.Date(), nullable=False),
+    sa.Column('currency_id', sa.Integer(), nullable=False),
+    sa.Column('base_currency_id', sa.Integer(), nullable=False),
+    sa.Column('first_rate', sa.Numeric(precision=16, scale=6), nullable=False),
+    sa.Column('last_rate', sa.Numeric(precision=16, scale=6), nullable=False),
+    sa.Column('min_rate', sa.Numeric(precision=16, scale=6), nullable=False),
+    sa.Column('max_rate', sa.Numeric(precision=16, scale=6), nullable=False),
+    sa.ForeignKeyConstraint(['base_currency_id'], ['currency.id'], ),
+    sa.ForeignKeyConstraint(['currency_id'], ['currency.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_currency_rate_report_trading_date'), 'currency_rate_report', ['trading_date'], unique=False)
+    op.create_index('currency_rate_report_ak_1', 'currency_rate_report', ['trading_date', 'currency_id', 'base_currency_id'], unique=True)
+    op.create_index(op.f('ix_currency_rate_ts'), 'currency_rate', ['ts'], unique=False)
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or bind.dialect.server_version_info < (11,):
+        return
+    today = date.today()
+    for table, foreign_keys, indexes in TICK_TABLES:
+        rebuild(table, foreign_keys, indexes, 'heap', 'PARTITION BY RANGE (ts)')
+        op.execute('CREATE TABLE {0}_default PARTITION OF {0} DEFAULT'.format(table))
+        first = bind.execute('SELECT min(ts) FROM {}_heap'.format(table)).scalar() or today
+        day = add_months(first, 0)
+        while day < add_months(today, AHEAD + 1):
+            op.execute("CREATE TABLE {0}_{1:%Y_%m} PARTITION OF {0} FOR VALUES FROM ('{1}') TO ('{2}')".format(
+                table, day, add_months(day, 1)))
+            day = add_months(day, 1)
+        copy(table, 'heap')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for table, foreign_keys, indexes in TICK_TABLES:
+            if is_partitioned(bind, table):
+                rebuild(table, foreign_keys, indexes, 'parts')
+                copy(table, 'parts')
+
+    op.drop_index(op.f('ix_currency_rate_ts'), table_name='currency_rate')
+    op.drop_index('currency_rate_report_ak_1', table_name='currency_rate_report')
+    op.drop_index(op.f('ix_currency_rate_report_trading_date'), table_name='currency_rate_report')
+    op.drop_table('currency_rate_report')
@@ -0,0 +1,65 @@
+"""item and trader search
+
+Revision ID: d7a2e9b41c58
+Revises: c3f5a1e07d64
+Create Date: 2026-10-18 18:22:40.615378
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2e9b41c58'
+down_revision = 'c3f5a1e07d64'
+branch_labels = None
+depends_on = None
+
+# (table, searched columns) as in application/search.py
+SEARCHES = [
+    ('item', ('code', 'name', 'details')),
+    ('trader', ('user_name', 'first_name', 'last_name')),
+]
+
+
+def sqlite_upgrade(table, columns):
+    name = '{}_search'.format(table)
+    names = ', '.join(columns)
+    new = ', '.join('new.{}'.format(column) for column in columns)
+    old = ', '.join('old.{}'.format(column) for column in columns)
+    op.execute("CREATE VIRTUAL TABLE {} USING fts5({}, content='{}', content_rowid='id', prefix='1 2 3')".format(
+        name, names, table))
+    op.execute('CREATE TRIGGER {0}_ai AFTER INSERT ON {1} BEGIN '
+               'INSERT INTO {0}(rowid, {2}) VALUES (new.id, {3}); END'.format(name, table, names, new))
+    op.execute('CREATE TRIGGER {0}_ad AFTER DELETE ON {1} BEGIN '
+               "INSERT INTO {0}({0}, rowid, {2}) VALUES ('delete', old.id, {3}); END".format(name, table, names, old))
+    op.execute('CREATE TRIGGER {0}_au AFTER UPDATE ON {1} BEGIN '
+               "INSERT INTO {0}({0}, rowid, {2}) VALUES ('delete', old.id, {3}); "
+               'INSERT INTO {0}(rowid, {2}) VALUES (new.id, {4}); END'.format(name, table, names, old, new))
+    op.execute("INSERT INTO {0}({0}) VALUES ('rebuild')".format(name))
+
+
+def postgresql_upgrade(table, columns):
+    vector = ' || '.join("setweight(to_tsvector('simple', coalesce({}, '')), '{}')".format(column, weight)
+                         for column, weight in zip(columns, 'ABCD'))
+    op.execute('CREATE INDEX ix_{0}_search ON {0} USING gin (({1}))'.format(table, vector))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, columns in SEARCHES:
+        if dialect == 'sqlite':
+            sqlite_upgrade(table, columns)
+        elif dialect == 'postgresql':
+            postgresql_upgrade(table, columns)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table, columns in SEARCHES:
+        if dialect == 'sqlite':
+            for trigger in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER {}_search_{}'.format(table, trigger))
+            op.execute('DROP TABLE {}_search'.format(table))
+        elif dialect == 'postgresql':
+            op.execute('DROP INDEX ix_{}_search'.format(table))
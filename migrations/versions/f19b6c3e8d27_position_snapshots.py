@@ -0,0 +1,41 @@
+"""position snapshots
+
+Revision ID: f19b6c3e8d27
+Revises: d7a2e9b41c58
+Create Date: 2026-10-18 19:04:13.377592
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19b6c3e8d27'
+down_revision = 'd7a2e9b41c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('position_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('trader_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('method', sa.String(length=16), nullable=False),
+    sa.Column('ts', sa.DateTime(), nullable=False),
+    sa.Column('quantity', sa.Numeric(precision=16, scale=6), nullable=False),
+    sa.Column('realized', sa.Numeric(precision=16, scale=6), nullable=False),
+    sa.Column('trades', sa.Integer(), nullable=False),
+    sa.Column('lots', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['item.id'], ),
+    sa.ForeignKeyConstraint(['trader_id'], ['trader.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_position_snapshot_item_id'), 'position_snapshot', ['item_id'], unique=False)
+    op.create_index('position_snapshot_ak_1', 'position_snapshot', ['trader_id', 'method', 'ts', 'item_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('position_snapshot_ak_1', table_name='position_snapshot')
+    op.drop_index(op.f('ix_position_snapshot_item_id'), table_name='position_snapshot')
+    op.drop_table('position_snapshot')
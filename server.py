@@ -1,5 +1,9 @@
 import application
+from application.wal import wal
+from os import environ
 
+# development server; production runs wsgi:app under gunicorn (see gunicorn.conf.py)
 if __name__ == "__main__":
     app = application.create_app()
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    wal.init_app(app)
+    app.run(host='0.0.0.0', port=int(environ.get('PORT', 5000)), debug=app.config['FLASK_ENV'] == 'development')
@@ -0,0 +1,54 @@
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+
+# the app reads its configuration when it is first imported, and its routes
+# are registered once per process, so every test shares one app and starts
+# from empty tables instead
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['INGEST_MODE'] = 'direct'
+
+from application import create_app, db as _db, matching  # noqa: E402
+from application.cache import cache  # noqa: E402
+from application.models import Country, Currency, Item, Trader  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app()
+
+
+@pytest.fixture
+def db(app):
+    with app.app_context():
+        for table in reversed(_db.metadata.sorted_tables):
+            _db.session.execute(table.delete())
+        _db.session.commit()
+        matching.engine.reset()
+        cache.init_app(app)
+        yield _db
+        _db.session.remove()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+# a base currency, five items priced in it and three traders
+@pytest.fixture
+def market(db):
+    usd = Currency(code='USD', name='Dollar', is_active=True, is_base_currency=True)
+    country = Country(code='BR', name='Brazil')
+    db.session.add_all([usd, country])
+    db.session.flush()
+    db.session.add_all([Item(code='IT{}'.format(n), name='Item {}'.format(n), is_active=True, currency_id=usd.id)
+                        for n in range(5)])
+    db.session.add_all([Trader(first_name='First {}'.format(n), last_name='Last', user_name='user{}'.format(n),
+                               password='secret', email='user{}@example.com'.format(n), confirmation_code='code',
+                               time_registered=datetime(2021, 1, 1), time_confirmed=datetime(2021, 1, 1),
+                               country_id=country.id, preferred_currency_id=usd.id) for n in range(3)])
+    db.session.commit()
+    return db
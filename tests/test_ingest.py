@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from application.models import Currency, CurrencyRate, Price
+
+
+def post(client, path, **kwargs):
+    response = client.post(path, **kwargs)
+    assert response.status_code < 300, response.get_data(as_text=True)
+    return response.get_json()
+
+
+# a timestamp with an offset is stored as naive UTC, posted alone or in bulk
+def test_offset_timestamps_are_stored_in_utc(client, market):
+    price = {'item_id': 1, 'currency_id': 1, 'buy': 100, 'sell': 101, 'ts': '2021-03-01T12:00:00+02:00'}
+    post(client, '/api/prices/', json=price)
+    post(client, '/api/prices/bulk', json=[price])
+    assert [p.ts for p in Price.query] == [datetime(2021, 3, 1, 10)] * 2
+
+    market.session.add(Currency(code='EUR', name='Euro', is_active=True, is_base_currency=False))
+    market.session.commit()
+    post(client, '/api/currency_rates/', json={'currency_id': 2, 'base_currency_id': 1, 'rate': 1.2,
+                                               'ts': '2021-03-01T09:00:00Z'})
+    assert [r.ts for r in CurrencyRate.query] == [datetime(2021, 3, 1, 9)]
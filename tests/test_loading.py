@@ -0,0 +1,73 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from application.models import (Country, Currency, CurrencyRate, CurrencyUsed, CurrentInventory, Item, Offer, Price,
+                                Report, Trade, Trader)
+
+ROWS = 6
+
+ENDPOINTS = ('countries', 'currencies', 'currency_rates', 'currencies_used', 'traders', 'items',
+             'current_inventories', 'offers', 'prices', 'reports', 'trades')
+
+
+# ROWS rows in every table, each pointing at different rows of the tables
+# it references, so a lazy load per row would show as extra queries
+@pytest.fixture
+def tables(db):
+    def add(rows):
+        db.session.add_all(rows)
+        db.session.flush()
+        return rows
+
+    currencies = add([Currency(code='C{}'.format(n), name='Currency {}'.format(n), is_active=True,
+                               is_base_currency=n == 0) for n in range(ROWS)])
+    countries = add([Country(code='C{}'.format(n), name='Country {}'.format(n)) for n in range(ROWS)])
+    items = add([Item(code='IT{}'.format(n), name='Item {}'.format(n), is_active=True,
+                      currency_id=currencies[n].id) for n in range(ROWS)])
+    traders = add([Trader(first_name='First {}'.format(n), last_name='Last', user_name='user{}'.format(n),
+                          password='secret', email='user{}@example.com'.format(n), confirmation_code='code',
+                          time_registered=datetime(2021, 1, 1), time_confirmed=datetime(2021, 1, 1),
+                          country_id=countries[n].id, preferred_currency_id=currencies[n].id) for n in range(ROWS)])
+    offers = add([Offer(trader_id=traders[n].id, item_id=items[n].id, buy=True, sell=False, price=Decimal(100),
+                        quantity=Decimal(0), ts=datetime(2021, 1, 4, 9, n), is_active=False) for n in range(ROWS)])
+    add([CurrencyUsed(country_id=countries[n].id, currency_id=currencies[n].id, date_from=date(2021, 1, 1))
+         for n in range(ROWS)])
+    add([CurrencyRate(currency_id=currencies[n].id, base_currency_id=currencies[0].id, rate=Decimal(1),
+                      ts=datetime(2021, 1, 4, 9, n)) for n in range(ROWS)])
+    add([CurrentInventory(trader_id=traders[n].id, item_id=items[n].id, quantity=Decimal(1)) for n in range(ROWS)])
+    add([Price(item_id=items[n].id, currency_id=currencies[n].id, buy=Decimal(100), sell=Decimal(101),
+               ts=datetime(2021, 1, 4, 9, n)) for n in range(ROWS)])
+    add([Report(trading_date=date(2021, 1, 4), item_id=items[n].id, currency_id=currencies[n].id,
+                first_price=Decimal(100), last_price=Decimal(100), min_price=Decimal(100), max_price=Decimal(100),
+                avg_price=Decimal(100), total_amount=Decimal(100), quantity=Decimal(1)) for n in range(ROWS)])
+    add([Trade(item_id=items[n].id, buyer_id=traders[n].id, seller_id=traders[(n + 1) % ROWS].id,
+               quantity=Decimal(1), unit_price=Decimal(100), description='Trade {}'.format(n),
+               offer_id=offers[n].id) for n in range(ROWS)])
+    db.session.commit()
+    return db
+
+
+def statements(db, client, path):
+    count = []
+    listener = lambda *args: count.append(1)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(count), response.get_json()
+
+
+# a page is built with the same number of statements however many rows it has
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_statements_per_page_do_not_grow_with_its_size(client, tables, endpoint):
+    statements(tables, client, '/api/{}/?limit=1'.format(endpoint))
+    small, rows = statements(tables, client, '/api/{}/?limit=2'.format(endpoint))
+    assert len(rows) == 2
+    large, rows = statements(tables, client, '/api/{}/?limit=5'.format(endpoint))
+    assert len(rows) == 5
+    assert small == large
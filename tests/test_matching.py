@@ -0,0 +1,21 @@
+def offer(client, trader_id, buy, quantity, price, ts=None):
+    body = {'trader_id': trader_id, 'item_id': 1, 'buy': buy, 'sell': not buy, 'price': price, 'quantity': quantity}
+    if ts is not None:
+        body['ts'] = ts
+    response = client.post('/api/offers/', json=body)
+    assert response.status_code < 300, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def seller(client, offer_id):
+    response = client.get('/api/trades/')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return {trade['seller_id'] for trade in response.get_json() if trade['offer_id'] == offer_id}
+
+
+# a back-dated offer queues behind the orders already resting at its price
+def test_back_dated_offer_keeps_arrival_priority(client, market):
+    first = offer(client, 1, False, 5, 100)
+    offer(client, 2, False, 5, 100, ts='2000-01-01T00:00:00')
+    buy = offer(client, 3, True, 5, 100)
+    assert seller(client, buy['id']) == {first['trader_id']}
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from application import pnl
+from application.models import PositionSnapshot
+
+
+def offer(client, trader_id, buy, quantity, ts, price=100, item_id=1):
+    response = client.post('/api/offers/', json={'trader_id': trader_id, 'item_id': item_id, 'buy': buy,
+                                                 'sell': not buy, 'price': price, 'quantity': quantity, 'ts': ts})
+    assert response.status_code < 300, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def position(client, trader_id):
+    response = client.get('/api/traders/{}/pnl?to=2026-01-10T00:00:00'.format(trader_id))
+    assert response.status_code == 200, response.get_data(as_text=True)
+    body = response.get_json()
+    return body['snapshot'], {p['item_id']: p['quantity'] for p in body['positions']}
+
+
+# a trade on an offer back-dated past a snapshot, but booked after it, is
+# still replayed on top of the snapshot
+def test_trade_booked_after_snapshot_on_back_dated_offer(client, market):
+    offer(client, 1, False, 10, '2026-01-01T09:00:00')
+    offer(client, 2, True, 2, '2026-01-01T10:00:00')
+    assert [count for _, count in pnl.snapshot_all(datetime(2026, 1, 3), 'fifo')] == [1, 1]
+    offer(client, 2, True, 3, '2026-01-02T12:00:00')
+
+    snapshot, quantities = position(client, 2)
+    assert snapshot is not None
+    assert quantities == {1: 5}
+
+    PositionSnapshot.query.delete()
+    market.session.commit()
+    assert position(client, 2) == (None, {1: 5})
+
+
+def test_snapshot_resumes_from_the_previous_one(client, market):
+    offer(client, 1, False, 10, '2026-01-01T09:00:00')
+    offer(client, 2, True, 2, '2026-01-01T10:00:00')
+    list(pnl.snapshot_all(datetime(2026, 1, 3), 'fifo'))
+    offer(client, 2, True, 3, '2026-01-02T12:00:00')
+    offer(client, 2, True, 1, '2026-01-05T12:00:00')
+
+    assert [count for _, count in pnl.snapshot_all(datetime(2026, 1, 4), 'fifo')] == [1, 1]
+    assert position(client, 2)[1] == {1: 6}
+    assert position(client, 1)[1] == {1: -6}
+
+
+def statements(db, client, path):
+    count = []
+    listener = lambda *args: count.append(1)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(count), response.get_json()
+
+
+# marks for every position come from one query, however many items are held
+def test_statements_do_not_grow_with_positions(client, market):
+    def buy(item_id):
+        offer(client, 1, False, 1, '2026-01-01T09:00:00', item_id=item_id)
+        offer(client, 2, True, 1, '2026-01-01T10:00:00', item_id=item_id)
+        response = client.post('/api/prices/', json={'item_id': item_id, 'currency_id': 1, 'buy': 100,
+                                                     'sell': 102, 'ts': '2026-01-02T10:00:00'})
+        assert response.status_code < 300, response.get_data(as_text=True)
+
+    path = '/api/traders/2/pnl?to=2026-01-10T00:00:00'
+    buy(1)
+    statements(market, client, path)
+    few, body = statements(market, client, path)
+    assert len(body['positions']) == 1
+    for item_id in (2, 3, 4):
+        buy(item_id)
+    many, body = statements(market, client, path)
+    assert [p['unrealized'] for p in body['positions']] == [1.0] * 4
+    assert few == many
@@ -0,0 +1,5 @@
+import application
+from application.wal import wal
+
+app = application.create_app()
+wal.init_app(app)